@@ -0,0 +1,8 @@
+##############################################################################
+#
+#     __init__.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+# Performance benchmarks of kcgen on synthetic designs, see run.py
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+##############################################################################
+#
+#     run.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+# Times kcgen on a synthetic design and compares the results to a stored
+# baseline, from the repository root:
+#
+#     python -m benchmarks.run [--components 5000] [--save-baseline]
+#
+# Exits with 1 if a benchmark got slower than the baseline by more than the
+# tolerance.
+
+from __future__ import print_function
+import argparse
+import gc
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+from kcgen.parser import Parser
+from kcgen.generator import Generator
+from .synthetic import make_design, DEFAULT_OPTIONS
+
+
+
+PATH_BASELINE = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'baseline.json')
+
+DEFAULT_TOLERANCE = 0.25
+
+# processes of the parallel parse benchmark
+
+PARALLEL_JOBS = 4
+
+
+
+#-- benchmarks ----------------------------------------------------------------
+# Each benchmark is (name, unit, setup) where setup (net, pcb, output_dir)
+# returns (function, count), `count` being the number of `unit` processed
+# by one call to `function`.
+
+def setup_parse (net, pcb, output_dir):
+   return (lambda: Parser ('synthetic', net, pcb).parse (), (len (net) + len (pcb)) / 1e6)
+
+
+def setup_parse_parallel (net, pcb, output_dir):
+   return (
+      lambda: Parser ('synthetic', net, pcb, jobs = PARALLEL_JOBS).parse (),
+      (len (net) + len (pcb)) / 1e6
+   )
+
+
+def setup_parse_tree (net, pcb, output_dir):
+   # the whole pcb file parsed to a single tree, zones included, rather than
+   # streamed element by element
+   return (
+      lambda: Parser ('synthetic', net, pcb, stream = False).parse (),
+      (len (net) + len (pcb)) / 1e6
+   )
+
+
+def setup_update (net, pcb, output_dir):
+   # moves the first module back and forth
+   begin = pcb.index ('(at ', pcb.index ('\n  (module'))
+   moved = pcb [:begin] + '(at 1 2 90)' + pcb [pcb.index (')', begin) + 1:]
+   parser = Parser ('synthetic', net, pcb, incremental = True)
+   parser.parse ()
+   versions = [moved, pcb]
+   def update ():
+      for data_pcb in versions:
+         parser.update (data_pcb)
+   return (update, len (versions))
+
+
+def setup_find_component (net, pcb, output_dir):
+   design = Parser ('synthetic', net, pcb).parse ()
+   references = list (design.components.keys ()) * 100
+   def find_components ():
+      for reference in references:
+         design.find_component (reference)
+   return (find_components, len (references))
+
+
+def setup_bom (net, pcb, output_dir):
+   design = Parser ('synthetic', net, pcb).parse ()
+   generator = Generator ('pcbpool')
+   return (lambda: generator.process_bom (output_dir, design), len (design.components))
+
+
+def setup_pickplace (net, pcb, output_dir):
+   design = Parser ('synthetic', net, pcb).parse ()
+   generator = Generator ('pcbpool')
+   return (lambda: generator.process_pickplace (output_dir, design), len (design.components))
+
+
+BENCHMARKS = (
+   ('parse', 'MB', setup_parse),
+   ('parse_parallel', 'MB', setup_parse_parallel),
+   ('parse_tree', 'MB', setup_parse_tree),
+   ('update', 'updates', setup_update),
+   ('find_component', 'lookups', setup_find_component),
+   ('bom', 'components', setup_bom),
+   ('pickplace', 'components', setup_pickplace),
+)
+
+
+
+#-- measure -------------------------------------------------------------------
+# Returns the best time of a call to `function` over `repeat` runs of at
+# least 0.2s each, and the peak memory allocated during one more call
+
+def measure (function, repeat):
+   timer = timeit.Timer (function)
+   number, total = timer.autorange ()
+   best = min (timer.repeat (repeat, number)) / number
+
+   # tracemalloc slows allocations down, measure memory separately
+   gc.collect ()
+   tracemalloc.start ()
+   try:
+      function ()
+      current, peak = tracemalloc.get_traced_memory ()
+   finally:
+      tracemalloc.stop ()
+
+   return (best, peak)
+
+
+
+#-- run -----------------------------------------------------------------------
+
+def run (options, names, repeat):
+   net, pcb = make_design (**options)
+   output_dir = tempfile.mkdtemp ()
+
+   results = {}
+   try:
+      for name, unit, setup in BENCHMARKS:
+         if names and name not in names:
+            continue
+         function, count = setup (net, pcb, output_dir)
+         duration, peak = measure (function, repeat)
+         results [name] = {
+            'time': duration,
+            'throughput': count / duration if duration > 0 else 0.0,
+            'unit': unit,
+            'peak_memory': peak,
+         }
+   finally:
+      shutil.rmtree (output_dir)
+
+   return results
+
+
+
+#-- compare -------------------------------------------------------------------
+# Prints the results next to the baseline ones, returns the names of the
+# benchmarks slower than the baseline by more than `tolerance`
+
+def compare (results, baseline, tolerance):
+   regressions = []
+
+   print ('%-16s %10s %26s %12s %10s' % ('benchmark', 'time', 'throughput', 'peak memory', 'baseline'))
+
+   for name, unit, setup in BENCHMARKS:
+      if name not in results:
+         continue
+      result = results [name]
+      line = '%-16s %8.2fms %26s %10.1fMB' % (
+         name, result ['time'] * 1000, '%.1f %s/s' % (result ['throughput'], unit),
+         result ['peak_memory'] / 1e6
+      )
+      if baseline is not None and name in baseline:
+         ratio = result ['time'] / baseline [name]['time']
+         line += ' %9.2fx' % ratio
+         if ratio > 1.0 + tolerance:
+            regressions.append (name)
+            line += '  REGRESSION'
+      print (line)
+
+   return regressions
+
+
+
+def parse_args ():
+   arg_parser = argparse.ArgumentParser ()
+
+   for name, default in sorted (DEFAULT_OPTIONS.items ()):
+      arg_parser.add_argument (
+         '--%s' % name.replace ('_', '-'),
+         type = int, default = default,
+         help = 'Synthetic design %s. Defaults to %d.' % (name.replace ('_', ' '), default)
+      )
+
+   arg_parser.add_argument (
+      '--benchmarks',
+      help = 'Comma separated list of benchmarks to run, among %s. Defaults to all.' %
+         ', '.join ([benchmark [0] for benchmark in BENCHMARKS])
+   )
+
+   arg_parser.add_argument (
+      '--repeat',
+      type = int, default = 5,
+      help = 'The number of timed runs of each benchmark, the best is kept. Defaults to 5.'
+   )
+
+   arg_parser.add_argument (
+      '--baseline',
+      default = PATH_BASELINE,
+      help = 'The baseline file. Defaults to benchmarks/baseline.json.'
+   )
+
+   arg_parser.add_argument (
+      '--save-baseline',
+      action = 'store_true',
+      help = 'Store the results as the new baseline.'
+   )
+
+   arg_parser.add_argument (
+      '--tolerance',
+      type = float, default = DEFAULT_TOLERANCE,
+      help = 'The slowdown over the baseline reported as a regression. Defaults to %s.' % DEFAULT_TOLERANCE
+   )
+
+   return arg_parser.parse_args ()
+
+
+
+def main ():
+   logging.basicConfig (format = '%(message)s', level = logging.WARNING)
+   args = parse_args ()
+
+   options = dict ((name, getattr (args, name)) for name in DEFAULT_OPTIONS)
+   names = args.benchmarks.split (',') if args.benchmarks else None
+
+   results = run (options, names, args.repeat)
+
+   baseline = None
+   if not args.save_baseline and os.path.exists (args.baseline):
+      with open (args.baseline, 'r') as file:
+         data = json.load (file)
+      if data ['options'] == options:
+         baseline = data ['results']
+      else:
+         logging.warning ('The baseline was measured on another synthetic design, not comparing')
+
+   regressions = compare (results, baseline, args.tolerance)
+
+   if args.save_baseline:
+      with open (args.baseline, 'w') as file:
+         json.dump ({'options': options, 'results': results}, file, indent = 3, sort_keys = True)
+         file.write ('\n')
+
+   if regressions:
+      logging.error ('Slower than the baseline: %s', ', '.join (regressions))
+      sys.exit (1)
+
+
+
+if __name__ == '__main__':
+   main ()
@@ -0,0 +1,113 @@
+##############################################################################
+#
+#     startup.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+# Measures, in fresh interpreters, the time to import kcgen and to run a BOM
+# only generation, and the time importing pcbnew would add to both. Since
+# pcbnew is loaded lazily, BOM only runs don't pay for it anymore.
+#
+#     python -m benchmarks.startup [--input-net x.net --input-pcb x.kicad_pcb]
+#
+# A small synthetic design is used if no input files are given.
+
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from .synthetic import write_project
+
+
+PATH_ROOT = os.path.abspath (os.path.join (os.path.dirname (__file__), '..'))
+
+SCRIPT_IMPORT = '''
+import sys, time
+start = time.time ()
+import kcgen
+print (time.time () - start, 'pcbnew' in sys.modules)
+'''
+
+SCRIPT_BOM = '''
+import sys, time
+start = time.time ()
+import kcgen
+args = lambda: None
+args.input_net, args.input_pcb, args.output_dir = sys.argv [1:4]
+args.manufacturer = 'pcbpool'
+args.stages = 'bom'
+args.force = True
+kcgen.run (args)
+print (time.time () - start, 'pcbnew' in sys.modules)
+'''
+
+SCRIPT_PCBNEW = '''
+import time
+start = time.time ()
+from kcgen.backend import load_pcbnew
+load_pcbnew ()
+print (time.time () - start, True)
+'''
+
+
+
+#-- measure -------------------------------------------------------------------
+# Returns the best time of `runs` runs of `script`, and whether pcbnew was
+# imported
+
+def measure (script, arguments, runs):
+   best = None
+   imported = False
+   env = dict (os.environ)
+   env ['PYTHONPATH'] = os.pathsep.join ([PATH_ROOT, env.get ('PYTHONPATH', '')])
+   for run in range (runs):
+      output = subprocess.check_output (
+         [sys.executable, '-c', script] + arguments, env = env, stderr = subprocess.STDOUT
+      )
+      duration, imported = output.decode ('utf-8').split ()[-2:]
+      duration = float (duration)
+      best = duration if best is None else min (best, duration)
+   return best, imported == 'True'
+
+
+
+def main ():
+   arg_parser = argparse.ArgumentParser ()
+   arg_parser.add_argument ('--input-net')
+   arg_parser.add_argument ('--input-pcb')
+   arg_parser.add_argument ('--runs', type = int, default = 5)
+   args = arg_parser.parse_args ()
+
+   output_dir = tempfile.mkdtemp ()
+
+   try:
+      if args.input_net is None or args.input_pcb is None:
+         args.input_net, args.input_pcb = write_project (
+            os.path.join (output_dir, 'synthetic'), components = 100, segments = 500, vias = 100
+         )
+
+      results = [
+         ('import kcgen', measure (SCRIPT_IMPORT, [], args.runs)),
+         ('bom only run', measure (SCRIPT_BOM, [args.input_net, args.input_pcb, output_dir], args.runs)),
+      ]
+
+      try:
+         results.append (('import pcbnew', measure (SCRIPT_PCBNEW, [], args.runs)))
+      except subprocess.CalledProcessError:
+         print ('pcbnew is not available, its import time is not measured')
+
+   finally:
+      shutil.rmtree (output_dir)
+
+   for name, (duration, imported) in results:
+      print ('%-16s %8.1f ms   pcbnew %s' % (name, duration * 1000, 'imported' if imported else 'not imported'))
+
+
+
+if __name__ == '__main__':
+   main ()
@@ -0,0 +1,222 @@
+##############################################################################
+#
+#     synthetic.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import os
+import random
+
+
+
+# net file fields of each component, in order, beyond these extra 'FieldN'
+# fields are added
+
+FIELDS = (
+   ('Device', lambda i, d: 'Resistor'),
+   ('Package', lambda i, d: '0603'),
+   ('Description', lambda i, d: 'RES %d OHM 1%% 0603' % d),
+   ('Place', lambda i, d: 'No' if i % 20 == 0 else 'Yes'),
+   ('Dist', lambda i, d: 'DigiKey'),
+   ('DistPartNumber', lambda i, d: 'P%d-ND' % d),
+   ('DistLink', lambda i, d: 'https://www.digikey.com/products/en?keywords=P%d-ND' % d),
+   ('Remark', lambda i, d: 'remark (%d)' % d),
+)
+
+DEFAULT_OPTIONS = {
+   'components': 1000,
+   'fiducials': 4,
+   'segments': 5000,
+   'vias': 1000,
+   'zones': 2,
+   'zone_points': 5000,
+   'fields': len (FIELDS),
+   'descriptions': 50,
+   'seed': 1,
+}
+
+
+
+#-- make_design ---------------------------------------------------------------
+# Returns the (net, kicad_pcb) contents of a synthetic but valid design
+
+def make_design (
+   components = 1000, fiducials = 4, segments = 5000, vias = 1000, zones = 2,
+   zone_points = 5000, fields = len (FIELDS), descriptions = 50, seed = 1
+):
+   rand = random.Random (seed)
+   width = 100.0 + components ** 0.5 * 5.0
+   height = width * 0.6
+
+   def position ():
+      return (rand.uniform (5.0, width - 5.0), rand.uniform (5.0, height - 5.0))
+
+   net = [
+      '(export (version D)\n'
+      '  (design\n'
+      '    (source /synthetic/synthetic.sch)\n'
+      '    (date "Tue 01 Jan 2019 10:00:00 AM CET")\n'
+      '    (tool "Eeschema 5.0.2")\n'
+      '    (sheet (number 1) (name /) (tstamps /)\n'
+      '      (title_block (title) (company) (rev) (date) (source synthetic.sch))))\n'
+      '  (components\n'
+   ]
+
+   pcb = [
+      '(kicad_pcb (version 20171130) (host pcbnew 5.0.2)\n'
+      '  (general (thickness 1.6) (drawings 4) (tracks %d) (zones 0) (modules %d) (nets 3))\n'
+      '  (page A4)\n'
+      '  (layers\n'
+      '    (0 F.Cu signal) (31 B.Cu signal) (36 B.SilkS user) (37 F.SilkS user)\n'
+      '    (44 Edge.Cuts user) (48 B.Fab user) (49 F.Fab user))\n'
+      '  (net 0 "")\n'
+      '  (net 1 GND)\n'
+      '  (net 2 "Net-(R1-Pad1)")\n'
+      '  (net_class Default "This is the default net class."\n'
+      '    (clearance 0.2) (trace_width 0.25) (via_dia 0.8) (via_drill 0.4)\n'
+      '    (add_net GND) (add_net "Net-(R1-Pad1)"))\n\n' % (segments + vias, components + fiducials)
+   ]
+
+   for i in range (1, components + 1):
+      reference = ('R%d' if i % 3 else 'C%d') % i
+      description = i % descriptions
+
+      net.append ('    (comp (ref %s)\n      (value %dk)\n      (footprint Resistor_SMD:R_0603)\n' % (reference, description))
+      if fields > 0:
+         net.append ('      (fields\n')
+         for f in range (fields):
+            if f < len (FIELDS):
+               name, value = FIELDS [f]
+               value = value (i, description)
+            else:
+               name, value = 'Field%d' % f, 'value %d' % f
+            net.append ('        (field (name %s) "%s")\n' % (name, value))
+         net.append ('      )\n')
+      net.append (
+         '      (libsource (lib Device) (part R) (description Resistor))\n'
+         '      (sheetpath (names /) (tstamps /))\n'
+         '      (tstamp 5C%06X))\n' % i
+      )
+
+      side = 'B' if i % 4 == 0 else 'F'
+      rotation = '' if i % 2 else ' %d' % (90 * (i % 4))
+      x, y = position ()
+      pcb.append (
+         '  (module Resistor_SMD:R_0603 (layer {side}.Cu) (tedit 5B301BBD) (tstamp 5C{i:06X})\n'
+         '    (at {x:.4f} {y:.4f}{rotation})\n'
+         '    (descr "Resistor SMD 0603")\n'
+         '    (path /5C{i:06X})\n'
+         '    (attr smd)\n'
+         '    (fp_text reference {reference} (at 0 -1.43{rotation}) (layer {side}.SilkS)\n'
+         '      (effects (font (size 1 1) (thickness 0.15))))\n'
+         '    (fp_text value {description}k (at 0 1.43{rotation}) (layer {side}.Fab)\n'
+         '      (effects (font (size 1 1) (thickness 0.15))))\n'
+         '    (fp_line (start -0.8 0.4) (end -0.8 -0.4) (layer {side}.Fab) (width 0.1))\n'
+         '    (fp_line (start -0.8 -0.4) (end 0.8 -0.4) (layer {side}.Fab) (width 0.1))\n'
+         '    (fp_line (start 0.8 -0.4) (end 0.8 0.4) (layer {side}.Fab) (width 0.1))\n'
+         '    (fp_line (start 0.8 0.4) (end -0.8 0.4) (layer {side}.Fab) (width 0.1))\n'
+         '    (pad 1 smd roundrect (at -0.7875 0{rotation}) (size 0.875 0.95) (layers {side}.Cu {side}.Paste {side}.Mask)\n'
+         '      (roundrect_rratio 0.25) (net 2 "Net-(R1-Pad1)"))\n'
+         '    (pad 2 smd roundrect (at 0.7875 0{rotation}) (size 0.875 0.95) (layers {side}.Cu {side}.Paste {side}.Mask)\n'
+         '      (roundrect_rratio 0.25) (net 1 GND))\n'
+         '    (model ${{KISYS3DMOD}}/Resistor_SMD.3dshapes/R_0603_1608Metric.wrl\n'
+         '      (at (xyz 0 0 0)) (scale (xyz 1 1 1)) (rotate (xyz 0 0 0))))\n\n'.format (
+            side = side, i = i, x = x, y = y, rotation = rotation,
+            reference = reference, description = description
+         )
+      )
+
+   for i in range (fiducials):
+      side = 'F' if i % 2 == 0 else 'B'
+      x, y = position ()
+      pcb.append (
+         '  (module Fiducial:Fiducial_1mm_Dia_2mm_Outer (layer {side}.Cu) (tedit 0) (tstamp 0)\n'
+         '    (at {x:.4f} {y:.4f})\n'
+         '    (attr virtual)\n'
+         '    (fp_text reference REF** (at 0 -2) (layer {side}.SilkS)\n'
+         '      (effects (font (size 1 1) (thickness 0.15))))\n'
+         '    (fp_circle (center 0 0) (end 1 0) (layer {side}.Fab) (width 0.1))\n'
+         '    (pad "" smd circle (at 0 0) (size 1 1) (layers {side}.Cu {side}.Mask)\n'
+         '      (solder_mask_margin 0.5) (clearance 0.5)))\n\n'.format (side = side, x = x, y = y)
+      )
+
+   for (start_x, start_y), (end_x, end_y) in (
+      ((0, 0), (width, 0)), ((width, 0), (width, height)),
+      ((width, height), (0, height)), ((0, height), (0, 0))
+   ):
+      pcb.append (
+         '  (gr_line (start %.4f %.4f) (end %.4f %.4f) (layer Edge.Cuts) (width 0.15))\n' %
+         (start_x, start_y, end_x, end_y)
+      )
+
+   for i in range (segments):
+      start_x, start_y = position ()
+      end_x, end_y = position ()
+      pcb.append (
+         '  (segment (start %.4f %.4f) (end %.4f %.4f) (width 0.25) (layer %s.Cu) (net %d) (tstamp 5C%06X))\n' %
+         (start_x, start_y, end_x, end_y, 'F' if i % 2 else 'B', 1 + i % 2, i)
+      )
+
+   for i in range (vias):
+      x, y = position ()
+      pcb.append ('  (via (at %.4f %.4f) (size 0.8) (drill 0.4) (layers F.Cu B.Cu) (net %d))\n' % (x, y, 1 + i % 2))
+
+   for i in range (zones):
+      pcb.append (
+         '  (zone (net 1) (net_name GND) (layer %s.Cu) (tstamp 0) (hatch edge 0.508)\n'
+         '    (connect_pads (clearance 0.508))\n'
+         '    (min_thickness 0.254)\n'
+         '    (fill yes (arc_segments 16) (thermal_gap 0.508) (thermal_bridge_width 0.508))\n'
+         '    (polygon\n'
+         '      (pts\n'
+         '        (xy 0 0) (xy %.4f 0) (xy %.4f %.4f) (xy 0 %.4f)\n'
+         '      )\n'
+         '    )\n'
+         '    (filled_polygon\n'
+         '      (pts\n' % ('F' if i % 2 == 0 else 'B', width, width, height, height)
+      )
+      pcb.append (''.join ([
+         '        (xy %.4f %.4f) (xy %.4f %.4f)\n' % (position () + position ())
+         for p in range (zone_points // 2)
+      ]))
+      pcb.append ('      )\n    )\n  )\n')
+
+   pcb.append (')\n')
+
+   net.append (
+      '  )\n'
+      '  (libparts\n'
+      '    (libpart (lib Device) (part R)\n'
+      '      (description Resistor)\n'
+      '      (fields (field (name Reference) R) (field (name Value) R))\n'
+      '      (pins (pin (num 1) (name ~) (type passive)) (pin (num 2) (name ~) (type passive)))))\n'
+      '  (libraries (library (logical Device) (uri /usr/share/kicad/library/Device.lib)))\n'
+      '  (nets\n'
+      '    (net (code 1) (name GND) (node (ref R1) (pin 2)))\n'
+      '    (net (code 2) (name "Net-(R1-Pad1)") (node (ref R1) (pin 1)))))\n'
+   )
+
+   return (''.join (net), ''.join (pcb))
+
+
+
+#-- write_project -------------------------------------------------------------
+# Writes a synthetic design to `directory`/synthetic.{net,kicad_pcb} and
+# returns the paths of both files
+
+def write_project (directory, **options):
+   if not os.path.exists (directory):
+      os.makedirs (directory)
+
+   net, pcb = make_design (**options)
+
+   path_net = os.path.join (directory, 'synthetic.net')
+   path_pcb = os.path.join (directory, 'synthetic.kicad_pcb')
+
+   with open (path_net, 'w') as file:
+      file.write (net)
+   with open (path_pcb, 'w') as file:
+      file.write (pcb)
+
+   return (path_net, path_pcb)
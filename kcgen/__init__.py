@@ -9,25 +9,150 @@ from __future__ import print_function
 import argparse
 import fileinput
 import logging
+import mmap
+import multiprocessing
 import os
-import platform
 import subprocess
 import sys
-from .parser import Parser
-from .generator import Generator
-
-if platform.system () == 'Darwin':
-   sys.path.insert(0, "/Applications/Kicad/kicad.app/Contents/Frameworks/python/site-packages/")
-
-elif platform.system () == 'Windows':
-   sys.path.insert(0, "C:/Program Files/KiCad/lib/python2.7/site-packages/")
-
-import pcbnew
+import threading
+from .version import __version__
+from .parser import Parser, ENGINES, DESIGN_CONTENTS, parse_sexpression
+from .generator import Generator, get_manufacturer_names
+from .manufacturers import MANUFACTURERS, register_manufacturer, get_manufacturer
+from .cache import get_cache, DEFAULT_MAX_SIZE as CACHE_DEFAULT_MAX_SIZE
+from .stages import Stage, select_stages, run_stages
+from .batch import read_projects, run_batch
+from .consolidated import consolidate_bom, ConsolidatedBom
+from .watch import watch, send_trigger
+from .manifest import BuildManifest
+from .archive import Archive
+from .assembly import write_assembly_pdf
+from .excellon import write_excellon
+from .backend import get_backend, set_backend, RecordingBackend
+from .profiling import Profiler, set_profiler, get_profiler
+from . import profiling
 
 
 
 PATH_THIS = os.path.abspath (os.path.dirname (__file__))
 
+# (file name, pcbnew layer, description)
+
+GERBER_LAYERS = [
+   ("F.Cu", 'F_Cu', "Top layer"),
+   ("B.Cu", 'B_Cu', "Bottom layer"),
+   ("F.Paste", 'F_Paste', "Paste top"),
+   ("B.Paste", 'B_Paste', "Paste bottom"),
+   ("F.SilkS", 'F_SilkS', "Silk top"),
+   ("B.SilkS", 'B_SilkS', "Silk top"),
+   ("F.Mask", 'F_Mask', "Mask top"),
+   ("B.Mask", 'B_Mask', "Mask bottom"),
+   ("Edge.Cuts", 'Edge_Cuts', "Edges"),
+]
+
+DRILL_JOB = 'drill'
+
+# 'pcbnew' writes the drill file with pcbnew's EXCELLON_WRITER, 'native'
+# from the holes of the parsed design, without loading the board
+
+DRILL_BACKENDS = ('pcbnew', 'native')
+
+# 'svg' plots the assembly plan with pcbnew and converts it with
+# rsvg-convert, 'pdf' draws it from the parsed design, without loading the
+# board
+
+ASSEMBLY_BACKENDS = ('svg', 'pdf')
+
+RSVG_CONVERT = '/usr/local/bin/rsvg-convert'
+
+STAGE_NAMES = ('gerber', 'drill', 'bom', 'pickplace', 'assembly')
+
+# (inputs, options, output file patterns) of each stage, used to find out
+# if a stage is up to date. Patterns are relative to the output directory.
+
+STAGE_BUILD_INFO = {
+   'gerber': (('input_pcb',), (), ('gerber/*.g*',)),
+   'drill': (('input_pcb',), ('drill_backend',), ('gerber/*.drl',)),
+   'bom': (('input_net', 'input_pcb'), ('manufacturer',), ()),
+   'pickplace': (('input_net', 'input_pcb'), ('manufacturer',), ()),
+   'assembly': (('input_net', 'input_pcb'), ('assembly_backend',), ('%(name)s.assembly.pdf',)),
+}
+
+# stages whose output files are named by each manufacturer, with the
+# manufacturer attribute giving the name
+
+MANUFACTURER_OUTPUTS = {
+   'bom': 'bom_filename',
+   'pickplace': 'pickplace_filename',
+}
+
+# resources the session provides, loaded on first use
+
+SESSION_RESOURCES = ('design', 'board')
+
+# directory of the gerber and drill files in archives
+
+ARCHIVE_GERBER_DIR = 'gerber/'
+
+
+
+class Session (object):
+
+   # Loads the pcbnew board and parses the design at most once, and shares
+   # them across the generators run on the same `args`. With `incremental`,
+   # the parser is kept, and a design reloaded after a change of the pcb
+   # file alone only parses the elements that changed. With `archive`, the
+   # generators write their files into it rather than to the output
+   # directory.
+
+   def __init__ (self, args, incremental = False, archive = None):
+      self.args = args
+      self.archive = archive
+      self._board = None
+      self._design = None
+      self._parser = None
+      self._incremental = incremental
+      self._lock = threading.RLock ()
+
+   @property
+   def board (self):
+      with self._lock:
+         if self._board is None:
+            logging.info ('   Reading %s', self.args.input_pcb)
+            self._board = get_backend ().LoadBoard (self.args.input_pcb)
+         return self._board
+
+   @property
+   def design (self):
+      with self._lock:
+         if self._design is None:
+            if self._parser is not None:
+               try:
+                  self._design = self._parser.update (read_file (self.args.input_pcb))
+               except Exception:
+                  # the design may be half updated, parse it again next time
+                  self._parser = None
+                  raise
+            elif self._incremental:
+               self._parser = make_incremental_parser (self.args)
+               self._design = self._parser.parse ()
+            else:
+               self._design = load_design (self.args)
+         return self._design
+
+   # Drops what was loaded from the changed `paths`, to load it again on
+   # next use
+
+   def reload (self, paths):
+      paths = [os.path.abspath (path) for path in paths]
+      with self._lock:
+         if os.path.abspath (self.args.input_pcb) in paths:
+            self._board = None
+            self._design = None
+         if os.path.abspath (self.args.input_net) in paths:
+            self._design = None
+            self._parser = None
+
 
 
 def parse_args ():
@@ -50,7 +175,7 @@ def parse_args ():
    arg_parser.add_argument (
       '--manufacturer',
       default = 'pcbpool',
-      help = 'The manufacturer. Defaults to pcbpool.'
+      help = 'The manufacturer, or a comma separated list of manufacturers to write the BOM and pick & place files of, each in its own sub-directory, among %s. Defaults to pcbpool.' % ', '.join (sorted (MANUFACTURERS))
    )
 
    arg_parser.add_argument (
@@ -69,28 +194,193 @@ def parse_args ():
       help = 'The output directory. Defaults to current directory.'
    )
 
+   arg_parser.add_argument (
+      '--archive',
+      action = 'store_true',
+      help = 'Write all the production files to a single zip archive in the output directory, named after the project, along with their SHA256 checksums.'
+   )
+
+   arg_parser.add_argument (
+      '--batch',
+      help = 'A JSON manifest or a directory of projects to process, instead of a single input net and pcb file. Each project is written to a sub-directory of the output directory unless the manifest tells otherwise.'
+   )
+
+   arg_parser.add_argument (
+      '--consolidated-bom',
+      action = 'store_true',
+      help = 'With --batch, only write a single BOM of all the projects to the output directory, each project counting its manifest quantity times.'
+   )
+
+   arg_parser.add_argument (
+      '--stages',
+      help = 'Comma separated list of stages to run, among %s. Defaults to all.' % ', '.join (STAGE_NAMES)
+   )
+
+   arg_parser.add_argument (
+      '--force',
+      action = 'store_true',
+      help = 'Regenerate all outputs, even the ones that are up to date.'
+   )
+
+   arg_parser.add_argument (
+      '--watch',
+      action = 'store_true',
+      help = 'Keep running, and regenerate the outputs affected by each change of the input files.'
+   )
+
+   arg_parser.add_argument (
+      '--watch-port',
+      type = int,
+      help = 'With --watch, accept build requests on this localhost port. With --trigger, the port of the watcher.'
+   )
+
+   arg_parser.add_argument (
+      '--trigger',
+      action = 'store_true',
+      help = 'Ask the watcher listening on --watch-port to regenerate the outputs, all of them with --force, and exit.'
+   )
+
+   arg_parser.add_argument (
+      '--profile',
+      metavar = 'TRACE',
+      help = 'Record the time spent in each stage to the TRACE Chrome trace file, and print a summary.'
+   )
+
+   arg_parser.add_argument (
+      '--profile-memory',
+      action = 'store_true',
+      help = 'With --profile, also record the peak memory of each stage. Slows the run down.'
+   )
+
+   arg_parser.add_argument (
+      '-j', '--jobs',
+      type = int, default = 1,
+      help = 'The number of parallel jobs. Defaults to 1.'
+   )
+
+   arg_parser.add_argument (
+      '--mmap',
+      dest = 'use_mmap', action = 'store_true',
+      help = 'Memory map the input files instead of reading them.'
+   )
+
+   arg_parser.add_argument (
+      '--columnar',
+      action = 'store_true',
+      help = 'Store component positions in compact columns, for large designs.'
+   )
+
+   arg_parser.add_argument (
+      '--cache-dir',
+      help = 'The directory to cache parsed designs in. Disabled by default.'
+   )
+
+   arg_parser.add_argument (
+      '--cache-size',
+      type = int, default = CACHE_DEFAULT_MAX_SIZE // (1024 * 1024),
+      help = 'The maximum size of the design cache in MB. Defaults to %d.' % (CACHE_DEFAULT_MAX_SIZE // (1024 * 1024))
+   )
+
+   arg_parser.add_argument (
+      '--parser-engine',
+      default = 'token', choices = ENGINES,
+      help = 'The S-expression parser engine. Defaults to token.'
+   )
+
+   arg_parser.add_argument (
+      '--assembly-backend',
+      default = 'svg', choices = ASSEMBLY_BACKENDS,
+      help = 'How the assembly plan is drawn. Defaults to svg.'
+   )
+
+   arg_parser.add_argument (
+      '--drill-backend',
+      default = 'pcbnew', choices = DRILL_BACKENDS,
+      help = 'How the drill file is written. Defaults to pcbnew.'
+   )
+
    return arg_parser.parse_args (sys.argv[1:])
 
 
 
-def generate_pcb (args):
+def generate_pcb (args, session = None):
    check_args (args)
-   generate_pcb_gerber (args)
-   generate_pcb_drill (args)
 
+   if session is None:
+      session = Session (args)
+
+   jobs = getattr (args, 'jobs', 1)
+   if jobs > 1:
+      logging.info ('Generating PCB gerber and drill files')
+      archive = session.archive
+      output_dir = make_gerber_output_dir (args, archive)
+      log_output (output_dir, archive)
+      native_drill = getattr (args, 'drill_backend', 'pcbnew') == 'native'
+      run_plot_jobs (
+         args.input_pcb, output_dir,
+         [layer_info[0] for layer_info in GERBER_LAYERS] + ([] if native_drill else [DRILL_JOB]),
+         jobs, archive
+      )
+      if native_drill:
+         write_native_drill (args, session.design, output_dir, archive)
+      return
+
+   generate_pcb_gerber (args, session)
+   generate_pcb_drill (args, session)
 
 
-def generate_pcb_gerber (args):
+
+def generate_pcb_gerber (args, session = None):
    logging.info ('Generating PCB gerber files')
    check_args (args)
 
+   if session is None:
+      session = Session (args)
+   archive = session.archive
+   output_dir = make_gerber_output_dir (args, archive)
+
+   jobs = getattr (args, 'jobs', 1)
+   if jobs > 1:
+      log_output (output_dir, archive)
+      run_plot_jobs (
+         args.input_pcb, output_dir,
+         [layer_info[0] for layer_info in GERBER_LAYERS],
+         jobs, archive
+      )
+      return
+
+   board = session.board
+   plot_controller = make_gerber_plot_controller (board, output_dir)
+
+   log_output (output_dir, archive)
+
+   for layer_info in GERBER_LAYERS:
+      with profiling.span ('gerber %s' % layer_info[0], 'plot'):
+         plot_gerber_layer (plot_controller, layer_info)
+      if archive is not None:
+         # moved to the archive as soon as plotted
+         plot_controller.ClosePlot ()
+         archive.add_files (output_dir, ARCHIVE_GERBER_DIR)
+
+   plot_controller.ClosePlot()
+
+
+
+# Gerber and drill files are plotted to a directory of their own in the
+# output directory, or to a work directory of the archive
+
+def make_gerber_output_dir (args, archive = None):
+   if archive is not None:
+      return archive.make_work_dir ()
    output_dir = os.path.join (args.output_dir, 'gerber')
    if not os.path.exists (output_dir):
       os.makedirs (output_dir)
+   return output_dir
+
 
-   logging.info ('   Reading %s', args.input_pcb)
 
-   board = pcbnew.LoadBoard (args.input_pcb)
+def make_gerber_plot_controller (board, output_dir):
+   pcbnew = get_backend ()
    plot_controller = pcbnew.PLOT_CONTROLLER (board)
 
    plot_options = plot_controller.GetPlotOptions ()
@@ -118,40 +408,56 @@ def generate_pcb_gerber (args):
    plot_options.SetPlotReference (True)
    plot_options.SetPlotValue (False)
 
-   layers = [
-      ("F.Cu", pcbnew.F_Cu, "Top layer"),
-      ("B.Cu", pcbnew.B_Cu, "Bottom layer"),
-      ("F.Paste", pcbnew.F_Paste, "Paste top"),
-      ("B.Paste", pcbnew.B_Paste, "Paste bottom"),
-      ("F.SilkS", pcbnew.F_SilkS, "Silk top"),
-      ("B.SilkS", pcbnew.B_SilkS, "Silk top"),
-      ("F.Mask", pcbnew.F_Mask, "Mask top"),
-      ("B.Mask", pcbnew.B_Mask, "Mask bottom"),
-      ("Edge.Cuts", pcbnew.Edge_Cuts, "Edges"),
-   ]
-
-   logging.info ('   Writing to %s' % output_dir)
-
-   for layer_info in layers:
-      plot_controller.SetLayer (layer_info[1])
-      plot_controller.OpenPlotfile (layer_info[0], pcbnew.PLOT_FORMAT_GERBER, layer_info[2])
-      plot_controller.PlotLayer ()
+   return plot_controller
+
 
-   plot_controller.ClosePlot()
 
+def plot_gerber_layer (plot_controller, layer_info):
+   pcbnew = get_backend ()
+   plot_controller.SetLayer (getattr (pcbnew, layer_info[1]))
+   plot_controller.OpenPlotfile (layer_info[0], pcbnew.PLOT_FORMAT_GERBER, layer_info[2])
+   plot_controller.PlotLayer ()
 
 
-def generate_pcb_drill (args):
+
+def generate_pcb_drill (args, session = None):
    logging.info ('Generating PCB drill file')
    check_args (args)
 
-   output_dir = os.path.join (args.output_dir, 'gerber')
-   if not os.path.exists (output_dir):
-      os.makedirs (output_dir)
+   if session is None:
+      session = Session (args)
+   archive = session.archive
+   output_dir = make_gerber_output_dir (args, archive)
+
+   log_output (output_dir, archive)
+
+   if getattr (args, 'drill_backend', 'pcbnew') == 'native':
+      design = session.design
+      with profiling.span ('drill', 'plot'):
+         write_native_drill (args, design, output_dir, archive)
+   else:
+      board = session.board
+      with profiling.span ('drill', 'plot'):
+         write_drill (board, output_dir)
+         if archive is not None:
+            archive.add_files (output_dir, ARCHIVE_GERBER_DIR)
+
+
+
+def write_native_drill (args, design, output_dir, archive = None):
+   # named after the board file, like pcbnew does
+   board_name = os.path.splitext (os.path.basename (args.input_pcb)) [0]
+   filename = '%s.drl' % board_name
+   if archive is not None:
+      with archive.open (ARCHIVE_GERBER_DIR + filename) as file:
+         write_excellon (file, design.holes)
+   else:
+      write_excellon (os.path.join (output_dir, filename), design.holes)
+
 
-   logging.info ('   Reading %s', args.input_pcb)
 
-   board = pcbnew.LoadBoard (args.input_pcb)
+def write_drill (board, output_dir):
+   pcbnew = get_backend ()
    excellon_writer = pcbnew.EXCELLON_WRITER (board)
 
    excellon_writer.SetMapFileFormat (pcbnew.PLOT_FORMAT_GERBER)
@@ -168,48 +474,142 @@ def generate_pcb_drill (args):
    generate_drill = True
    generate_map = False
 
-   logging.info ('   Writing to %s' % output_dir)
-
    excellon_writer.CreateDrillandMapFilesSet (
       output_dir, generate_drill, generate_map
    )
 
 
 
-def generate_bom (args):
+#-- Parallel plotting --------------------------------------------------------
+
+# Each job plots a single gerber layer, or the drill file, in its own
+# process. Workers load the board themselves, once per process, and use the
+# exact same plot settings as the serial path. With an archive, each job
+# plots to its own directory, moved to the archive as soon as it is done.
+
+def run_plot_jobs (input_pcb, output_dir, names, jobs, archive = None):
+   pool = multiprocessing.Pool (min (jobs, len (names)))
+   try:
+      with profiling.span ('plot jobs', 'plot', jobs = names):
+         if archive is None:
+            pool.map (_run_plot_job, [(input_pcb, output_dir, name) for name in names])
+         else:
+            tasks = []
+            for name in names:
+               job_dir = os.path.join (output_dir, name)
+               os.makedirs (job_dir)
+               tasks.append ((input_pcb, job_dir, name))
+            for job_dir in pool.imap_unordered (_run_plot_job, tasks):
+               archive.add_files (job_dir, ARCHIVE_GERBER_DIR)
+   finally:
+      pool.close ()
+      pool.join ()
+
+
+
+_worker_boards = {}
+
+def _run_plot_job (job):
+   input_pcb, output_dir, name = job
+
+   board = _worker_boards.get (input_pcb)
+   if board is None:
+      board = get_backend ().LoadBoard (input_pcb)
+      _worker_boards [input_pcb] = board
+
+   if name == DRILL_JOB:
+      write_drill (board, output_dir)
+   else:
+      layer_info = [layer_info for layer_info in GERBER_LAYERS if layer_info[0] == name][0]
+      plot_controller = make_gerber_plot_controller (board, output_dir)
+      plot_gerber_layer (plot_controller, layer_info)
+      plot_controller.ClosePlot ()
+
+   return output_dir
+
+
+
+def generate_bom (args, session = None):
    logging.info ('Generating BOM file')
    check_args (args)
-   design = read_design (args.input_net, args.input_pcb)
-   if not os.path.exists (args.output_dir):
+   if session is None:
+      session = Session (args)
+   design = session.design
+   archive = session.archive
+   if archive is None and not os.path.exists (args.output_dir):
       os.makedirs (args.output_dir)
-   generator = Generator (args.manufacturer)
-   logging.info ('   Writing to %s' % args.output_dir)
-   generator.process_bom (args.output_dir, design)
+   generator = Generator (args.manufacturer, archive)
+   log_output (args.output_dir, archive)
+   with profiling.span ('bom', 'generate'):
+      generator.process_bom (args.output_dir, design)
 
 
 
-def generate_pickplace (args):
+def generate_pickplace (args, session = None):
    logging.info ('Generating Pick & Place file')
    check_args (args)
-   design = read_design (args.input_net, args.input_pcb)
-   if not os.path.exists (args.output_dir):
+   if session is None:
+      session = Session (args)
+   design = session.design
+   archive = session.archive
+   if archive is None and not os.path.exists (args.output_dir):
       os.makedirs (args.output_dir)
-   generator = Generator (args.manufacturer)
-   logging.info ('   Writing to %s' % args.output_dir)
-   generator.process_pickplace (args.output_dir, design)
+   generator = Generator (args.manufacturer, archive)
+   log_output (args.output_dir, archive)
+   with profiling.span ('pickplace', 'generate'):
+      generator.process_pickplace (args.output_dir, design)
 
 
 
-def generate_assembly_plan (args):
+def generate_assembly_plan (args, session = None):
    logging.info ('Generating Assembly Plan file')
    check_args (args)
 
-   logging.info ('   Reading %s', args.input_pcb)
+   if session is None:
+      session = Session (args)
+   archive = session.archive
+
+   log_output (args.output_dir, archive)
+
+   if get_assembly_backend (args) == 'pdf':
+      write_assembly_plan (args, session.design, archive)
+   else:
+      file_svg = plot_assembly_svg (args, session.board, archive)
+      convert_assembly_svg (args, file_svg, archive)
+
+
+
+def get_assembly_backend (args):
+   backend = getattr (args, 'assembly_backend', 'svg')
+   if backend == 'svg' and not os.path.exists (RSVG_CONVERT):
+      logging.warning ('%s not found, drawing the assembly plan with the pdf backend', RSVG_CONVERT)
+      backend = 'pdf'
+   return backend
+
+
 
-   board = pcbnew.LoadBoard (args.input_pcb)
+def write_assembly_plan (args, design, archive = None):
+   filename = '%s.assembly.pdf' % design.name
+   with profiling.span ('assembly pdf', 'generate'):
+      if archive is not None:
+         with archive.open (filename, binary = True) as file:
+            write_assembly_pdf (file, design)
+      else:
+         if not os.path.exists (args.output_dir):
+            os.makedirs (args.output_dir)
+         write_assembly_pdf (os.path.join (args.output_dir, filename), design)
+
+
+
+def plot_assembly_svg (args, board, archive = None):
+   output_dir = args.output_dir
+   if archive is not None:
+      output_dir = archive.make_work_dir ()
+
+   pcbnew = get_backend ()
    plot_controller = pcbnew.PLOT_CONTROLLER (board)
    plot_options = plot_controller.GetPlotOptions ()
-   plot_options.SetOutputDirectory (args.output_dir)
+   plot_options.SetOutputDirectory (output_dir)
    plot_options.SetPlotFrameRef (False)
 
    if hasattr (plot_options, 'SetLineWidth'):
@@ -230,16 +630,21 @@ def generate_assembly_plan (args):
    plot_options.SetPlotReference (True)
    plot_options.SetPlotValue (False)
 
-   logging.info ('   Writing to %s' % args.output_dir)
+   with profiling.span ('assembly svg plot', 'plot'):
+      plot_controller.SetLayer (pcbnew.F_Fab)
+      plot_controller.OpenPlotfile ("F_Fab", pcbnew.PLOT_FORMAT_SVG, "Fab top")
+      file_svg = plot_controller.GetPlotFileName ()
+      plot_controller.PlotLayer ()
+      plot_controller.ClosePlot()
+
+   with profiling.span ('assembly svg rewrite', 'generate'):
+      add_assembly_markers (file_svg, board.GetModules ())
 
-   plot_controller.SetLayer (pcbnew.F_Fab)
-   plot_controller.OpenPlotfile ("F_Fab", pcbnew.PLOT_FORMAT_SVG, "Fab top")
-   file_svg = plot_controller.GetPlotFileName ()
-   plot_controller.PlotLayer ()
-   plot_controller.ClosePlot()
+   return file_svg
 
-   modules = board.GetModules ()
 
+
+def add_assembly_markers (file_svg, modules):
    for line in fileinput.input (file_svg, inplace = 1):
       if '</svg>' in line:
          print ('<g style="fill:#000000; fill-opacity:0.0; stroke:#ff0000; stroke-width:30; stroke-opacity:1; stroke-linecap:round; stroke-linejoin:round;">')
@@ -250,51 +655,334 @@ def generate_assembly_plan (args):
          print ('</g>')
       print (line, end = '')
 
-   project_name = os.path.basename (os.path.normpath (os.path.dirname (os.path.abspath (args.input_pcb))))
 
-   subprocess.check_call (
-      ['/usr/local/bin/rsvg-convert',
-      file_svg,
-      '--format=pdf',
-      '--output', os.path.join (args.output_dir, '%s.assembly.pdf' % project_name)],
-      cwd = PATH_THIS
-   )
+
+def convert_assembly_svg (args, file_svg, archive = None):
+   project_name = get_project_name (args.input_pcb)
+
+   # with an archive, the svg was plotted to a work directory of its own
+   output_dir = args.output_dir
+   if archive is not None:
+      output_dir = os.path.dirname (file_svg)
+
+   with profiling.span ('rsvg-convert', 'generate'):
+      subprocess.check_call (
+         [RSVG_CONVERT,
+         file_svg,
+         '--format=pdf',
+         '--output', os.path.join (output_dir, '%s.assembly.pdf' % project_name)],
+         cwd = PATH_THIS
+      )
 
    os.remove (file_svg)
 
+   if archive is not None:
+      archive.add_files (output_dir)
+
 
 
-def read_design (input_net, input_pcb):
+def log_output (output_dir, archive):
+   if archive is not None:
+      logging.info ('   Writing to %s' % archive.path)
+   else:
+      logging.info ('   Writing to %s' % output_dir)
 
-   project_name = os.path.basename (os.path.normpath (os.path.dirname (os.path.abspath (input_pcb))))
 
-   try:
-      file_net = open (input_net, 'r')
-   except IOError:
-      logging.error ("\033[91mfatal error:\033[0m `%s' file not found", input_net)
+
+def make_stages (args, session):
+   context = {}
+
+   # gerber plotting jobs load their own board when run in parallel, the
+   # drill file is always written from the session board, or the design
+   plot_needs = () if getattr (args, 'jobs', 1) > 1 else ('board',)
+   drill_needs = ('board',)
+   if getattr (args, 'drill_backend', 'pcbnew') == 'native':
+      drill_needs = ('design',)
+
+   def plot_svg ():
+      logging.info ('Generating Assembly Plan file')
+      log_output (args.output_dir, session.archive)
+      context ['svg'] = plot_assembly_svg (args, session.board, session.archive)
+
+   if get_assembly_backend (args) == 'pdf':
+      assembly_stages = [
+         Stage (
+            'assembly', lambda: generate_assembly_plan (args, session),
+            needs = ('design',), produces = ('assembly',)
+         ),
+      ]
+   else:
+      assembly_stages = [
+         Stage (
+            'assembly-svg', plot_svg,
+            needs = ('board',), produces = ('svg',)
+         ),
+         Stage (
+            'assembly', lambda: convert_assembly_svg (args, context ['svg'], session.archive),
+            needs = ('svg',), produces = ('assembly',)
+         ),
+      ]
+
+   return [
+      Stage (
+         'gerber', lambda: generate_pcb_gerber (args, session),
+         needs = plot_needs, produces = ('gerber',)
+      ),
+      Stage (
+         'drill', lambda: generate_pcb_drill (args, session),
+         needs = drill_needs, produces = ('drill',)
+      ),
+      Stage (
+         'bom', lambda: generate_bom (args, session),
+         needs = ('design',), produces = ('bom',)
+      ),
+      Stage (
+         'pickplace', lambda: generate_pickplace (args, session),
+         needs = ('design',), produces = ('pickplace',)
+      ),
+   ] + assembly_stages
+
+
+
+def run (args, session = None):
+   if session is None:
+      session = Session (args)
+
+   names = get_stage_names (args)
+
+   unknown = [name for name in names if name not in STAGE_NAMES]
+   if unknown:
+      logging.error ("\033[91mfatal error:\033[0m Unknown stage `%s'", unknown [0])
       sys.exit (1)
 
-   with file_net:
-      logging.info ('   Reading %s', input_net)
-      data_net = file_net.read ()
+   if getattr (args, 'archive', False) and session.archive is None:
+      run_archived (args, session, names)
+      return
+
+   # skip stages whose inputs, options and outputs didn't change since
+   # they were last built
+
+   manifest = BuildManifest (args.output_dir)
+   fingerprints = {}
+
+   for name in names:
+      inputs, options, patterns = STAGE_BUILD_INFO [name]
+      fingerprints [name] = manifest.fingerprint (
+         [getattr (args, input) for input in inputs],
+         dict ((option, getattr (args, option, None)) for option in options)
+      )
+
+   if not getattr (args, 'force', False):
+      up_to_date = [name for name in names if manifest.is_up_to_date (name, fingerprints [name])]
+      for name in up_to_date:
+         logging.info ('Skipping %s, up to date', name)
+      names = [name for name in names if name not in up_to_date]
+
+   if not names:
+      return
+
+   stages = select_stages (make_stages (args, session), names, SESSION_RESOURCES)
+
+   project_name = get_project_name (args.input_pcb)
+
+   def recording (stage):
+      patterns = get_output_patterns (args, stage.name)
+      function = stage.function
+      def run_and_record ():
+         function ()
+         manifest.record (
+            stage.name, fingerprints [stage.name],
+            [pattern % {'name': project_name} for pattern in patterns]
+         )
+      return run_and_record
+
+   for stage in stages:
+      if stage.name in names:
+         stage.function = recording (stage)
 
    try:
-      file_pcb = open (input_pcb, 'r')
-   except IOError:
-      logging.error ("\033[91mfatal error:\033[0m `%s' file not found", input_pcb)
-      sys.exit (1)
+      run_stages (
+         stages, getattr (args, 'jobs', 1), SESSION_RESOURCES,
+         locks = {'board': threading.Lock ()}
+      )
+   finally:
+      manifest.save ()
+
+
+
+# Runs the `names` stages into the project archive. The archive is written
+# again as a whole, so stages are never skipped as up to date, and the
+# previous archive is kept if a stage fails.
+
+def run_archived (args, session, names):
+   project_name = get_project_name (args.input_pcb)
+   archive = Archive (os.path.join (args.output_dir, '%s.zip' % project_name))
+   session.archive = archive
+
+   try:
+      stages = select_stages (make_stages (args, session), names, SESSION_RESOURCES)
+      run_stages (
+         stages, getattr (args, 'jobs', 1), SESSION_RESOURCES,
+         locks = {'board': threading.Lock ()}
+      )
+   except:
+      archive.abort ()
+      raise
+   else:
+      archive.close ()
+      logging.info ('Archived to %s' % archive.path)
+   finally:
+      session.archive = None
+
 
-   with file_pcb:
-      logging.info ('   Reading %s', input_pcb)
-      data_pcb = file_pcb.read ()
 
-   parser = Parser (project_name, data_net, data_pcb)
-   design = parser.parse ()
+# Returns the names of the stages `args` asks for
+
+def get_stage_names (args):
+   if getattr (args, 'stages', None):
+      return [name.strip () for name in args.stages.split (',')]
+   return STAGE_NAMES
+
+
+
+# Returns the design contents, among DESIGN_CONTENTS, the stages of `args`
+# read: the holes for the native drill file, the fab drawings for the pdf
+# assembly plan. The other stages only need the components and fiducials.
+
+def get_design_contents (args):
+   names = get_stage_names (args)
+   contents = []
+   if 'drill' in names and getattr (args, 'drill_backend', 'pcbnew') == 'native':
+      contents.append ('holes')
+   if 'assembly' in names and (
+      getattr (args, 'assembly_backend', 'svg') == 'pdf' or not os.path.exists (RSVG_CONVERT)
+   ):
+      contents.append ('drawings')
+   return tuple (contents)
+
+
+
+# Returns the output file patterns of the `stage_name` stage
+
+def get_output_patterns (args, stage_name):
+   inputs, options, patterns = STAGE_BUILD_INFO [stage_name]
+   patterns = list (patterns)
+
+   attribute = MANUFACTURER_OUTPUTS.get (stage_name)
+   if attribute is not None:
+      names = get_manufacturer_names (args.manufacturer)
+      for name in names:
+         pattern = getattr (get_manufacturer (name), attribute) % '%(name)s'
+         if len (names) > 1:
+            pattern = os.path.join (name, pattern)
+         patterns.append (pattern)
+
+   return patterns
+
+
+
+def get_project_name (input_pcb):
+   return os.path.basename (os.path.normpath (os.path.dirname (os.path.abspath (input_pcb))))
+
+
+
+def load_design (args):
+   cache = None
+   cache_dir = getattr (args, 'cache_dir', None)
+   if cache_dir is not None:
+      cache_size = getattr (args, 'cache_size', CACHE_DEFAULT_MAX_SIZE // (1024 * 1024))
+      cache = get_cache (cache_dir, cache_size * 1024 * 1024)
+
+   return read_design (
+      args.input_net, args.input_pcb,
+      engine = getattr (args, 'parser_engine', 'token'),
+      use_mmap = getattr (args, 'use_mmap', False),
+      columnar = getattr (args, 'columnar', False),
+      cache = cache,
+      jobs = getattr (args, 'jobs', 1),
+      contents = get_design_contents (args)
+   )
+
+
+
+# Returns a parser of the design of `args` which can update it as the pcb
+# file changes. Files are read rather than memory mapped, as the parser keeps
+# their content to compare it to the next one, and the design cache is not
+# used.
+
+def make_incremental_parser (args):
+   return Parser (
+      get_project_name (args.input_pcb),
+      read_file (args.input_net), read_file (args.input_pcb),
+      engine = getattr (args, 'parser_engine', 'token'),
+      columnar = getattr (args, 'columnar', False),
+      incremental = True,
+      contents = get_design_contents (args)
+   )
+
+
+
+def read_design (
+   input_net, input_pcb, engine = 'token', stream = True, use_mmap = False, columnar = False, cache = None,
+   jobs = 1, contents = DESIGN_CONTENTS
+):
+
+   project_name = get_project_name (input_pcb)
+
+   cache_key = None
+   if cache is not None:
+      try:
+         cache_key = cache.key (project_name, input_net, input_pcb, contents)
+      except IOError:
+         pass # reported below
+
+   if cache_key is not None:
+      with profiling.span ('cache load', 'read'):
+         design = cache.load (cache_key, columnar)
+      if design is not None:
+         logging.info ('   Using cached design for %s', input_pcb)
+         return design
+
+   data_net = read_file (input_net, use_mmap)
+   data_pcb = read_file (input_pcb, use_mmap)
+
+   try:
+      parser = Parser (
+         project_name, data_net, data_pcb, engine, stream, columnar, jobs, contents = contents
+      )
+      design = parser.parse ()
+
+   finally:
+      for data in (data_net, data_pcb):
+         if isinstance (data, mmap.mmap):
+            data.close ()
+
+   if cache_key is not None:
+      with profiling.span ('cache store', 'read'):
+         cache.store (cache_key, design)
 
    return design
 
 
 
+def read_file (path, use_mmap = False):
+   try:
+      file = open (path, 'rb' if use_mmap else 'r')
+   except IOError:
+      logging.error ("\033[91mfatal error:\033[0m `%s' file not found", path)
+      sys.exit (1)
+
+   with file, profiling.span ('read %s' % os.path.basename (path), 'read'):
+      logging.info ('   Reading %s', path)
+      if not use_mmap:
+         return file.read ()
+      if os.fstat (file.fileno ()).st_size == 0:
+         # empty files can't be mapped
+         return b''
+      return mmap.mmap (file.fileno (), 0, access = mmap.ACCESS_READ)
+
+
+
 def check_args (args):
    if args.input_net is None:
       logging.error ("\033[91mfatal error:\033[0m No input net file")
@@ -320,12 +1008,49 @@ def main (args):
       args.stream = sys.stdout
    logging.basicConfig (format = '%(message)s', level = args.logging_level, stream = args.stream)
 
+   if getattr (args, 'trigger', False):
+      if getattr (args, 'watch_port', None) is None:
+         logging.error ("\033[91mfatal error:\033[0m --trigger needs the --watch-port of the watcher")
+         sys.exit (1)
+      if not send_trigger (args.watch_port, getattr (args, 'force', False)):
+         sys.exit (1)
+      return
+
+   if getattr (args, 'batch', None) is not None:
+      for option in ('profile', 'watch'):
+         if getattr (args, option, None):
+            logging.warning ('--%s is ignored in batch mode', option)
+      projects = read_projects (args.batch, args.output_dir)
+      if getattr (args, 'consolidated_bom', False):
+         results = consolidate_bom (args, projects, args.output_dir, getattr (args, 'jobs', 1))
+      else:
+         results = run_batch (args, projects, getattr (args, 'jobs', 1))
+      if not all (result.ok for result in results):
+         sys.exit (1)
+      return
+
    check_args (args)
 
-   generate_pcb (args)
-   generate_bom (args)
-   generate_pickplace (args)
-   generate_assembly_plan (args)
+   if getattr (args, 'watch', False):
+      build = lambda args: watch (args, getattr (args, 'watch_port', None))
+   else:
+      build = run
+
+   profile = getattr (args, 'profile', None)
+   if profile is None:
+      build (args)
+      return
+
+   profiler = Profiler (trace_memory = getattr (args, 'profile_memory', False))
+   set_profiler (profiler)
+   try:
+      with profiling.span ('run'):
+         build (args)
+   finally:
+      set_profiler (None)
+      profiler.stop ()
+      profiler.write_trace (profile)
+      logging.info ('Profile written to %s\n%s', profile, profiler.summary ())
 
 
 
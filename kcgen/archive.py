@@ -0,0 +1,167 @@
+##############################################################################
+#
+#     archive.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import contextlib
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from . import profiling
+
+
+
+# Name of the archive entry listing the SHA256 of every other entry, in the
+# `sha256sum` format, so that `sha256sum -c SHA256SUMS` checks the extracted
+# files.
+
+CHECKSUMS_NAME = 'SHA256SUMS'
+
+BLOCK_SIZE = 1024 * 1024
+
+
+
+class Archive (object):
+
+   # Writes production files into the zip archive at `path` as they are
+   # generated, and computes their checksums on the way. Files are either
+   # written to an entry with `open`, or, for the ones pcbnew plots to a
+   # directory, moved into the archive with `add_files` once plotted. Entries
+   # are written to a temporary file first, then added to the archive one at
+   # a time, stages running in parallel waiting for each other. The archive
+   # is written to a temporary file, and only replaces `path` once closed.
+
+   def __init__ (self, path):
+      self.path = path
+      directory = os.path.dirname (os.path.abspath (path))
+      if not os.path.exists (directory):
+         os.makedirs (directory)
+      self._temp_path = path + '.tmp'
+      self._zip = zipfile.ZipFile (self._temp_path, 'w', zipfile.ZIP_DEFLATED, allowZip64 = True)
+      self._checksums = {}
+      self._lock = threading.Lock ()
+      self._work_dir = None
+
+
+   #-- open --------------------------------------------------------------------
+   # Returns a context manager writing the entry `name`, as text or binary
+
+   @contextlib.contextmanager
+   def open (self, name, binary = False):
+      fd, path = tempfile.mkstemp (dir = self._get_work_dir ())
+      os.close (fd)
+      try:
+         with profiling.span ('archive %s' % name, 'write'):
+            with (open (path, 'wb') if binary else _open_text (path)) as file:
+               yield file
+            self._add (path, name)
+      finally:
+         os.remove (path)
+
+
+   #-- add_files ---------------------------------------------------------------
+   # Moves the files of `directory` into the archive, under `prefix`
+
+   def add_files (self, directory, prefix = ''):
+      for filename in sorted (os.listdir (directory)):
+         path = os.path.join (directory, filename)
+         if not os.path.isfile (path):
+            continue
+         with profiling.span ('archive %s' % (prefix + filename), 'write'):
+            self._add (path, prefix + filename)
+         os.remove (path)
+
+
+   #-- make_work_dir -----------------------------------------------------------
+   # Returns a new empty directory for pcbnew to plot to, removed with the
+   # archive
+
+   def make_work_dir (self):
+      return tempfile.mkdtemp (dir = self._get_work_dir ())
+
+
+   #-- close -------------------------------------------------------------------
+   # Writes the checksums, and replaces `path` with the archive
+
+   def close (self):
+      checksums = ''.join (
+         '%s  %s\n' % (self._checksums [name], name) for name in sorted (self._checksums)
+      )
+      with self._lock:
+         self._zip.writestr (CHECKSUMS_NAME, checksums)
+         self._zip.close ()
+      replace_file (self._temp_path, self.path)
+      self._remove_work_dir ()
+
+
+   #-- abort -------------------------------------------------------------------
+   # Drops the archive, leaving `path` as it was
+
+   def abort (self):
+      with self._lock:
+         self._zip.close ()
+      os.remove (self._temp_path)
+      self._remove_work_dir ()
+
+
+   #-- _add --------------------------------------------------------------------
+   # Adds the file at `path` as the entry `name`, along with its checksum
+
+   def _add (self, path, name):
+      digest = hashlib.sha256 ()
+      with open (path, 'rb') as file:
+         for block in iter (lambda: file.read (BLOCK_SIZE), b''):
+            digest.update (block)
+      with self._lock:
+         self._zip.write (path, name)
+         self._checksums [name] = digest.hexdigest ()
+
+
+   #-- _get_work_dir -----------------------------------------------------------
+
+   def _get_work_dir (self):
+      with self._lock:
+         if self._work_dir is None:
+            self._work_dir = tempfile.mkdtemp (prefix = 'kcgen-archive-')
+      return self._work_dir
+
+
+   #-- _remove_work_dir --------------------------------------------------------
+
+   def _remove_work_dir (self):
+      if self._work_dir is not None:
+         shutil.rmtree (self._work_dir, ignore_errors = True)
+         self._work_dir = None
+
+
+
+#-- _open_text ----------------------------------------------------------------
+# Opens `path` for the text the generators write, utf-8 encoded with newlines
+# kept as they are: native strings, which are bytes on python 2
+
+if str is bytes:
+   def _open_text (path):
+      return open (path, 'wb')
+else:
+   def _open_text (path):
+      return io.open (path, 'w', encoding = 'utf-8', newline = '')
+
+
+
+#-- replace_file --------------------------------------------------------------
+# Moves the file at `source` to `destination`, replacing it if it exists.
+# os.replace is python 3 only, and os.rename doesn't replace files on windows.
+
+if hasattr (os, 'replace'):
+   replace_file = os.replace
+else:
+   def replace_file (source, destination):
+      if os.name == 'nt' and os.path.exists (destination):
+         os.remove (destination)
+      os.rename (source, destination)
@@ -0,0 +1,129 @@
+##############################################################################
+#
+#     assembly.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+from .ast import Segment, Circle
+from .geometry import bounds
+from .pdf import PdfDocument
+
+
+
+PAGE_MARGIN = 10.0
+
+# (side, fab layer) of each page, the bottom page is mirrored to show the
+# board as seen from below
+
+SIDES = (('top', 'F.Fab'), ('bottom', 'B.Fab'))
+
+FAB_LINE_WIDTH = 0.1
+EDGE_LINE_WIDTH = 0.1
+REFERENCE_SIZE = 1.0
+
+# position markers, same as the ones added to the pcbnew svg plot
+
+MARKER_SIZE = 0.254
+MARKER_LINE_WIDTH = 0.0762
+
+
+
+#-- write_assembly_pdf --------------------------------------------------------
+# Writes the assembly plan of `design` to `output`, a path or a binary file:
+# the board outline, the fab layer outlines, the references and a cross
+# marking the position of each component and fiducial, one page per
+# populated side.
+
+def write_assembly_pdf (output, design):
+   left, top, right, bottom = _extents (design)
+
+   document = PdfDocument ()
+
+   for side, layer in SIDES:
+      components = design.find_components_by_side (side)
+      fiducials = [f for f in design.fiducials if f.side == side]
+      drawings = [d for d in design.drawings if d.layer == layer]
+
+      if side != 'top' and not components and not fiducials and not drawings:
+         continue
+
+      if side == 'top':
+         def to_page (x, y):
+            return (x - left + PAGE_MARGIN, y - top + PAGE_MARGIN)
+      else:
+         def to_page (x, y):
+            return (right - x + PAGE_MARGIN, y - top + PAGE_MARGIN)
+
+      page = document.add_page (right - left + 2 * PAGE_MARGIN, bottom - top + 2 * PAGE_MARGIN)
+
+      edges = [d for d in design.drawings if d.layer == 'Edge.Cuts']
+      page.set_stroke_color (0.0, 0.0, 0.0)
+      page.set_line_width (EDGE_LINE_WIDTH)
+      _draw (page, edges, to_page)
+
+      page.set_stroke_color (0.3, 0.3, 0.3)
+      page.set_line_width (FAB_LINE_WIDTH)
+      _draw (page, drawings, to_page)
+
+      page.set_fill_color (0.0, 0.0, 0.0)
+      for component in components:
+         x, y = to_page (component.position.x, component.position.y)
+         page.text (x, y - 2 * MARKER_SIZE, REFERENCE_SIZE, component.reference)
+
+      page.set_stroke_color (1.0, 0.0, 0.0)
+      page.set_line_width (MARKER_LINE_WIDTH)
+      markers = []
+      for item in components + fiducials:
+         x, y = to_page (item.position.x, item.position.y)
+         markers.append (((x - MARKER_SIZE, y), (x + MARKER_SIZE, y)))
+         markers.append (((x, y - MARKER_SIZE), (x, y + MARKER_SIZE)))
+      page.lines (markers)
+
+   document.write (output)
+
+
+
+#-- _draw ---------------------------------------------------------------------
+
+def _draw (page, drawings, to_page):
+   segments = [
+      (to_page (d.start.x, d.start.y), to_page (d.end.x, d.end.y))
+      for d in drawings if isinstance (d, Segment)
+   ]
+   if segments:
+      page.lines (segments)
+
+   for drawing in drawings:
+      if isinstance (drawing, Circle):
+         x, y = to_page (drawing.center.x, drawing.center.y)
+         page.circle (x, y, drawing.radius)
+
+
+
+#-- _extents ------------------------------------------------------------------
+# Returns the board outline, or the bounds of everything drawn if the board
+# has no edge cuts
+
+def _extents (design):
+   outline = design.outline
+   if outline.left is not None:
+      return (outline.left, outline.top, outline.right, outline.bottom)
+
+   xs = []
+   ys = []
+   for drawing in design.drawings:
+      if isinstance (drawing, Segment):
+         xs.extend ((drawing.start.x, drawing.end.x))
+         ys.extend ((drawing.start.y, drawing.end.y))
+      else:
+         xs.extend ((drawing.center.x - drawing.radius, drawing.center.x + drawing.radius))
+         ys.extend ((drawing.center.y - drawing.radius, drawing.center.y + drawing.radius))
+   for item in list (design.components.values ()) + design.fiducials:
+      xs.append (item.position.x)
+      ys.append (item.position.y)
+
+   if not xs:
+      return (0.0, 0.0, 0.0, 0.0)
+
+   return bounds (xs, ys)
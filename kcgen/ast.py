@@ -7,8 +7,26 @@
 
 #pylint: disable=too-many-instance-attributes
 
+import re
+from array import array
+from .geometry import coordinates
+
+
+
+_NATURAL_RE = re.compile (r'(\d+)')
+
+#-- natural_key ---------------------------------------------------------------
+# Sort key ordering references the way a human would, e.g. R2 before R10
+
+def natural_key (reference):
+   parts = _NATURAL_RE.split (reference)
+   parts [1::2] = [int (part) for part in parts [1::2]]
+   return parts
+
 
 class Point (object):
+   __slots__ = ('x', 'y')
+
    def __init__ (self):
       self.x = 0.0
       self.y = 0.0
@@ -18,6 +36,8 @@ class Point (object):
 
 
 class Rect (object):
+   __slots__ = ('left', 'right', 'top', 'bottom')
+
    def __init__ (self):
       self.left = 0.0
       self.right = 0.0
@@ -30,15 +50,18 @@ class Rect (object):
 
 
 class Design (object):
-   def __init__ (self):
+   def __init__ (self, columnar = False):
       self.name = ""
       self.date = ""
       self.outline = Rect ()
       self.components = {}
       self.fiducials = []
+      self.drawings = []
+      self.holes = []
       self.references = []
       self.descriptions = set ()
-
+      self.columns = ComponentColumns () if columnar else None
+      self._indexes = None
    def __str__ (self):
       ret =  'name: %s\n' % self.name
       ret += 'date: %s\n' % self.date
@@ -49,24 +72,94 @@ class Design (object):
       ret += 'fiducials:\n'
       for fiducial in self.fiducials:
          ret += '%s\n' % fiducial
+      ret += 'drawings:\n'
+      for drawing in self.drawings:
+         ret += '   %s\n' % drawing
+      ret += 'holes:\n'
+      for hole in self.holes:
+         ret += '   %s\n' % hole
       ret += 'references: %s\n' % self.references
       ret += 'descriptions: %s' % self.descriptions
       return ret
 
+   # Returns a new component to fill and add with 'add_component'. For
+   # columnar designs, its position, rotation and side are stored in
+   # 'columns'.
+
+   def new_component (self):
+      if self.columns is None:
+         return Component ()
+      return ComponentView (self.columns, self.columns.append ())
+
+   def add_component (self, component):
+      self.components [component.reference] = component
+      self.descriptions.add (component.description)
+      self._indexes = None
+
+   # Returns the x, y and rotation arrays of the components, in
+   # 'components' order. Columnar designs return their columns directly
+   # when 'components' iterates over the rows in order, which dicts don't
+   # always do, and else gather the rows of the components.
+
+   def placements (self):
+      components = list (self.components.values ())
+      if self.columns is not None:
+         rows = [getattr (component, '_row', None) for component in components]
+         if rows == list (range (len (self.columns))):
+            return (self.columns.x, self.columns.y, self.columns.rotation)
+         if None not in rows:
+            return tuple (
+               array ('d', [column [row] for row in rows])
+               for column in (self.columns.x, self.columns.y, self.columns.rotation)
+            )
+      xs, ys = coordinates (components)
+      return (xs, ys, array ('d', [component.rotation for component in components]))
+
    def find_component (self, reference):
-      for key, component in self.components.items ():
-         if key == reference:
-            return component
-      return None
+      return self.components.get (reference)
+
+   def find_components_by_description (self, description):
+      return self._index ('description').get (description, [])
+
+   def find_components_by_part_number (self, part_number):
+      return self._index ('distributor_part_number').get (part_number, [])
+
+   def find_components_by_side (self, side):
+      return self._index ('side').get (side, [])
+
+   # Returns the components by `attribute`, among 'description',
+   # 'distributor_part_number' and 'side'. The lists must not be changed.
+
+   def group_components (self, attribute):
+      return self._index (attribute)
+
+   # Indexes are built on first lookup, in a single pass over the components
+   # sorted in natural reference order. Call 'invalidate_indexes' after
+   # changing the indexed attributes of components already added.
 
+   def invalidate_indexes (self):
+      self._indexes = None
+
+   def _index (self, attribute):
+      if self._indexes is None:
+         indexes = {'description': {}, 'distributor_part_number': {}, 'side': {}}
+         components = sorted (self.components.values (), key = lambda c: natural_key (c.reference))
+         for component in components:
+            for name, index in indexes.items ():
+               index.setdefault (getattr (component, name), []).append (component)
+         self._indexes = indexes
+      return self._indexes [attribute]
+
+
+class _ComponentFields (object):
+   __slots__ = (
+      'reference', 'value', 'device', 'package', 'description', 'place',
+      'distributor', 'distributor_part_number', 'distributor_link', 'remark'
+   )
 
-class Component (object):
    def __init__ (self):
       self.reference = ""
       self.value = ""
-      self.position = Point ()
-      self.rotation = 0.0
-      self.side = ""
       self.device = ""
       self.package = ""
       self.description = ""
@@ -94,8 +187,100 @@ class Component (object):
       return ret
 
 
+class Component (_ComponentFields):
+   __slots__ = ('position', 'rotation', 'side')
+
+   def __init__ (self):
+      _ComponentFields.__init__ (self)
+      self.position = Point ()
+      self.rotation = 0.0
+      self.side = ""
+
+
+
+#-- ComponentColumns ----------------------------------------------------------
+# Columnar store of the numeric data of components, one row per component
+
+SIDES = ('', 'top', 'bottom')
+_SIDE_CODES = dict ((side, code) for code, side in enumerate (SIDES))
+
+class ComponentColumns (object):
+   __slots__ = ('x', 'y', 'rotation', 'side')
+
+   def __init__ (self):
+      self.x = array ('d')
+      self.y = array ('d')
+      self.rotation = array ('d')
+      self.side = array ('B')
+
+   def __len__ (self):
+      return len (self.side)
+
+   def append (self):
+      self.x.append (0.0)
+      self.y.append (0.0)
+      self.rotation.append (0.0)
+      self.side.append (0)
+      return len (self.side) - 1
+
+
+class _PointView (object):
+   __slots__ = ('_columns', '_row')
+
+   def __init__ (self, columns, row):
+      self._columns = columns
+      self._row = row
+
+   def _get_x (self):
+      return self._columns.x [self._row]
+
+   def _set_x (self, x):
+      self._columns.x [self._row] = x
+
+   def _get_y (self):
+      return self._columns.y [self._row]
+
+   def _set_y (self, y):
+      self._columns.y [self._row] = y
+
+   x = property (_get_x, _set_x)
+   y = property (_get_y, _set_y)
+
+   __str__ = Point.__str__
+
+
+class ComponentView (_ComponentFields):
+   __slots__ = ('_columns', '_row')
+
+   def __init__ (self, columns, row):
+      _ComponentFields.__init__ (self)
+      self._columns = columns
+      self._row = row
+
+   def _get_position (self):
+      return _PointView (self._columns, self._row)
+
+   def _get_rotation (self):
+      return self._columns.rotation [self._row]
+
+   def _set_rotation (self, rotation):
+      self._columns.rotation [self._row] = rotation
+
+   def _get_side (self):
+      return SIDES [self._columns.side [self._row]]
+
+   def _set_side (self, side):
+      self._columns.side [self._row] = _SIDE_CODES [side]
+
+   position = property (_get_position)
+   rotation = property (_get_rotation, _set_rotation)
+   side = property (_get_side, _set_side)
+
+
 
 class Fiducial (object):
+   __slots__ = ('reference', 'position', 'side')
+
    def __init__ (self):
       self.reference = ""
       self.position = Point ()
@@ -107,3 +292,56 @@ class Fiducial (object):
       ret += '      side: %s\n' % self.side
       ret += '   }'
       return ret
+
+
+
+#-- drawings ------------------------------------------------------------------
+# Graphic items of the board, in board coordinates
+
+class Segment (object):
+   __slots__ = ('layer', 'start', 'end', 'width')
+
+   def __init__ (self):
+      self.layer = ""
+      self.start = Point ()
+      self.end = Point ()
+      self.width = 0.0
+
+   def __str__ (self):
+      return 'segment %s: start: %s end: %s width: %s' % (self.layer, self.start, self.end, self.width)
+
+
+class Circle (object):
+   __slots__ = ('layer', 'center', 'radius', 'width')
+
+   def __init__ (self):
+      self.layer = ""
+      self.center = Point ()
+      self.radius = 0.0
+      self.width = 0.0
+
+   def __str__ (self):
+      return 'circle %s: center: %s radius: %s width: %s' % (self.layer, self.center, self.radius, self.width)
+
+
+
+#-- Hole ----------------------------------------------------------------------
+# Drilled hole of a pad or a via, in board coordinates. `end` is the other
+# end of oval holes (slots), None for round holes.
+
+class Hole (object):
+   __slots__ = ('position', 'end', 'diameter', 'plated')
+
+   def __init__ (self):
+      self.position = Point ()
+      self.end = None
+      self.diameter = 0.0
+      self.plated = True
+
+   def __str__ (self):
+      ret = 'hole %s: position: %s' % (self.diameter, self.position)
+      if self.end is not None:
+         ret += ' end: %s' % self.end
+      if not self.plated:
+         ret += ' not plated'
+      return ret
@@ -0,0 +1,115 @@
+##############################################################################
+#
+#     backend.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import logging
+import platform
+import sys
+import threading
+
+
+
+# The board backend is the pcbnew module, imported the first time a stage
+# needs the board, so that parsing only runs start fast and work without
+# KiCad. Any object with the same interface can be plugged in instead with
+# 'set_backend'.
+
+_backend = None
+_lock = threading.Lock ()
+
+
+
+#-- get_backend ---------------------------------------------------------------
+
+def get_backend ():
+   global _backend
+   with _lock:
+      if _backend is None:
+         _backend = load_pcbnew ()
+      return _backend
+
+
+
+#-- set_backend ---------------------------------------------------------------
+# Uses `backend` instead of pcbnew, None to go back to pcbnew
+
+def set_backend (backend):
+   global _backend
+   with _lock:
+      _backend = backend
+
+
+
+#-- load_pcbnew ---------------------------------------------------------------
+
+def load_pcbnew ():
+   if platform.system () == 'Darwin':
+      path = "/Applications/Kicad/kicad.app/Contents/Frameworks/python/site-packages/"
+   elif platform.system () == 'Windows':
+      path = "C:/Program Files/KiCad/lib/python2.7/site-packages/"
+   else:
+      path = None
+
+   if path is not None and path not in sys.path:
+      sys.path.insert (0, path)
+
+   try:
+      import pcbnew
+   except ImportError:
+      logging.error ("\033[91mfatal error:\033[0m pcbnew not found, KiCad is needed to plot the board")
+      sys.exit (1)
+
+   return pcbnew
+
+
+
+class RecordingBackend (object):
+
+   # Stands in for pcbnew in tests. Any attribute is a recorder: calling it
+   # appends (name, args) to `calls` and returns a new recorder, or the
+   # value `results` maps the name to, e.g. {'GetModules': []}.
+
+   def __init__ (self, results = None):
+      self.calls = []
+      self.results = dict (results or {})
+      self._lock = threading.Lock ()
+
+   def __getattr__ (self, name):
+      if name.startswith ('__'):
+         raise AttributeError (name)
+      return _Recorder (self, name)
+
+   def record (self, name, args):
+      with self._lock:
+         self.calls.append ((name, args))
+      if name in self.results:
+         return self.results [name]
+      return _Recorder (self, name)
+
+   def count (self, name):
+      return len ([call for call in self.calls if call [0] == name])
+
+
+
+class _Recorder (object):
+
+   def __init__ (self, backend, name):
+      self._backend = backend
+      self._name = name
+
+   def __getattr__ (self, name):
+      if name.startswith ('__'):
+         raise AttributeError (name)
+      return _Recorder (self._backend, name)
+
+   def __call__ (self, *args):
+      return self._backend.record (self._name, args)
+
+   def __iter__ (self):
+      return iter (())
+
+   def __repr__ (self):
+      return '<%s>' % self._name
@@ -0,0 +1,246 @@
+##############################################################################
+#
+#     batch.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from .cache import DEFAULT_MAX_SIZE as CACHE_DEFAULT_MAX_SIZE
+
+
+
+# Options forwarded from the batch arguments to each project, with their
+# defaults. Project entries of a manifest may override them.
+
+PROJECT_OPTIONS = (
+   ('manufacturer', 'pcbpool'),
+   ('stages', None),
+   ('force', False),
+   ('parser_engine', 'token'),
+   ('use_mmap', False),
+   ('columnar', False),
+   ('assembly_backend', 'svg'),
+   ('drill_backend', 'pcbnew'),
+   ('archive', False),
+   ('cache_dir', None),
+   ('cache_size', CACHE_DEFAULT_MAX_SIZE // (1024 * 1024)),
+)
+
+
+
+class Project (object):
+   def __init__ (self):
+      self.name = ""
+      self.input_net = None
+      self.input_pcb = None
+      self.output_dir = None
+      self.quantity = 1
+      self.options = {}
+
+   def __str__ (self):
+      return '%s: net: %s pcb: %s output: %s' % (self.name, self.input_net, self.input_pcb, self.output_dir)
+
+
+
+class Result (object):
+   def __init__ (self, name):
+      self.name = name
+      self.ok = False
+      self.error = ""
+      self.elapsed = 0.0
+
+
+
+#-- read_projects ------------------------------------------------------------
+
+# Reads projects from either a JSON manifest or a directory.
+#
+# A manifest is a list of projects, or an object with a `projects` list.
+# Each project has `input_net`, `input_pcb` and optionally `name`,
+# `output_dir`, `quantity`, the number of boards built for a consolidated
+# BOM, and any of PROJECT_OPTIONS. Relative paths are relative to the
+# manifest.
+#
+# In a directory, each sub-directory holding a net and a kicad_pcb file is
+# a project.
+#
+# Projects without an output directory are written to a sub-directory of
+# `output_dir` named after them.
+
+def read_projects (path, output_dir):
+   if os.path.isdir (path):
+      projects = _read_directory (path)
+   else:
+      projects = _read_manifest (path)
+
+   for project in projects:
+      if project.output_dir is None:
+         project.output_dir = os.path.join (output_dir, project.name)
+
+   return projects
+
+
+
+def _read_manifest (path):
+   with open (path, 'r') as file:
+      manifest = json.load (file)
+
+   if isinstance (manifest, dict):
+      manifest = manifest.get ('projects', [])
+
+   base_dir = os.path.dirname (os.path.abspath (path))
+
+   def resolve (entry_path):
+      if entry_path is None:
+         return None
+      return os.path.join (base_dir, entry_path)
+
+   projects = []
+   for entry in manifest:
+      project = Project ()
+      project.input_net = resolve (entry.get ('input_net'))
+      project.input_pcb = resolve (entry.get ('input_pcb'))
+      project.output_dir = resolve (entry.get ('output_dir'))
+      project.name = entry.get ('name')
+      if project.name is None and project.input_pcb is not None:
+         project.name = os.path.basename (os.path.dirname (project.input_pcb))
+      project.quantity = entry.get ('quantity', 1)
+      if type (project.quantity) is not int or project.quantity < 0:
+         logging.error (
+            "\033[91mfatal error:\033[0m Invalid quantity `%s' of project %s",
+            project.quantity, project.name
+         )
+         sys.exit (1)
+      for option, default in PROJECT_OPTIONS:
+         if option in entry:
+            project.options [option] = entry [option]
+      projects.append (project)
+
+   return projects
+
+
+
+def _read_directory (path):
+   projects = []
+
+   for name in sorted (os.listdir (path)):
+      project_dir = os.path.join (path, name)
+      if not os.path.isdir (project_dir):
+         continue
+
+      filenames = sorted (os.listdir (project_dir))
+      nets = [filename for filename in filenames if filename.endswith ('.net')]
+      pcbs = [filename for filename in filenames if filename.endswith ('.kicad_pcb')]
+      if not nets or not pcbs:
+         continue
+
+      project = Project ()
+      project.name = name
+      project.input_net = os.path.join (project_dir, nets [0])
+      project.input_pcb = os.path.join (project_dir, pcbs [0])
+      projects.append (project)
+
+   return projects
+
+
+
+#-- make_project_args --------------------------------------------------------
+
+def make_project_args (args, project):
+   project_args = argparse.Namespace ()
+   project_args.logging_level = getattr (args, 'logging_level', logging.INFO)
+   project_args.input_net = project.input_net
+   project_args.input_pcb = project.input_pcb
+   project_args.output_dir = project.output_dir
+   project_args.jobs = 1
+
+   for option, default in PROJECT_OPTIONS:
+      value = project.options.get (option, getattr (args, option, default))
+      setattr (project_args, option, value)
+
+   return project_args
+
+
+
+#-- run_batch ----------------------------------------------------------------
+
+# Runs every project on a pool of `jobs` processes. Failures are collected
+# instead of stopping the batch. Returns the list of results, in projects
+# order.
+
+def run_batch (args, projects, jobs = 1):
+   tasks = [(project.name, make_project_args (args, project)) for project in projects]
+
+   start = time.time ()
+
+   if jobs <= 1:
+      results = [_run_project (task) for task in tasks]
+   else:
+      pool = multiprocessing.Pool (min (jobs, max (len (tasks), 1)))
+      try:
+         results = pool.map (_run_project, tasks, chunksize = 1)
+      finally:
+         pool.close ()
+         pool.join ()
+
+   log_summary (results, time.time () - start)
+
+   return results
+
+
+
+def _run_project (task):
+   from . import run, check_args
+
+   name, project_args = task
+   result = Result (name)
+   start = time.time ()
+
+   try:
+      logging.info ('Project %s', name)
+      check_args (project_args)
+      run (project_args)
+      result.ok = True
+
+   except SystemExit:
+      # fatal errors are logged where they are raised
+      result.error = 'fatal error'
+
+   except Exception as e:
+      logging.debug (traceback.format_exc ())
+      result.error = '%s: %s' % (type (e).__name__, e)
+
+   result.elapsed = time.time () - start
+
+   return result
+
+
+
+#-- log_summary --------------------------------------------------------------
+
+def log_summary (results, elapsed):
+   width = max ([len (result.name) for result in results] + [4])
+
+   logging.info ('Batch summary:')
+   for result in results:
+      if result.ok:
+         logging.info ('   %-*s  ok      %7.2fs', width, result.name, result.elapsed)
+      else:
+         logging.error (
+            '   %-*s  \033[91mFAILED\033[0m  %7.2fs  %s',
+            width, result.name, result.elapsed, result.error
+         )
+
+   failed = len ([result for result in results if not result.ok])
+   logging.info (
+      '%d projects, %d succeeded, %d failed in %.2fs',
+      len (results), len (results) - failed, failed, elapsed
+   )
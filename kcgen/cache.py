@@ -0,0 +1,295 @@
+##############################################################################
+#
+#     cache.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import hashlib
+import logging
+import marshal
+import os
+import struct
+import zlib
+from .archive import replace_file
+from .ast import Design, Fiducial, Segment, Circle, Hole, Point
+from .parser import PARSER_VERSION, DESIGN_CONTENTS
+
+
+
+# Snapshot file layout:
+# - magic, snapshot format version and marshal version (header),
+# - zlib compressed marshal of plain tuples, see `_encode`.
+
+MAGIC = b'KCGD'
+FORMAT_VERSION = 3
+
+_HEADER = struct.Struct ('<4sHH')
+
+EXTENSION = '.kcd'
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+_caches = {}
+
+
+
+#-- file_digest --------------------------------------------------------------
+
+def file_digest (path):
+   digest = hashlib.sha256 ()
+   with open (path, 'rb') as file:
+      for block in iter (lambda: file.read (1024 * 1024), b''):
+         digest.update (block)
+   return digest.digest ()
+
+
+
+#-- get_cache ----------------------------------------------------------------
+
+# Returns the cache for `directory`, shared across calls so that its hit
+# and miss counters cover the whole run.
+
+def get_cache (directory, max_size = DEFAULT_MAX_SIZE):
+   directory = os.path.abspath (directory)
+   cache = _caches.get (directory)
+   if cache is None:
+      cache = DesignCache (directory, max_size)
+      _caches [directory] = cache
+   return cache
+
+
+
+class DesignCache (object):
+
+   def __init__ (self, directory, max_size = DEFAULT_MAX_SIZE):
+      self.directory = directory
+      self.max_size = max_size
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+
+   #-- key ---------------------------------------------------------------------
+
+   # designs read with other contents are other entries
+
+   def key (self, name, input_net, input_pcb, contents = DESIGN_CONTENTS):
+      digest = hashlib.sha256 ()
+      digest.update (
+         ('%s\n%s\n%s\n' % (PARSER_VERSION, name, ','.join (sorted (contents)))).encode ('utf-8')
+      )
+      for path in (input_net, input_pcb):
+         digest.update (file_digest (path))
+      return digest.hexdigest ()
+
+
+
+   #-- load --------------------------------------------------------------------
+
+   def load (self, key, columnar = False):
+      path = self._path (key)
+      try:
+         with open (path, 'rb') as file:
+            data = file.read ()
+         design = self._decode (data, columnar)
+      except (IOError, OSError):
+         design = None
+      except (ValueError, EOFError, TypeError, zlib.error, struct.error):
+         logging.debug ('   Dropping corrupted cache entry %s', path)
+         self._remove (path)
+         design = None
+
+      if design is None:
+         self.misses += 1
+         logging.debug ('   Design cache miss (%d hits, %d misses)', self.hits, self.misses)
+         return None
+
+      # least recently used entries are evicted first
+      try:
+         os.utime (path, None)
+      except OSError:
+         pass
+
+      self.hits += 1
+      logging.debug ('   Design cache hit (%d hits, %d misses)', self.hits, self.misses)
+      return design
+
+
+
+   #-- store -------------------------------------------------------------------
+
+   def store (self, key, design):
+      if not os.path.exists (self.directory):
+         os.makedirs (self.directory)
+
+      path = self._path (key)
+      path_tmp = '%s.%d.tmp' % (path, os.getpid ())
+
+      with open (path_tmp, 'wb') as file:
+         file.write (self._encode (design))
+      replace_file (path_tmp, path)
+
+      self._evict (keep = path)
+
+
+
+   #-- _evict ------------------------------------------------------------------
+
+   def _evict (self, keep):
+      entries = []
+      total_size = 0
+
+      for filename in os.listdir (self.directory):
+         if not filename.endswith (EXTENSION):
+            continue
+         path = os.path.join (self.directory, filename)
+         try:
+            stat = os.stat (path)
+         except OSError:
+            continue
+         entries.append ((stat.st_mtime, stat.st_size, path))
+         total_size += stat.st_size
+
+      entries.sort ()
+
+      for mtime, size, path in entries:
+         if total_size <= self.max_size:
+            break
+         if path == keep:
+            continue
+         self._remove (path)
+         self.evictions += 1
+         total_size -= size
+
+
+
+   #-- _encode -----------------------------------------------------------------
+
+   def _encode (self, design):
+      outline = design.outline
+      payload = (
+         design.name,
+         design.date,
+         (outline.left, outline.top, outline.right, outline.bottom),
+         tuple (
+            (
+               component.reference, component.value,
+               component.position.x, component.position.y,
+               component.rotation, component.side,
+               component.device, component.package, component.description,
+               component.place, component.distributor,
+               component.distributor_part_number, component.distributor_link,
+               component.remark
+            )
+            for component in design.components.values ()
+         ),
+         tuple (
+            (fiducial.reference, fiducial.position.x, fiducial.position.y, fiducial.side)
+            for fiducial in design.fiducials
+         ),
+         tuple (
+            (
+               drawing.layer, drawing.start.x, drawing.start.y,
+               drawing.end.x, drawing.end.y, drawing.width
+            ) if isinstance (drawing, Segment) else (
+               drawing.layer, drawing.center.x, drawing.center.y,
+               drawing.radius, drawing.width
+            )
+            for drawing in design.drawings
+         ),
+         tuple (
+            (
+               hole.position.x, hole.position.y,
+               None if hole.end is None else (hole.end.x, hole.end.y),
+               hole.diameter, hole.plated
+            )
+            for hole in design.holes
+         ),
+         tuple (design.references),
+      )
+      header = _HEADER.pack (MAGIC, FORMAT_VERSION, marshal.version)
+      return header + zlib.compress (marshal.dumps (payload))
+
+
+
+   #-- _decode -----------------------------------------------------------------
+
+   def _decode (self, data, columnar = False):
+      magic, format_version, marshal_version = _HEADER.unpack_from (data)
+      if magic != MAGIC or format_version != FORMAT_VERSION or marshal_version != marshal.version:
+         return None
+
+      name, date, outline, components, fiducials, drawings, holes, references = marshal.loads (
+         zlib.decompress (data [_HEADER.size:])
+      )
+
+      design = Design (columnar)
+      design.name = name
+      design.date = date
+      design.outline.left, design.outline.top, design.outline.right, design.outline.bottom = outline
+
+      for fields in components:
+         component = design.new_component ()
+         (
+            component.reference, component.value,
+            component.position.x, component.position.y,
+            component.rotation, component.side,
+            component.device, component.package, component.description,
+            component.place, component.distributor,
+            component.distributor_part_number, component.distributor_link,
+            component.remark
+         ) = fields
+         design.add_component (component)
+
+      for reference, x, y, side in fiducials:
+         fiducial = Fiducial ()
+         fiducial.reference = reference
+         fiducial.position.x = x
+         fiducial.position.y = y
+         fiducial.side = side
+         design.fiducials.append (fiducial)
+
+      for fields in drawings:
+         if len (fields) == 6:
+            drawing = Segment ()
+            (
+               drawing.layer, drawing.start.x, drawing.start.y,
+               drawing.end.x, drawing.end.y, drawing.width
+            ) = fields
+         else:
+            drawing = Circle ()
+            drawing.layer, drawing.center.x, drawing.center.y, drawing.radius, drawing.width = fields
+         design.drawings.append (drawing)
+
+      for x, y, end, diameter, plated in holes:
+         hole = Hole ()
+         hole.position.x = x
+         hole.position.y = y
+         if end is not None:
+            hole.end = Point ()
+            hole.end.x, hole.end.y = end
+         hole.diameter = diameter
+         hole.plated = plated
+         design.holes.append (hole)
+
+      design.references = list (references)
+
+      return design
+
+
+
+   #-- _path -------------------------------------------------------------------
+
+   def _path (self, key):
+      return os.path.join (self.directory, key + EXTENSION)
+
+
+
+   #-- _remove -----------------------------------------------------------------
+
+   def _remove (self, path):
+      try:
+         os.remove (path)
+      except OSError:
+         pass
@@ -0,0 +1,172 @@
+##############################################################################
+#
+#     consolidated.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from .batch import Result, make_project_args, log_summary
+from .generator import bom_rows
+
+
+
+CONSOLIDATED_BOM_FILENAME = 'consolidated.bom.csv'
+
+
+
+class ConsolidatedBom (object):
+
+   # BOM lines of several projects, grouped by distributor and distributor
+   # part number, or by description for the components without a part
+   # number. Each project counts its `quantity` times, the number of boards
+   # built. The fields of a group are the ones of the first project listing
+   # it.
+
+   def __init__ (self):
+      self.projects = []
+      self._groups = {}
+
+
+   #-- add ---------------------------------------------------------------------
+   # Adds the BOM `lines` of a project, as returned by `bom_lines`
+
+   def add (self, name, quantity, lines):
+      column = len (self.projects)
+      self.projects.append ((name, quantity))
+
+      groups = self._groups
+      for line in lines:
+         distributor, part_number, description = line [:3]
+         if part_number:
+            key = (True, distributor, part_number)
+         else:
+            key = (False, '', description)
+         group = groups.get (key)
+         if group is None:
+            group = groups [key] = (line [:-1], {})
+         counts = group [1]
+         counts [column] = counts.get (column, 0) + line [-1] * quantity
+
+
+   #-- write -------------------------------------------------------------------
+   # Writes the BOM as CSV, with the total quantity of each group, then its
+   # quantity in each project
+
+   def write (self, output):
+      writer = csv.writer (output, lineterminator = '\n')
+      writer.writerow (
+         ['Distributor', 'Distributor Part Number', 'Description', 'Value', 'Device',
+         'Package', 'Distributor Link', 'Quantity'] +
+         ['%s x%d' % (name, quantity) for name, quantity in self.projects]
+      )
+
+      for key in sorted (self._groups):
+         fields, counts = self._groups [key]
+         # most groups are only in a few projects
+         cells = [''] * len (self.projects)
+         for column, count in counts.items ():
+            cells [column] = count
+         writer.writerow (list (fields) + [sum (counts.values ())] + cells)
+
+
+
+#-- bom_lines -----------------------------------------------------------------
+# Returns the BOM lines of `design`, (distributor, distributor part number,
+# description, value, device, package, distributor link, count) tuples, count
+# being the number of components of the line on one board
+
+def bom_lines (design):
+   return [
+      (
+         component.distributor, component.distributor_part_number, component.description,
+         component.value, component.device, component.package, component.distributor_link,
+         len (references)
+      )
+      for component, references in bom_rows (design)
+   ]
+
+
+
+#-- consolidate_bom -----------------------------------------------------------
+
+# Reads the BOM of every project on a pool of `jobs` processes, and writes
+# their consolidated BOM to CONSOLIDATED_BOM_FILENAME in `output_dir`. Only
+# the BOM lines are sent back from the processes. Failures are collected as
+# in a batch, and the BOM is only written if all the projects could be read.
+# Returns the list of results, in projects order.
+
+def consolidate_bom (args, projects, output_dir, jobs = 1):
+   tasks = [(project.name, make_project_args (args, project)) for project in projects]
+
+   start = time.time ()
+
+   if jobs <= 1:
+      outcomes = [_read_project_bom (task) for task in tasks]
+   else:
+      pool = multiprocessing.Pool (min (jobs, max (len (tasks), 1)))
+      try:
+         outcomes = pool.map (_read_project_bom, tasks, chunksize = 1)
+      finally:
+         pool.close ()
+         pool.join ()
+
+   results = [result for result, lines in outcomes]
+   log_summary (results, time.time () - start)
+
+   if not all (result.ok for result in results):
+      logging.error ('Consolidated BOM not written, some projects failed')
+      return results
+
+   bom = ConsolidatedBom ()
+   for project, (result, lines) in zip (projects, outcomes):
+      bom.add (project.name, project.quantity, lines)
+
+   if not os.path.exists (output_dir):
+      os.makedirs (output_dir)
+   path = os.path.join (output_dir, CONSOLIDATED_BOM_FILENAME)
+   # the csv module writes native strings, byte strings on python 2
+   if str is bytes:
+      output = open (path, 'wb')
+   else:
+      output = io.open (path, 'w', encoding = 'utf-8', newline = '')
+   with output:
+      bom.write (output)
+
+   logging.info ('Consolidated BOM of %d projects written to %s', len (projects), path)
+
+   return results
+
+
+
+def _read_project_bom (task):
+   from . import load_design, check_args
+
+   name, project_args = task
+   result = Result (name)
+   lines = None
+   start = time.time ()
+
+   try:
+      logging.info ('Project %s', name)
+      check_args (project_args)
+      lines = bom_lines (load_design (project_args))
+      result.ok = True
+
+   except SystemExit:
+      # fatal errors are logged where they are raised
+      result.error = 'fatal error'
+
+   except Exception as e:
+      logging.debug (traceback.format_exc ())
+      result.error = '%s: %s' % (type (e).__name__, e)
+
+   result.elapsed = time.time () - start
+
+   return (result, lines)
@@ -0,0 +1,86 @@
+##############################################################################
+#
+#     excellon.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+
+
+# Writes the holes of a design as a single Excellon drill file, with the
+# options kcgen uses with pcbnew's EXCELLON_WRITER: plated and non plated
+# holes merged, metric decimal format, absolute coordinates from the board
+# origin, not mirrored, full header.
+
+#-- write_excellon ------------------------------------------------------------
+# Writes the drill file to `output`, a path or a text file
+
+def write_excellon (output, holes):
+   # one tool per diameter and plating, like pcbnew, plated tools first, and
+   # holes ordered by tool then position
+
+   holes = sorted (
+      holes,
+      key = lambda hole: (not hole.plated, hole.diameter, hole.position.x, hole.position.y)
+   )
+
+   tools = []
+   tool_holes = {}
+   for hole in holes:
+      tool = (hole.diameter, hole.plated)
+      if tool not in tool_holes:
+         tools.append (tool)
+         tool_holes [tool] = []
+      tool_holes [tool].append (hole)
+
+   lines = [
+      'M48',
+      '; DRILL file {kcgen}',
+      '; FORMAT={-:-/ absolute / metric / decimal}',
+      'FMAT,2',
+      'METRIC',
+   ]
+
+   for index, (diameter, plated) in enumerate (tools):
+      lines.append ('T%dC%.3f' % (index + 1, diameter))
+
+   lines.extend (['%', 'G90', 'G05'])
+
+   for index, tool in enumerate (tools):
+      lines.append ('T%d' % (index + 1))
+      for hole in tool_holes [tool]:
+         position = _format_point (hole.position)
+         if hole.end is None:
+            lines.append (position)
+         else:
+            lines.append ('%sG85%s' % (position, _format_point (hole.end)))
+            # back to drill mode after each slot, like pcbnew
+            lines.append ('G05')
+
+   lines.extend (['T0', 'M30', ''])
+
+   if hasattr (output, 'write'):
+      output.write ('\n'.join (lines))
+   else:
+      with open (output, 'w') as file:
+         file.write ('\n'.join (lines))
+
+
+
+#-- _format_point -------------------------------------------------------------
+# Excellon Y axis goes up, KiCad's goes down
+
+def _format_point (point):
+   return 'X%sY%s' % (_format_coordinate (point.x), _format_coordinate (- point.y))
+
+
+
+#-- _format_coordinate --------------------------------------------------------
+
+def _format_coordinate (value):
+   string = ('%.3f' % value).rstrip ('0')
+   if string.endswith ('.'):
+      string += '0'
+   if string == '-0.0':
+      string = '0.0'
+   return string
@@ -5,101 +5,139 @@
 #
 #Tab=3########################################################################
 
-import logging
 import os
-import sys
-from .ast import Design, Component, Fiducial, Rect, Point
+from .ast import natural_key
+from .geometry import coordinates, transform
+from .manufacturers import get_manufacturer
 
 
 class Generator (object):
 
-   def __init__ (self, manufacturer):
-      self._manufacturer = manufacturer
+   # Writes the files of `manufacturers`, a name, a comma separated list of
+   # names or a list of names. What the files are made of is gathered from
+   # the design in a single pass over the components, shared by all the
+   # manufacturers. With more than one manufacturer, the files of each are
+   # written to a sub-directory named after it. Files are written to the
+   # output path, or straight into `archive` when given.
+
+   def __init__ (self, manufacturers, archive = None):
+      self._manufacturers = get_manufacturer_names (manufacturers)
+      self._archive = archive
 
 
    #-- process_bom -------------------------------------------------------------------
 
    def process_bom (self, output_path, design):
-      if self._manufacturer == 'pcbpool':
-         self._process_bom_pcbpool (output_path, design)
-      else:
-         logging.error ("\033[91mfatal error:\033[0m Unknown manufacturer `%s'", self._manufacturer)
-         sys.exit (1)
-
-
-
-   #-- _process_pcbpool_bom ----------------------------------------------------------
-
-   def _process_bom_pcbpool (self, output_path, design):
-      with open (os.path.join (output_path, '%s.bom.csv' % design.name), 'w') as output:
-         output.write ('Part;Value;Device;Package;Description;Description2;Quantity;Place;Provided;Distributor;Distributor Part Number;Distributor Link;Remarks;Unit Price;Total Price;Remarks Beta;Option1;Option2;Option3\n')
-
-         for description in design.descriptions:
-            quantity = 0
-            refs = []
-            curcomp = None
-            for reference in design.references:
-               component = design.components [reference]
-               if component.description == description:
-                  curcomp = component
-                  quantity += 1
-                  refs.append (component.reference)
-            value = curcomp.value
-            if curcomp.reference.startswith ('J'):
-               value = ""
-            output.write (
-               '%s;%s;%s;%s;%s;;%s;%s;No;%s;%s;%s;%s;;;;;;\n' %
-               (', '.join (refs), value,
-               curcomp.device, curcomp.package,
-               curcomp.description, quantity, curcomp.place,
-               curcomp.distributor, curcomp.distributor_part_number, curcomp.distributor_link,
-               curcomp.remark)
-            )
+      manufacturers = self._get_manufacturers ()
+      rows = bom_rows (design)
+
+      for name, manufacturer in manufacturers:
+         filename = manufacturer.bom_filename % design.name
+         with self._open_output (output_path, name, filename) as output:
+            manufacturer.write_bom (output, design, rows)
 
 
 
    #-- process_pickplace -------------------------------------------------------------
 
    def process_pickplace (self, output_path, design):
-      if self._manufacturer == 'pcbpool':
-         self._process_pickplace_pcbpool (output_path, design)
-      else:
-         logging.error ("\033[91mfatal error:\033[0m Unknown manufacturer `%s'", self._manufacturer)
-         sys.exit (1)
+      manufacturers = self._get_manufacturers ()
+      placements = Placements (design)
+
+      for name, manufacturer in manufacturers:
+         filename = manufacturer.pickplace_filename % design.name
+         with self._open_output (output_path, name, filename) as output:
+            manufacturer.write_pickplace (output, design, placements)
+
+
+
+   #-- _get_manufacturers ------------------------------------------------------------
+
+   def _get_manufacturers (self):
+      return [(name, get_manufacturer (name)) for name in self._manufacturers]
+
+
+
+   #-- _open_output ------------------------------------------------------------------
+
+   def _open_output (self, output_path, manufacturer, filename):
+      several = len (self._manufacturers) > 1
+      if self._archive is not None:
+         if several:
+            filename = '%s/%s' % (manufacturer, filename)
+         return self._archive.open (filename)
+      if several:
+         output_path = os.path.join (output_path, manufacturer)
+         # the BOM and pick & place stages may run concurrently
+         try:
+            os.makedirs (output_path)
+         except OSError:
+            if not os.path.isdir (output_path):
+               raise
+      return open (os.path.join (output_path, filename), 'w')
+
+
+
+#-- get_manufacturer_names ----------------------------------------------------
+# Returns the list of manufacturer names `manufacturers` stands for
+
+def get_manufacturer_names (manufacturers):
+   if isinstance (manufacturers, str):
+      return [name.strip () for name in manufacturers.split (',')]
+   return list (manufacturers)
+
+
+
+#-- bom_rows ------------------------------------------------------------------
+# Returns a (component, references) row per group of placed components of
+# `design` with the same description, taken from the design index, rows
+# and references being ordered naturally, e.g. C1, C2, C10, R1. A reference
+# is listed once per module, and the row fields come from the component
+# placed last in the pcb file.
 
+def bom_rows (design):
+   # last module and number of modules of each placed reference
+   last_modules = {}
+   module_counts = {}
+   for module, reference in enumerate (design.references):
+      last_modules [reference] = module
+      module_counts [reference] = module_counts.get (reference, 0) + 1
 
+   rows = []
+   for components in design.group_components ('description').values ():
+      placed = [c for c in components if c.reference in last_modules]
+      if not placed:
+         continue
+      references = []
+      for component in placed:
+         references.extend ([component.reference] * module_counts [component.reference])
+      rows.append ((max (placed, key = lambda c: last_modules [c.reference]), references))
+   rows.sort (key = lambda row: natural_key (row [1][0]))
 
-   #-- _process_pcbpool_pickplace ----------------------------------------------------
+   return rows
 
-   def _process_pickplace_pcbpool (self, output_path, design):
-      with open (os.path.join (output_path, '%s.pickplace.txt' % design.name), 'w') as output:
-         output.write ('Filename:\t%s.pickplace.txt\n\n' % design.name)
-         output.write ('Position of PCB:\nleft under edge: X=0 / Y=0\n\n\n')
-         output.write ('name\tX-axis\tY-axis\tangle\tvalue\tpackage\tside\n\n')
 
-         def to_position_x (design, x):
-            return x - design.outline.left
 
-         def to_position_y (design, y):
-            return design.outline.bottom - y
+class Placements (object):
 
-         for fiducial in design.fiducials:
-            output.write (
-               '%s\t%.2f\t%.2f\t0.00\t1mm\tCircle\t%s\n' %
-               (fiducial.reference,
-               to_position_x (design, fiducial.position.x), to_position_y (design, fiducial.position.y),
-               fiducial.side)
-            )
+   # Columns of the fiducials and components of a design, with positions
+   # from the left under edge of the board. Component fields are read in a
+   # single pass over the components, positions moved all at once.
 
-         output.write ('\n')
+   def __init__ (self, design):
+      origin = (design.outline.left, design.outline.bottom)
 
-         for key, component in design.components.items ():
-            output.write (
-               '%s\t%.2f\t%.2f\t%.2f\t%s\t%s\t%s\n' %
-               (component.reference,
-               to_position_x (design, component.position.x),
-               to_position_y (design, component.position.y),
-               component.rotation,
-               component.value, component.package, component.side)
-            )
+      fiducials = design.fiducials
+      self.fiducial_references = [f.reference for f in fiducials]
+      self.fiducial_sides = [f.side for f in fiducials]
+      xs, ys = coordinates (fiducials)
+      self.fiducial_xs, self.fiducial_ys = transform (xs, ys, origin)
 
+      components = list (design.components.values ())
+      self.components = components
+      fields = [(c.reference, c.value, c.package, c.side) for c in components]
+      (
+         self.references, self.values, self.packages, self.sides
+      ) = [list (column) for column in zip (*fields)] if fields else ([], [], [], [])
+      xs, ys, self.rotations = design.placements ()
+      self.xs, self.ys = transform (xs, ys, origin)
@@ -0,0 +1,114 @@
+##############################################################################
+#
+#     geometry.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import math
+from array import array
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+
+
+#-- bounds --------------------------------------------------------------------
+# Returns (left, top, right, bottom) of the points, or None values if there
+# are none
+
+def bounds (xs, ys):
+   if len (xs) == 0:
+      return (None, None, None, None)
+
+   if numpy is not None:
+      xs = numpy.asarray (xs)
+      ys = numpy.asarray (ys)
+      return (float (xs.min ()), float (ys.min ()), float (xs.max ()), float (ys.max ()))
+
+   return (min (xs), min (ys), max (xs), max (ys))
+
+
+
+#-- transform -----------------------------------------------------------------
+# Moves the points relative to `origin`, with Y going up if `flip_y` is set
+# as KiCad's Y axis goes down, then rotates them by `angle` degrees
+# counterclockwise around the origin. Returns lists of floats.
+
+def transform (xs, ys, origin, flip_y = True, angle = 0.0):
+   origin_x, origin_y = origin
+
+   # origin_y - y rather than -(y - origin_y), to get 0.0 and not -0.0,
+   # which would format as -0.00
+
+   if numpy is not None:
+      xs = numpy.asarray (xs, dtype = float) - origin_x
+      if flip_y:
+         ys = origin_y - numpy.asarray (ys, dtype = float)
+      else:
+         ys = numpy.asarray (ys, dtype = float) - origin_y
+      if angle:
+         xs, ys = _rotate_numpy (xs, ys, angle)
+      return (xs.tolist (), ys.tolist ())
+
+   xs = [x - origin_x for x in xs]
+   if flip_y:
+      ys = [origin_y - y for y in ys]
+   else:
+      ys = [y - origin_y for y in ys]
+   if angle:
+      xs, ys = _rotate (xs, ys, angle)
+   return (xs, ys)
+
+
+
+#-- arc -----------------------------------------------------------------------
+# Returns the points of an arc around (cx, cy) starting at (x, y) and going
+# `angle` degrees clockwise, in KiCad's coordinate system, approximated by
+# segments no longer than `step` degrees
+
+def arc (cx, cy, x, y, angle, step = 15.0):
+   count = max (1, int (math.ceil (abs (angle) / step)))
+   dx = x - cx
+   dy = y - cy
+   points = []
+   for i in range (count + 1):
+      theta = math.radians (angle * i / count)
+      cos = math.cos (theta)
+      sin = math.sin (theta)
+      points.append ((cx + dx * cos - dy * sin, cy + dx * sin + dy * cos))
+   return points
+
+
+
+#-- coordinates ---------------------------------------------------------------
+# Gathers the coordinates of `items` having a `position` into arrays
+
+def coordinates (items):
+   xs = array ('d')
+   ys = array ('d')
+   for item in items:
+      position = item.position
+      xs.append (position.x)
+      ys.append (position.y)
+   return (xs, ys)
+
+
+
+#-- _rotate -------------------------------------------------------------------
+
+def _rotate (xs, ys, angle):
+   cos = math.cos (math.radians (angle))
+   sin = math.sin (math.radians (angle))
+   return (
+      [x * cos - y * sin for x, y in zip (xs, ys)],
+      [x * sin + y * cos for x, y in zip (xs, ys)]
+   )
+
+
+def _rotate_numpy (xs, ys, angle):
+   cos = math.cos (math.radians (angle))
+   sin = math.sin (math.radians (angle))
+   return (xs * cos - ys * sin, xs * sin + ys * cos)
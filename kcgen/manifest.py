@@ -0,0 +1,147 @@
+##############################################################################
+#
+#     manifest.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import binascii
+import glob
+import json
+import logging
+import os
+import threading
+from .archive import replace_file
+from .cache import file_digest
+from .version import __version__
+
+
+
+MANIFEST_NAME = '.kcgen-manifest.json'
+MANIFEST_VERSION = 1
+
+
+
+class BuildManifest (object):
+
+   # Records, for each stage built in `output_dir`, the inputs and options
+   # it was built from and the files it wrote, so that later runs can skip
+   # stages that are up to date.
+
+   def __init__ (self, output_dir):
+      self.path = os.path.join (output_dir, MANIFEST_NAME)
+      self._output_dir = output_dir
+      self._stages = {}
+      self._digests = {}
+      self._lock = threading.Lock ()
+
+      try:
+         with open (self.path, 'r') as file:
+            data = json.load (file)
+         if data.get ('version') == MANIFEST_VERSION:
+            self._stages = data.get ('stages', {})
+      except (IOError, OSError, ValueError):
+         pass
+
+
+
+   #-- fingerprint -------------------------------------------------------------
+
+   # Returns what a stage output depends on: the digest of each of `inputs`
+   # files, `options` and the kcgen version. Returns None if an input can't
+   # be read.
+
+   def fingerprint (self, inputs, options):
+      digests = {}
+      for path in inputs:
+         digest = self._digest (path)
+         if digest is None:
+            return None
+         digests [os.path.abspath (path)] = digest
+      return {'inputs': digests, 'options': options, 'version': __version__}
+
+
+
+   #-- is_up_to_date -----------------------------------------------------------
+
+   def is_up_to_date (self, stage, fingerprint):
+      if fingerprint is None:
+         return False
+
+      with self._lock:
+         entry = self._stages.get (stage)
+
+      if entry is None or not entry ['outputs']:
+         return False
+      for key in ('inputs', 'options', 'version'):
+         if entry.get (key) != fingerprint [key]:
+            return False
+
+      for path, size, mtime in entry ['outputs']:
+         try:
+            stat = os.stat (os.path.join (self._output_dir, path))
+         except OSError:
+            return False
+         if stat.st_size != size or stat.st_mtime != mtime:
+            return False
+
+      return True
+
+
+
+   #-- record ------------------------------------------------------------------
+
+   # Records the files matching `patterns`, relative to the output
+   # directory, as outputs of `stage`.
+
+   def record (self, stage, fingerprint, patterns):
+      if fingerprint is None:
+         return
+
+      outputs = []
+      for pattern in patterns:
+         for path in sorted (glob.glob (os.path.join (self._output_dir, pattern))):
+            stat = os.stat (path)
+            outputs.append ([os.path.relpath (path, self._output_dir), stat.st_size, stat.st_mtime])
+
+      entry = dict (fingerprint)
+      entry ['outputs'] = outputs
+
+      with self._lock:
+         self._stages [stage] = entry
+
+
+
+   #-- save --------------------------------------------------------------------
+
+   def save (self):
+      if not os.path.exists (self._output_dir):
+         return
+
+      with self._lock:
+         data = {'version': MANIFEST_VERSION, 'stages': self._stages}
+
+      path_tmp = '%s.tmp' % self.path
+      with open (path_tmp, 'w') as file:
+         json.dump (data, file, indent = 1, sort_keys = True)
+      replace_file (path_tmp, self.path)
+
+
+
+   #-- _digest -----------------------------------------------------------------
+
+   def _digest (self, path):
+      with self._lock:
+         if path in self._digests:
+            return self._digests [path]
+
+      try:
+         digest = binascii.hexlify (file_digest (path)).decode ('ascii')
+      except (IOError, OSError):
+         logging.debug ('   Can\'t read %s', path)
+         digest = None
+
+      with self._lock:
+         self._digests [path] = digest
+
+      return digest
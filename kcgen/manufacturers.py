@@ -0,0 +1,97 @@
+##############################################################################
+#
+#     manufacturers.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import logging
+import sys
+
+
+
+# Output formats of the manufacturers, by name. A manufacturer tells the
+# names of its BOM and pick & place files, formatted with the design name,
+# and writes them from what `Generator` gathers from the design once for
+# all the manufacturers of a run:
+# - write_bom (output, design, rows) gets the BOM rows, a (component,
+#   references) tuple per group of components with the same description,
+#   in natural reference order, the component giving the row fields,
+# - write_pickplace (output, design, placements) gets the `Placements`
+#   of the fiducials and components.
+
+MANUFACTURERS = {}
+
+
+
+#-- register_manufacturer -----------------------------------------------------
+
+def register_manufacturer (name, manufacturer):
+   MANUFACTURERS [name] = manufacturer
+
+
+
+#-- get_manufacturer ----------------------------------------------------------
+
+def get_manufacturer (name):
+   manufacturer = MANUFACTURERS.get (name)
+   if manufacturer is None:
+      logging.error ("\033[91mfatal error:\033[0m Unknown manufacturer `%s'", name)
+      sys.exit (1)
+   return manufacturer
+
+
+
+class PcbPool (object):
+
+   bom_filename = '%s.bom.csv'
+   pickplace_filename = '%s.pickplace.txt'
+
+
+   #-- write_bom ---------------------------------------------------------------
+
+   def write_bom (self, output, design, rows):
+      output.write ('Part;Value;Device;Package;Description;Description2;Quantity;Place;Provided;Distributor;Distributor Part Number;Distributor Link;Remarks;Unit Price;Total Price;Remarks Beta;Option1;Option2;Option3\n')
+
+      for curcomp, references in rows:
+         value = curcomp.value
+         if curcomp.reference.startswith ('J'):
+            value = ""
+         output.write (
+            '%s;%s;%s;%s;%s;;%s;%s;No;%s;%s;%s;%s;;;;;;\n' %
+            (', '.join (references), value,
+            curcomp.device, curcomp.package,
+            curcomp.description, len (references), curcomp.place,
+            curcomp.distributor, curcomp.distributor_part_number, curcomp.distributor_link,
+            curcomp.remark)
+         )
+
+
+   #-- write_pickplace ---------------------------------------------------------
+
+   def write_pickplace (self, output, design, placements):
+      output.write ('Filename:\t%s\n\n' % (self.pickplace_filename % design.name))
+      output.write ('Position of PCB:\nleft under edge: X=0 / Y=0\n\n\n')
+      output.write ('name\tX-axis\tY-axis\tangle\tvalue\tpackage\tside\n\n')
+
+      output.write (''.join (map (
+         '%s\t%.2f\t%.2f\t0.00\t1mm\tCircle\t%s\n'.__mod__,
+         zip (
+            placements.fiducial_references, placements.fiducial_xs, placements.fiducial_ys,
+            placements.fiducial_sides
+         )
+      )))
+
+      output.write ('\n')
+
+      output.write (''.join (map (
+         '%s\t%.2f\t%.2f\t%.2f\t%s\t%s\t%s\n'.__mod__,
+         zip (
+            placements.references, placements.xs, placements.ys, placements.rotations,
+            placements.values, placements.packages, placements.sides
+         )
+      )))
+
+
+
+register_manufacturer ('pcbpool', PcbPool ())
@@ -5,22 +5,206 @@
 #
 #Tab=3########################################################################
 
-from .ast import Design, Component, Fiducial, Rect, Point
+from .ast import Design, Component, Fiducial, Rect, Point, Segment, Circle, Hole
+from .geometry import arc, bounds
+from .sexpr import Symbol, Symbols, BytesSymbols, FLAT_MIN_ITEMS, flatten, to_text
+from .query import Index
+from . import profiling
+from array import array
+from bisect import bisect_left, bisect_right
 from string import whitespace
+import contextlib
+import gc
+import math
+import multiprocessing
+import re
+import sys
+
+
+
+# Bump whenever the Design built from the same input changes, this
+# invalidates persistent caches.
+
+PARSER_VERSION = 3
+
+# S-expression parsing engines:
+# - 'token' scans whole tokens at a time,
+# - 'char' is the original character by character scanner.
+# Both produce the exact same tree.
+
+ENGINES = ('token', 'char')
+
+# Interns the values and layers repeated across the design. Python 2 only
+# interns byte strings, and leaves the unicode ones as they are.
+
+try:
+   intern = sys.intern
+except AttributeError:
+   def intern (string, _intern = intern):
+      return _intern (string) if type (string) is str else string
+
+# Input the text engines parse, python 2 unicode strings included, any other
+# input being bytes-like.
+
+_TEXT_TYPES = (str, type (u''))
+
+# Double quoted strings, with their content captured.
+
+_STRING_RE = re.compile (r'"([^"\\]*(?:\\.[^"\\]*)*)"', re.DOTALL)
+
+# One match per token: a paren or quote, a double quoted string (quotes
+# included, so that the empty string can be told apart) or an atom.
+# Whitespace is spelled out to match `string.whitespace` exactly.
+
+_TOKEN_RE = re.compile (
+   r'([()\'])|("[^"\\]*(?:\\.[^"\\]*)*")|([^()"\' \t\n\r\x0b\x0c]+)',
+   re.DOTALL
+)
+
+_ESCAPE_RE = re.compile (r'\\(.)', re.DOTALL)
+
+# Characters `str.split` treats as whitespace while `string.whitespace`
+# does not.
+
+_SPLIT_WHITESPACE_RE = re.compile (
+   u'[\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]'
+)
+
+# Key of the lists a quote makes, `'x` being read as `(quote x)`. It isn't
+# part of any symbol table, so that lists starting with a quote atom can be
+# told apart from quoted elements.
+
+_QUOTE = Symbol ('quote')
+
+# Matches a list nested at most a few levels deep, so that most top-level
+# elements (segments, vias, modules or polygon point lists) can be skipped
+# in one go, a single paren, a double quoted string, or a quote whose string
+# isn't closed before the end of the scan.
+
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+
+def _nested_list_pattern (depth):
+   pattern = r'\([^()"]*(?:' + _STRING + r'[^()"]*)*\)'
+   for i in range (1, depth):
+      pattern = r'\([^()"]*(?:(?:' + _STRING + '|' + pattern + r')[^()"]*)*\)'
+   return pattern
+
+_SCAN_PATTERN = r'(' + _nested_list_pattern (6) + r')|(\()|(\))|' + _STRING + r'|(")'
+
+_KEY_PATTERN = r'[ \t\n\r\x0b\x0c]*([^()"\' \t\n\r\x0b\x0c]*)'
+
+_SCAN_RE = re.compile (_SCAN_PATTERN, re.DOTALL)
+_KEY_RE = re.compile (_KEY_PATTERN)
+
+# Same, for memory mapped files or other bytes-like input
+
+_SCAN_BYTES_RE = re.compile (_SCAN_PATTERN.encode ('ascii'), re.DOTALL)
+_KEY_BYTES_RE = re.compile (_KEY_PATTERN.encode ('ascii'))
+_TOKEN_BYTES_RE = re.compile (_TOKEN_RE.pattern.encode ('ascii'), re.DOTALL)
+
+_SCAN_NESTED, _SCAN_OPEN, _SCAN_CLOSE, _SCAN_QUOTE = 1, 2, 3, 4
+
+# Top-level elements of the net and pcb files `_parse_design` reads
+
+NET_SECTIONS = ('design', 'components')
+PCB_SECTIONS = ('module', 'gr_line', 'via', 'net', 'net_class')
+
+# Optional contents of the design: the module fab drawings, and the pad and
+# via holes. Without holes, the via, net and net_class elements are skipped.
+
+DESIGN_CONTENTS = ('drawings', 'holes')
+HOLES_SECTIONS = ('via', 'net', 'net_class')
+
+# layers of the module drawings kept in the design
+
+FAB_LAYERS = ('F.Fab', 'B.Fab')
+
+# via drill when neither the via nor its net class tell, KiCad's default
+
+DEFAULT_VIA_DRILL = 0.4
+
+# With more than one job, pcb files of at least PARALLEL_MIN_SIZE bytes are
+# cut into CHUNKS_PER_JOB chunks per job, parsed by a pool of processes.
+# KiCad writes each top-level element on its own line, indented by two
+# spaces or a tab: chunks are cut there. Each chunk is checked to start and
+# end between top-level elements when parsed, the whole file is parsed
+# sequentially otherwise.
+
+PARALLEL_MIN_SIZE = 1024 * 1024
+CHUNKS_PER_JOB = 2
+
+_CHUNK_START_PATTERN = r'\n(?:  |\t)\('
+_CHUNK_START_RE = re.compile (_CHUNK_START_PATTERN)
+_CHUNK_START_BYTES_RE = re.compile (_CHUNK_START_PATTERN.encode ('ascii'))
+
+
+
+# What each pcb element adds to the design, see `_parse_pcb_element`
+
+_MODULE, _EDGE, _VIA, _NET, _NET_CLASS = range (5)
+
+# Raised when a pcb chunk doesn't start and end between top-level elements
+
+class _ChunkError (Exception):
+   pass
+
+
+
+# The tree and the design have no cycles, don't let the garbage collector
+# scan them over and over while they are being built
+
+@contextlib.contextmanager
+def _gc_paused ():
+   gc_enabled = gc.isenabled ()
+   gc.disable ()
+   try:
+      yield
+   finally:
+      if gc_enabled:
+         gc.enable ()
 
 
 
 class Parser (object):
 
-   def __init__ (self, name, data_net, data_pcb):
+   # With `incremental`, the parser keeps what each pcb element added to the
+   # design, to patch it with `update` when the pcb file changes. Only the
+   # `contents` of the design, among DESIGN_CONTENTS, are read.
+
+   def __init__ (
+      self, name, data_net, data_pcb, engine = 'token', stream = True, columnar = False, jobs = 1,
+      incremental = False, contents = DESIGN_CONTENTS
+   ):
+      if engine not in ENGINES:
+         raise ValueError ('Unknown parser engine `%s\'' % engine)
       self._name = name
       self._data_net = data_net
       self._data_pcb = data_pcb
+      self._engine = engine
+      self._stream = stream
+      self._columnar = columnar
+      self._jobs = jobs
+      self._incremental = incremental
+      self._contents = tuple (content for content in DESIGN_CONTENTS if content in contents)
+      self._pcb_sections = get_pcb_sections (self._contents)
+      self._design = None
+      self._pcb_elements = None
+      self._via_holes = []
       self._atom_end = set ('()"\'') | set (whitespace)
+      # atoms are shared by all the trees of the parser
+      self._symbols = Symbols ()
+      self._bytes_symbols = BytesSymbols (self._symbols)
+      # children indexes of the element being read
+      self._index = Index ()
 
 
    def parse (self):
-      design = self._parse_design ()
+      with _gc_paused (), profiling.span ('parse design', 'parse'):
+         design = self._parse_design ()
+
+      profiling.count ('components', len (design.components))
+      profiling.count ('fiducials', len (design.fiducials))
+      profiling.count ('holes', len (design.holes))
 
       #print design
 
@@ -28,36 +212,108 @@ class Parser (object):
 
 
 
+   #-- update ------------------------------------------------------------------
+   # Patches the design returned by `parse` to match `data_pcb`, the new
+   # content of the pcb file. Only the elements that changed are parsed.
+
+   def update (self, data_pcb):
+      if self._design is None or self._pcb_elements is None:
+         raise ValueError ('Only designs parsed incrementally can be updated')
+
+      with _gc_paused (), profiling.span ('update design', 'parse'):
+         try:
+            changed = self._update_pcb_elements (data_pcb)
+         except _ChunkError:
+            # the edit changed the file structure around it
+            records = self._pcb_elements.records
+            self._pcb_elements = self._parse_pcb_elements (data_pcb)
+            changed = [
+               record for record in records + self._pcb_elements.records
+               if record is not None
+            ]
+         self._data_pcb = data_pcb
+         self._patch_design (self._design, changed)
+
+      return self._design
+
+
+
    #-- _parse_design --------------------------------------------------------------
 
    def _parse_design (self):
-      design = Design ()
+      design = Design (self._columnar)
       design.name = self._name
 
-      # read net file
+      if self._incremental:
+         self._parse_net (design)
+         self._pcb_elements = self._parse_pcb_elements (self._data_pcb)
+         self._patch_design (
+            design, [record for record in self._pcb_elements.records if record is not None]
+         )
+         self._design = design
+         return design
+
+      # in parallel, the pcb file is parsed by other processes while the
+      # net file is read here
+
+      jobs = min (self._jobs, multiprocessing.cpu_count ())
+      parallel = None
+      if jobs > 1 and len (self._data_pcb) >= PARALLEL_MIN_SIZE:
+         parallel = _ParallelPcbParse (self._data_pcb, self._engine, jobs, self._contents)
+
+      try:
+         self._parse_net (design)
+
+         parts = None
+         if parallel is not None:
+            with profiling.span ('wait for pcb chunks', 'parse', chunks = parallel.chunks):
+               parts = parallel.get ()
+      finally:
+         if parallel is not None:
+            parallel.close ()
+
+      if parts is None:
+         parts = [self._parse_pcb_part (self._elements (self._data_pcb, self._pcb_sections))]
+
+      self._merge_pcb_parts (design, parts)
+
+      return design
+
+
+
+   #-- _parse_net -------------------------------------------------------------
+
+   def _parse_net (self, design):
+      net_design = None
+      net_components = None
+
+      for net_element in self._elements (self._data_net, NET_SECTIONS):
+         if self._key (net_element) == 'design':
+            net_design = net_element
+         else:
+            net_components = net_element
 
-      net_root = self._parse_sexpression (self._data_net)
-      net_design = self._find_node (net_root, 'design')
       net_date = self._find_node (net_design, 'date')
       design.date = self._value (net_date)
 
-      net_components = self._find_node (net_root, 'components')
       for c in range (1, len (net_components)):
          net_comp = net_components [c]
-         component = Component ()
+         self._index.clear ()
+         component = design.new_component ()
 
          net_ref = self._find_node (net_comp, 'ref')
          component.reference = self._value (net_ref)
 
          net_value = self._find_node (net_comp, 'value')
-         component.value = self._value (net_value)
+         component.value = intern (self._value (net_value))
 
          net_fields = self._find_node (net_comp, 'fields')
          if net_fields != None:
             for f in range (1, len (net_fields)):
                net_field = net_fields [f]
                field_key = self._to_string (net_field [1][1])
-               field_value = self._to_string (net_field [2])
+               # field values repeat across components, share them
+               field_value = intern (self._to_string (net_field [2]))
                if field_key == 'Device':
                   component.device = field_value
                elif field_key == 'Package':
@@ -76,97 +332,601 @@ class Parser (object):
                   component.remark = field_value
 
 
-         design.components [component.reference] = component
-         design.descriptions.add (component.description)
+         design.add_component (component)
 
-      # read pcb file
-      # order of modules follows naming natural order apparently
+      self._index.clear ()
+
+
+
+   #-- _parse_pcb_part --------------------------------------------------------
+   # Reads the pcb `elements` of the whole file or of a chunk of it, which
+   # only depend on each other once merged
+
+   def _parse_pcb_part (self, elements):
+      return _part_of_records (map (self._parse_pcb_element, elements))
+
+
+
+   #-- _parse_pcb_element -----------------------------------------------------
+   # Returns (kind, value), what the pcb element adds to the design, or None:
+   # - _MODULE: ((reference, layer, x, y, rotation), drawings, holes),
+   # - _EDGE: the edge cuts segment,
+   # - _VIA: the via, as returned by `_parse_via`,
+   # - _NET: (number, name),
+   # - _NET_CLASS: the via drill of the class nets.
+
+   def _parse_pcb_element (self, pcb_element):
+      self._index.clear ()
+      key = self._key (pcb_element)
+
+      if key == 'module':
+         pcb_module = pcb_element
+         pcb_at = self._find_node (pcb_module, 'at')
+         x = float (self._to_string (pcb_at [1]))
+         y = float (self._to_string (pcb_at [2]))
+         rot = 0
+         if len (pcb_at) == 4:
+            rot = float (self._to_string (pcb_at [3]))
+         pcb_ref = self._find_node2 (pcb_module, 'fp_text', 'reference')
+         reference = self._to_string (pcb_ref [2])
+         layer = self._to_string (pcb_ref [4][1])
+         drawings = []
+         holes = []
+         if self._contents:
+            self._parse_module_geometry (drawings, holes, pcb_module, x, y, rot)
+         return (_MODULE, ((reference, layer, x, y, rot), drawings, holes))
+
+      elif key == 'gr_line':
+         pcb_line = pcb_element
+         pcb_layer = self._find_node2 (pcb_line, 'layer', 'Edge.Cuts')
+         if pcb_layer != None:
+            pcb_start = self._find_node (pcb_line, 'start')
+            pcb_end = self._find_node (pcb_line, 'end')
+            segment = Segment ()
+            segment.layer = 'Edge.Cuts'
+            segment.start.x = float (self._to_string (pcb_start [1]))
+            segment.start.y = float (self._to_string (pcb_start [2]))
+            segment.end.x = float (self._to_string (pcb_end [1]))
+            segment.end.y = float (self._to_string (pcb_end [2]))
+            segment.width = self._width (pcb_line)
+            return (_EDGE, segment)
+
+      elif key == 'via':
+         via = self._parse_via (pcb_element)
+         if via is not None:
+            return (_VIA, via)
 
-      pcb_root = self._parse_sexpression (self._data_pcb)
+      elif key == 'net':
+         return (_NET, (self._value (pcb_element), self._to_string (pcb_element [2])))
+
+      elif key == 'net_class':
+         via_drills = {}
+         self._parse_net_class (pcb_element, via_drills)
+         return (_NET_CLASS, via_drills)
+
+      return None
+
+
+
+   #-- _parse_pcb_elements ----------------------------------------------------
+   # Parses all the pcb elements of `data_pcb`, keeping their spans and
+   # fingerprints
+
+   def _parse_pcb_elements (self, data_pcb):
+      elements = _PcbElements (data_pcb)
+      for begin, end in _scan_elements (data_pcb, self._pcb_sections, anchors = elements.anchors):
+         elements.starts.append (begin)
+         elements.ends.append (end)
+         elements.fingerprints.append (hash (data_pcb [begin:end]))
+         elements.records.append (
+            self._parse_pcb_element (self._parse_span (data_pcb, begin, end))
+         )
+      return elements
+
+
+
+   #-- _update_pcb_elements ---------------------------------------------------
+   # Updates the pcb elements to the new file content `data_pcb`, and returns
+   # the records of the elements that were replaced and of the ones replacing
+   # them. The changed part of the file is scanned again, from the closest
+   # anchor before it to the closest anchor after it, and only the elements
+   # whose text changed are parsed. Raises _ChunkError if the edit changed
+   # how the file nests.
+
+   def _update_pcb_elements (self, data_pcb):
+      elements = self._pcb_elements
+      data_old = elements.data
+      size_old = len (data_old)
+      size = len (data_pcb)
+
+      prefix = _common_prefix (data_old, data_pcb)
+      if prefix == size_old == size:
+         return []
+      suffix = _common_suffix (data_old, data_pcb, min (size_old, size) - prefix)
+      delta = size - size_old
+
+      # anchors [:before] are before the change, anchors [after:] after it
+
+      anchors = elements.anchors
+      before = bisect_right (anchors, prefix)
+      after = bisect_left (anchors, size_old - suffix)
+      begin = anchors [before - 1] if before > 0 else 0
+      end_old = anchors [after] if after < len (anchors) else size_old
+      end = end_old + delta
+
+      # elements [first, last) are in the scanned part
+
+      first = bisect_left (elements.starts, begin)
+      last = bisect_left (elements.starts, end_old)
+
+      # elements of the scanned part, by fingerprint, to reuse the ones
+      # which only moved
+
+      previous = {}
+      for i in range (first, last):
+         previous.setdefault (elements.fingerprints [i], []).append (i)
+
+      starts = []
+      ends = []
+      fingerprints = []
+      records = []
+      scanned_anchors = array ('q')
+
+      for span_begin, span_end in _scan_elements (
+         data_pcb, self._pcb_sections, before == 0, after == len (anchors), begin, end,
+         scanned_anchors
+      ):
+         text = data_pcb [span_begin:span_end]
+         fingerprint = hash (text)
+         record = None
+         reused = False
+         for i in previous.get (fingerprint, ()):
+            if data_old [elements.starts [i]:elements.ends [i]] == text:
+               previous [fingerprint].remove (i)
+               record = elements.records [i]
+               reused = True
+               break
+         if not reused:
+            record = self._parse_pcb_element (self._parse_span (data_pcb, span_begin, span_end))
+            profiling.count ('elements reparsed')
+         starts.append (span_begin)
+         ends.append (span_end)
+         fingerprints.append (fingerprint)
+         records.append (record)
+
+      # reused records are also returned, as the order of elements matters
+
+      changed = [
+         record for record in elements.records [first:last] + records
+         if record is not None
+      ]
+
+      kept = bisect_right (anchors, end_old)
+      elements.anchors [before:] = scanned_anchors + array (
+         'q', [anchor + delta for anchor in anchors [kept:]]
+      )
+      elements.starts [first:] = array ('q', starts + [start + delta for start in elements.starts [last:]])
+      elements.ends [first:] = array ('q', ends + [end + delta for end in elements.ends [last:]])
+      elements.fingerprints [first:last] = fingerprints
+      elements.records [first:last] = records
+      elements.data = data_pcb
+
+      return changed
+
+
+
+   #-- _patch_design ----------------------------------------------------------
+   # Updates what the pcb elements add to the design, once the `changed`
+   # records were removed or added. Only the modules whose record changed are
+   # placed again, and vias are only resolved again when a via, net or net
+   # class changed.
+
+   def _patch_design (self, design, changed):
+      kinds = set (kind for kind, value in changed)
+      if not kinds:
+         return
+
+      records = [record for record in self._pcb_elements.records if record is not None]
+
+      if _MODULE in kinds:
+         placed = set (value [0][0] for kind, value in changed if kind == _MODULE)
+         placed.difference_update (('REF**', 'G***'))
+         del design.references [:]
+         del design.fiducials [:]
+         self._place_modules (
+            design, [value [0] for kind, value in records if kind == _MODULE], placed
+         )
+
+      if kinds.intersection ((_VIA, _NET, _NET_CLASS)):
+         part = _part_of_records (
+            record for record in records if record [0] in (_VIA, _NET, _NET_CLASS)
+         )
+         self._via_holes = self._resolve_vias (part.vias, part.net_names, part.via_drills)
+
+      part = _part_of_records (record for record in records if record [0] in (_MODULE, _EDGE))
+      design.drawings [:] = part.drawings
+      design.holes [:] = part.holes + self._via_holes
+
+      (
+         design.outline.left, design.outline.top,
+         design.outline.right, design.outline.bottom
+      ) = bounds (part.edges_x, part.edges_y)
+
+      design.invalidate_indexes ()
+
+
+
+   #-- _merge_pcb_parts -------------------------------------------------------
+   # Adds the pcb `parts`, in file order, to the design
+
+   def _merge_pcb_parts (self, design, parts):
+      placements = []
+
+      # vias are read once the net classes, which give their default drill,
+      # are known
+
+      vias = []
+      net_names = {}
+      via_drills = {}
+
+      # edge cuts coordinates, the outline is computed once from them
+
+      edges_x = array ('d')
+      edges_y = array ('d')
+
+      for part in parts:
+         placements.extend (part.placements)
+         design.drawings.extend (part.drawings)
+         design.holes.extend (part.holes)
+         vias.extend (part.vias)
+         net_names.update (part.net_names)
+         via_drills.update (part.via_drills)
+         edges_x.extend (part.edges_x)
+         edges_y.extend (part.edges_y)
+
+      self._place_modules (design, placements)
+      design.holes.extend (self._resolve_vias (vias, net_names, via_drills))
+      design.invalidate_indexes ()
+
+      (
+         design.outline.left, design.outline.top,
+         design.outline.right, design.outline.bottom
+      ) = bounds (edges_x, edges_y)
+
+
+
+   #-- _place_modules ---------------------------------------------------------
+   # Adds the fiducials and references of the modules `placements` to the
+   # design, and places the components whose reference is in `placed`, all
+   # of them by default. When several modules have the same reference, the
+   # last one wins. Components left without a module are put back where the
+   # net file alone puts them.
+
+   def _place_modules (self, design, placements, placed = None):
+      # order of modules follows naming natural order apparently
 
       fiducial_top_idx = 1
       fiducial_bottom_idx = 1
+      positions = {}
 
-      outline_left = None
-      outline_top = None
-      outline_right = None
-      outline_bottom = None
-
-      for i in range (1, len (pcb_root)):
-         pcb_element = pcb_root [i]
-         if self._key (pcb_element) == 'module':
-            pcb_module = pcb_element
-            pcb_at = self._find_node (pcb_module, 'at')
-            x = float (self._to_string (pcb_at [1]))
-            y = float (self._to_string (pcb_at [2]))
-            rot = 0
-            if len (pcb_at) == 4:
-               rot = float (self._to_string (pcb_at [3]))
-            pcb_ref = self._find_node2 (pcb_module, 'fp_text', 'reference')
-            reference = self._to_string (pcb_ref [2])
-            layer = self._to_string (pcb_ref [4][1])
-
-            if reference == 'REF**':
-               fiducial = Fiducial ()
-               if layer == 'F.SilkS':
-                  fiducial.reference = 'REF%sT' % fiducial_top_idx
-                  fiducial.side = 'top'
-                  fiducial_top_idx += 1
-               else:
-                  fiducial.reference = 'REF%sB' % fiducial_bottom_idx
-                  fiducial.side = 'bottom'
-                  fiducial_bottom_idx += 1
-               fiducial.position.x = x
-               fiducial.position.y = y
-               design.fiducials.append (fiducial)
-            if reference == 'G***':
-               pass # skip
+      for placement in placements:
+         reference, layer, x, y, rot = placement
+         if reference == 'REF**':
+            fiducial = Fiducial ()
+            if layer == 'F.SilkS':
+               fiducial.reference = 'REF%sT' % fiducial_top_idx
+               fiducial.side = 'top'
+               fiducial_top_idx += 1
             else:
-               design.references.append (reference)
-               component = design.find_component (reference)
-               component.position.x = x
-               component.position.y = y
-               component.rotation = rot
-               if layer == 'F.SilkS':
-                  component.side = 'top'
-               else:
-                  component.side = 'bottom'
-         elif self._key (pcb_element) == 'gr_line':
-            pcb_line = pcb_element
-            pcb_layer = self._find_node2 (pcb_line, 'layer', 'Edge.Cuts')
-            if pcb_layer != None:
-               pcb_start = self._find_node (pcb_line, 'start')
-               pcb_end = self._find_node (pcb_line, 'end')
-               start_x = float (self._to_string (pcb_start [1]))
-               start_y = float (self._to_string (pcb_start [2]))
-               end_x = float (self._to_string (pcb_end [1]))
-               end_y = float (self._to_string (pcb_end [2]))
-               if outline_left == None:
-                  outline_left = start_x
-               if outline_top == None:
-                  outline_top = start_y
-               if outline_right == None:
-                  outline_right = start_x
-               if outline_bottom == None:
-                  outline_bottom = start_y
-               outline_left = min (outline_left, start_x, end_x)
-               outline_right = max (outline_right, start_x, end_x)
-               outline_top = min (outline_top, start_y, end_y)
-               outline_bottom = max (outline_bottom, start_y, end_y)
-
-         design.outline.left = outline_left
-         design.outline.top = outline_top
-         design.outline.right = outline_right
-         design.outline.bottom = outline_bottom
+               fiducial.reference = 'REF%sB' % fiducial_bottom_idx
+               fiducial.side = 'bottom'
+               fiducial_bottom_idx += 1
+            fiducial.position.x = x
+            fiducial.position.y = y
+            design.fiducials.append (fiducial)
+         elif reference == 'G***':
+            pass # skip
+         else:
+            design.references.append (reference)
+            if placed is None or reference in placed:
+               positions [reference] = placement
 
-      return design
+      for reference in positions if placed is None else placed:
+         component = design.find_component (reference)
+         placement = positions.get (reference)
+         if placement is None:
+            if component is not None:
+               component.position.x = 0.0
+               component.position.y = 0.0
+               component.rotation = 0.0
+               component.side = ''
+            continue
+         reference, layer, x, y, rot = placement
+         component.position.x = x
+         component.position.y = y
+         component.rotation = rot
+         if layer == 'F.SilkS':
+            component.side = 'top'
+         else:
+            component.side = 'bottom'
+
+
+
+   #-- _resolve_vias ----------------------------------------------------------
+   # Returns the holes of `vias`, as returned by `_parse_via`, those without a
+   # drill taking the one of their net class
+
+   def _resolve_vias (self, vias, net_names, via_drills):
+      holes = []
+      for x, y, diameter, net in vias:
+         hole = Hole ()
+         hole.position.x = x
+         hole.position.y = y
+         if diameter is None:
+            net_name = None
+            if net is not None:
+               net_name = net_names.get (net)
+            diameter = via_drills.get (net_name, via_drills.get (None, DEFAULT_VIA_DRILL))
+         hole.diameter = diameter
+         holes.append (hole)
+      return holes
+
+
+
+   #-- _elements --------------------------------------------------------------
+
+   def _elements (self, sexpr, keys):
+      if profiling.get_profiler () is not None:
+         return self._profiled_elements (sexpr, keys)
+
+      if self._stream:
+         return self._iter_sexpression (sexpr, keys)
+
+      root = self._parse_span (sexpr, 0, len (sexpr))
+      return (
+         node for node in root [1:]
+         if type (node) is tuple and self._key (node) in keys
+      )
+
+
+
+   #-- _profiled_elements -----------------------------------------------------
+   # '_elements' recording the S-expression parsing time, interleaved with
+   # the design building when streaming, and the number of elements built
+
+   def _profiled_elements (self, sexpr, keys):
+      profiling.count ('bytes parsed', len (sexpr))
+      if self._stream:
+         elements = self._iter_sexpression (sexpr, keys)
+      else:
+         start = profiling.perf_counter ()
+         root = self._parse_span (sexpr, 0, len (sexpr))
+         profiling.add_time ('s-expression parse', profiling.perf_counter () - start)
+         elements = (
+            node for node in root [1:]
+            if type (node) is tuple and self._key (node) in keys
+         )
+
+      while True:
+         start = profiling.perf_counter ()
+         try:
+            element = next (elements)
+         except StopIteration:
+            return
+         finally:
+            profiling.add_time ('s-expression parse', profiling.perf_counter () - start)
+         profiling.count ('elements')
+         yield element
+
+
+
+   #-- _iter_sexpression --------------------------------------------------------------
+
+   # Yields the top-level elements of `sexpr` whose key is in `keys`, see
+   # `_scan_elements`.
+
+   def _iter_sexpression (self, sexpr, keys, first = True, last = True):
+      for begin, end in _scan_elements (sexpr, keys, first, last):
+         yield self._parse_span (sexpr, begin, end)
+
+
+
+   #-- _parse_span --------------------------------------------------------------
+
+   def _parse_span (self, sexpr, begin, end):
+      if isinstance (sexpr, _TEXT_TYPES):
+         return self._parse_sexpression (sexpr [begin:end])
+      else:
+         return self._parse_sexpression_bytes (sexpr, begin, end)
+
+
+
+   #-- _parse_module_geometry -------------------------------------------------
+   # Adds the fab layers outline and the pad holes of a module at (x, y)
+   # rotated by `rot` degrees to `drawings` and `holes`, in board coordinates,
+   # if they are among the contents read
+
+   def _parse_module_geometry (self, drawings, holes, pcb_module, x, y, rot):
+      read_drawings = 'drawings' in self._contents
+      read_holes = 'holes' in self._contents
+      cos = math.cos (math.radians (rot))
+      sin = math.sin (math.radians (rot))
+
+      def to_board (node):
+         local_x = float (self._to_string (node [1]))
+         local_y = float (self._to_string (node [2]))
+         return (x + local_x * cos + local_y * sin, y - local_x * sin + local_y * cos)
+
+      for c in range (2, len (pcb_module)):
+         pcb_drawing = pcb_module [c]
+         if type (pcb_drawing) is not tuple:
+            continue
+         key = self._to_string (pcb_drawing [0])
+         if key == 'pad':
+            if read_holes:
+               self._parse_pad (holes, pcb_drawing, to_board)
+            continue
+         if not read_drawings:
+            continue
+         if key != 'fp_line' and key != 'fp_circle' and key != 'fp_arc':
+            continue
+
+         pcb_layer = self._find_node (pcb_drawing, 'layer')
+         if pcb_layer == None:
+            continue
+         layer = self._value (pcb_layer)
+         if layer not in FAB_LAYERS:
+            continue
+         layer = intern (layer)
+         width = self._width (pcb_drawing)
+
+         if key == 'fp_circle':
+            circle = Circle ()
+            circle.layer = layer
+            circle.center.x, circle.center.y = to_board (self._find_node (pcb_drawing, 'center'))
+            end_x, end_y = to_board (self._find_node (pcb_drawing, 'end'))
+            circle.radius = math.hypot (end_x - circle.center.x, end_y - circle.center.y)
+            circle.width = width
+            drawings.append (circle)
+            continue
+
+         start = to_board (self._find_node (pcb_drawing, 'start'))
+         end = to_board (self._find_node (pcb_drawing, 'end'))
+
+         if key == 'fp_line':
+            points = [start, end]
+         else:
+            # arcs are approximated by segments, start is the center
+            angle = float (self._value (self._find_node (pcb_drawing, 'angle')))
+            points = arc (start [0], start [1], end [0], end [1], angle)
+
+         for i in range (1, len (points)):
+            segment = Segment ()
+            segment.layer = layer
+            segment.start.x, segment.start.y = points [i - 1]
+            segment.end.x, segment.end.y = points [i]
+            segment.width = width
+            drawings.append (segment)
+
+
+
+   #-- _parse_pad -------------------------------------------------------------
+
+   def _parse_pad (self, holes, pcb_pad, to_board):
+      pad_type = self._to_string (pcb_pad [2])
+      if pad_type != 'thru_hole' and pad_type != 'np_thru_hole':
+         return
+
+      pcb_drill = self._find_node (pcb_pad, 'drill')
+      if pcb_drill == None:
+         return
+
+      # (drill 1.0), (drill oval 1.0 2.0), both optionally followed by
+      # (offset x y) which moves the pad, not the hole
+
+      sizes = [self._to_string (item) for item in pcb_drill [1:] if type (item) is not tuple]
+      oval = sizes [0] == 'oval'
+      if oval:
+         sizes = sizes [1:]
+      width = float (sizes [0])
+      height = float (sizes [1]) if oval and len (sizes) > 1 else width
+      if width <= 0.0 or height <= 0.0:
+         return
+
+      pcb_at = self._find_node (pcb_pad, 'at')
+      x, y = to_board (pcb_at)
+
+      hole = Hole ()
+      hole.plated = pad_type == 'thru_hole'
+      hole.diameter = min (width, height)
+
+      if width == height:
+         hole.position.x = x
+         hole.position.y = y
+      else:
+         # pad orientation is absolute in kicad_pcb files
+         orientation = 0.0
+         if len (pcb_at) == 4:
+            orientation = float (self._to_string (pcb_at [3]))
+         cos = math.cos (math.radians (orientation))
+         sin = math.sin (math.radians (orientation))
+         if width > height:
+            dx, dy = (width - height) / 2, 0.0
+         else:
+            dx, dy = 0.0, (height - width) / 2
+         dx, dy = dx * cos + dy * sin, - dx * sin + dy * cos
+         hole.position.x = x - dx
+         hole.position.y = y - dy
+         hole.end = Point ()
+         hole.end.x = x + dx
+         hole.end.y = y + dy
+
+      holes.append (hole)
+
+
+
+   #-- _parse_via -------------------------------------------------------------
+   # Returns (x, y, diameter, net) of a through via, the diameter being None
+   # when it is the one of the net class of `net`
+
+   def _parse_via (self, pcb_via):
+      via_type = self._to_string (pcb_via [1])
+      if via_type == 'blind' or via_type == 'micro':
+         # not drilled through, not part of the merged drill file
+         return None
+
+      pcb_at = self._find_node (pcb_via, 'at')
+      pcb_drill = self._find_node (pcb_via, 'drill')
+
+      x = float (self._to_string (pcb_at [1]))
+      y = float (self._to_string (pcb_at [2]))
+
+      if pcb_drill != None:
+         return (x, y, float (self._value (pcb_drill)), None)
+
+      pcb_net = self._find_node (pcb_via, 'net')
+      net = None
+      if pcb_net != None:
+         net = self._value (pcb_net)
+      return (x, y, None, net)
+
+
+
+   #-- _parse_net_class -------------------------------------------------------
+   # Records the via drill of the nets of the class, the default class
+   # being recorded under None
+
+   def _parse_net_class (self, pcb_net_class, via_drills):
+      pcb_via_drill = self._find_node (pcb_net_class, 'via_drill')
+      if pcb_via_drill == None:
+         return
+      via_drill = float (self._value (pcb_via_drill))
+
+      if self._to_string (pcb_net_class [1]) == 'Default':
+         via_drills [None] = via_drill
+
+      for c in range (2, len (pcb_net_class)):
+         pcb_add_net = pcb_net_class [c]
+         if type (pcb_add_net) is tuple and self._key (pcb_add_net) == 'add_net':
+            via_drills [self._value (pcb_add_net)] = via_drill
+
+
+
+   #-- _width ------------------------------------------------------------------
+
+   def _width (self, node):
+      pcb_width = self._find_node (node, 'width')
+      if pcb_width == None:
+         return 0.0
+      return float (self._value (pcb_width))
 
 
 
    #-- _to_string --------------------------------------------------------------
 
    def _to_string (self, data):
-      if type (data) is tuple: return data [0]
+      if type (data) is Symbol:
+         return data.name
       else: return data
 
 
@@ -186,27 +946,19 @@ class Parser (object):
 
 
    #-- _find_node --------------------------------------------------------------
+   # Lists are indexed by key the first time they are looked into, see
+   # `query.Index`
 
    def _find_node (self, node, search_key):
-      for c in range (1, len (node)):
-         sub_node = node [c]
-         key = self._to_string (sub_node [0])
-         if key == search_key:
-            return sub_node
-      return None
+      return self._index.child (node, search_key)
 
 
 
    #-- _find_node2 --------------------------------------------------------------
 
    def _find_node2 (self, node, search_key, search_subkey):
-      for c in range (1, len (node)):
-         sub_node = node [c]
-         if len (sub_node) < 2:
-            continue
-         key = self._to_string (sub_node [0])
-         subkey = self._to_string (sub_node [1])
-         if key == search_key and subkey == search_subkey:
+      for sub_node in self._index.children (node, search_key):
+         if len (sub_node) >= 2 and self._to_string (sub_node [1]) == search_subkey:
             return sub_node
       return None
 
@@ -215,6 +967,164 @@ class Parser (object):
    #-- _parse_sexpression --------------------------------------------------------------
 
    def _parse_sexpression (self, sexpr):
+      if self._engine == 'char':
+         return self._parse_sexpression_char (sexpr)
+      else:
+         return self._parse_sexpression_token (sexpr)
+
+
+
+   #-- _parse_sexpression_token --------------------------------------------------------
+
+   # Trees are made of tuples, symbols and strings, see `sexpr`. Lists are
+   # built as Python lists, and frozen to tuples once closed.
+
+   def _parse_sexpression_token (self, sexpr):
+
+      # take strings out, so that the remaining code can be split
+      # into tokens on whitespace once parens are padded
+
+      parts = _STRING_RE.split (sexpr)
+      code = '"'.join (parts [0::2])
+
+      if (
+         "'" in code or code.count ('"') != len (parts) // 2
+         or _SPLIT_WHITESPACE_RE.search (code)
+      ):
+         return self._parse_sexpression_regex (sexpr)
+
+      strings = iter ([
+         _ESCAPE_RE.sub (r'\1', string) if '\\' in string else string
+         for string in parts [1::2]
+      ])
+
+      tokens = code.replace ('(', ' ( ').replace (')', ' ) ').replace ('"', ' " ').split ()
+
+      symbols = self._symbols
+      get_symbol = symbols.get
+
+      stack = []
+      node = []
+
+      for token in tokens:
+         if token == '(':
+            stack.append (node)
+            node = []
+         elif token == ')':
+            sub_node = tuple (node)
+            node = stack.pop ()
+            if len (sub_node) >= FLAT_MIN_ITEMS:
+               sub_node = flatten (sub_node)
+            node.append (sub_node)
+         elif token == '"':
+            node.append (next (strings))
+         else:
+            # `symbols [token]`, spelled out as most atoms are met before
+            symbol = get_symbol (token)
+            if symbol is None:
+               symbol = symbols [token] = Symbol (token)
+            node.append (symbol)
+
+      return node [0]
+
+
+
+   #-- _parse_sexpression_regex --------------------------------------------------------
+
+   # Slower token scanner, for input with quotes or unusual whitespace
+
+   def _parse_sexpression_regex (self, sexpr):
+
+      symbols = self._symbols
+
+      stack = [[]]
+      node = stack[-1]
+
+      for punct, string, atom in _TOKEN_RE.findall (sexpr):
+         if atom:
+            node.append (symbols [atom])
+         elif string:
+            string = string [1:-1]
+            if '\\' in string:
+               string = _ESCAPE_RE.sub (r'\1', string)
+            node.append (string)
+         elif punct == '(':
+            node = []
+            stack.append (node)
+            continue
+         elif punct == ')':
+            sub_node = tuple (stack.pop ())
+            node = stack[-1]
+            node.append (flatten (sub_node))
+         else:
+            node = [_QUOTE]
+            stack.append (node)
+            continue
+
+         # a quote wraps exactly one element
+
+         if node [0] is _QUOTE:
+            sub_node = tuple (stack.pop ())
+            node = stack[-1]
+            node.append (sub_node)
+
+      return stack.pop () [0]
+
+
+
+   #-- _parse_sexpression_bytes --------------------------------------------------------
+
+   # Token scanner working in place on bytes-like input, such as a memory
+   # mapped file. Each distinct atom is decoded once, the first time it is
+   # met, to the symbol the other engines share.
+
+   def _parse_sexpression_bytes (self, sexpr, begin, end):
+
+      bytes_symbols = self._bytes_symbols
+
+      stack = [[]]
+      node = stack[-1]
+
+      for match in _TOKEN_BYTES_RE.finditer (sexpr, begin, end):
+         kind = match.lastindex
+         if kind == 3:
+            node.append (bytes_symbols [match.group (3)])
+         elif kind == 2:
+            string = to_text (match.group (2) [1:-1])
+            if '\\' in string:
+               string = _ESCAPE_RE.sub (r'\1', string)
+            node.append (string)
+         else:
+            punct = match.group (1)
+            if punct == b'(':
+               node = []
+               stack.append (node)
+               continue
+            elif punct == b')':
+               sub_node = tuple (stack.pop ())
+               node = stack[-1]
+               node.append (flatten (sub_node))
+            else:
+               node = [_QUOTE]
+               stack.append (node)
+               continue
+
+         # a quote wraps exactly one element
+
+         if node [0] is _QUOTE:
+            sub_node = tuple (stack.pop ())
+            node = stack[-1]
+            node.append (sub_node)
+
+      return stack.pop () [0]
+
+
+
+   #-- _parse_sexpression_char ---------------------------------------------------------
+
+   def _parse_sexpression_char (self, sexpr):
+
+      symbols = self._symbols
 
       stack, i, length = [[]], 0, len (sexpr)
 
@@ -226,27 +1136,329 @@ class Parser (object):
          if reading == list:
             if c == '(': stack.append ([])
             elif c == ')': 
-               stack[-2].append (stack.pop ())
-               if stack[-1][0] == ('quote',): stack[-2].append (stack.pop ())
+               stack[-2].append (flatten (tuple (stack.pop ())))
+               if stack[-1][0] is _QUOTE: stack[-2].append (tuple (stack.pop ()))
             elif c == '"': stack.append ('')
-            elif c == "'": stack.append ([('quote',)])
+            elif c == "'": stack.append ([_QUOTE])
             elif c in whitespace: pass
             else: stack.append ((c,))
          elif reading == str:
             if c == '"':
                stack[-2].append (stack.pop ())
-               if stack[-1][0] == ('quote',): stack[-2].append (stack.pop ())
+               if stack[-1][0] is _QUOTE: stack[-2].append (tuple (stack.pop ()))
             elif c == '\\': 
                i += 1
                stack[-1] += sexpr[i]
             else: stack[-1] += c
          elif reading == tuple:
+            # atom being read
             if c in self._atom_end:
-               atom = stack.pop ()
+               atom = symbols [stack.pop () [0]]
                stack[-1].append( atom)
-               if stack[-1][0] == ('quote',): stack[-2].append (stack.pop ())
+               if stack[-1][0] is _QUOTE: stack[-2].append (tuple (stack.pop ()))
                continue
             else: stack[-1] = ((stack[-1][0] + c),)
          i += 1
       return stack.pop () [0]
 
+
+
+#-- parse_sexpression ---------------------------------------------------------
+# Returns the tree of the S-expression `data`, a string or a bytes-like
+# object, see `sexpr`
+
+def parse_sexpression (data, engine = 'token'):
+   # matches in a bytearray are bytearrays on python 2, which can't be
+   # hashed, while its bytes are a string the text engines parse
+   if str is bytes and isinstance (data, bytearray):
+      data = bytes (data)
+   parser = Parser (None, None, None, engine)
+   return parser._parse_span (data, 0, len (data))
+
+
+
+#-- get_pcb_sections ----------------------------------------------------------
+# Returns the top-level elements of the pcb file read for the design
+# `contents`
+
+def get_pcb_sections (contents = DESIGN_CONTENTS):
+   if 'holes' in contents:
+      return PCB_SECTIONS
+   return tuple (section for section in PCB_SECTIONS if section not in HOLES_SECTIONS)
+
+
+
+class _PcbPart (object):
+
+   # What a pcb file, or a chunk of it, adds to the design, in file order:
+   # (reference, layer, x, y, rotation) of each module, the drawings and pad
+   # holes, the vias as returned by `_parse_via`, the net names and net
+   # class via drills, and the edge cuts coordinates.
+
+   def __init__ (self):
+      self.placements = []
+      self.drawings = []
+      self.holes = []
+      self.vias = []
+      self.net_names = {}
+      self.via_drills = {}
+      self.edges_x = array ('d')
+      self.edges_y = array ('d')
+
+
+
+class _ParallelPcbParse (object):
+
+   # Parses the chunks of a pcb file on a pool of `jobs` processes, in the
+   # background until `get` is called.
+
+   def __init__ (self, data, engine, jobs, contents = DESIGN_CONTENTS):
+      if isinstance (data, str):
+         start_re = _CHUNK_START_RE
+      else:
+         start_re = _CHUNK_START_BYTES_RE
+
+      size = len (data)
+      count = jobs * CHUNKS_PER_JOB
+      cuts = [0]
+      for i in range (1, count):
+         match = start_re.search (data, max (i * size // count, cuts [-1]))
+         if match is None:
+            break
+         cuts.append (match.end () - 1)
+      cuts.append (size)
+
+      self.chunks = len (cuts) - 1
+      last = self.chunks - 1
+
+      # slicing copies, and maps the chunks of memory mapped files to bytes
+
+      tasks = [
+         (data [cuts [i]:cuts [i + 1]], engine, contents, i == 0, i == last)
+         for i in range (self.chunks)
+      ]
+
+      self._pool = multiprocessing.Pool (min (jobs, self.chunks), _init_pcb_worker)
+      self._result = self._pool.map_async (_parse_pcb_chunk, tasks)
+
+
+   #-- get ---------------------------------------------------------------------
+   # Returns the parsed chunks in file order, None if the file couldn't be cut
+   # between top-level elements
+
+   def get (self):
+      parts = self._result.get ()
+      if any (part is None for part in parts):
+         return None
+      return parts
+
+
+   #-- close -------------------------------------------------------------------
+
+   def close (self):
+      self._pool.terminate ()
+      self._pool.join ()
+
+
+
+#-- _init_pcb_worker ----------------------------------------------------------
+
+def _init_pcb_worker ():
+   # forked workers inherit the profiler, which they can't report to
+   profiler = profiling.get_profiler ()
+   if profiler is not None:
+      profiler.stop ()
+      profiling.set_profiler (None)
+
+
+
+#-- _parse_pcb_chunk ----------------------------------------------------------
+
+def _parse_pcb_chunk (task):
+   data, engine, contents, first, last = task
+   parser = Parser (None, None, data, engine, contents = contents)
+   with _gc_paused ():
+      try:
+         return parser._parse_pcb_part (
+            parser._iter_sexpression (data, parser._pcb_sections, first, last)
+         )
+      except _ChunkError:
+         return None
+
+
+
+class _PcbElements (object):
+
+   # The pcb file content `data`, and the span, fingerprint and record, as
+   # returned by `_parse_pcb_element`, of each of its top-level elements
+   # read, in file order. Anchors are positions between top-level elements,
+   # read or not, from where the file can be scanned again.
+
+   def __init__ (self, data):
+      self.data = data
+      self.anchors = array ('q')
+      self.starts = array ('q')
+      self.ends = array ('q')
+      self.fingerprints = []
+      self.records = []
+
+
+
+#-- _scan_elements ------------------------------------------------------------
+
+# Yields the (begin, end) span of the top-level elements of `sexpr` whose
+# key is in `keys`. Other elements are skipped by balanced paren scanning.
+# The scan can also be limited to a chunk of the file from `pos` to
+# `endpos`, cut between top-level elements: `first` tells if it holds the
+# opening paren of the file, `last` if it holds the closing one. _ChunkError
+# is raised if the chunk is cut elsewhere. The end of every top-level element
+# is appended to `anchors` if given.
+
+def _scan_elements (
+   sexpr, keys, first = True, last = True, pos = 0, endpos = None, anchors = None
+):
+   if isinstance (sexpr, _TEXT_TYPES):
+      scan_re, key_re = _SCAN_RE, _KEY_RE
+   else:
+      scan_re, key_re = _SCAN_BYTES_RE, _KEY_BYTES_RE
+      keys = [key.encode ('ascii') for key in keys]
+
+   if endpos is None:
+      endpos = len (sexpr)
+
+   if first:
+      pos = sexpr.find (b'(' if scan_re is _SCAN_BYTES_RE else '(', pos, endpos) + 1
+      if pos == 0:
+         if not last:
+            raise _ChunkError ()
+         return
+
+   depth = 1
+   start = 0
+   wanted = False
+   tail = pos
+
+   for match in scan_re.finditer (sexpr, pos, endpos):
+      kind = match.lastindex
+
+      if kind == _SCAN_NESTED:
+         # nested list, self contained
+         if depth == 1:
+            begin = match.start ()
+            if key_re.match (sexpr, begin + 1).group (1) in keys:
+               yield (begin, match.end ())
+            if anchors is not None:
+               anchors.append (match.end ())
+      elif kind == _SCAN_OPEN:
+         depth += 1
+         if depth == 2:
+            start = match.start ()
+            wanted = key_re.match (sexpr, start + 1).group (1) in keys
+      elif kind == _SCAN_CLOSE:
+         depth -= 1
+         if depth == 1:
+            if wanted:
+               yield (start, match.end ())
+            if anchors is not None:
+               anchors.append (match.end ())
+         elif depth == 0:
+            if not last:
+               raise _ChunkError ()
+            return
+      elif kind == _SCAN_QUOTE:
+         # the string goes on past the chunk
+         if not last:
+            raise _ChunkError ()
+      tail = match.end ()
+
+   # a chunk must end between top-level elements, which leaves nothing
+   # but whitespace after its last element
+
+   if not last and (depth != 1 or sexpr [tail:endpos].strip ()):
+      raise _ChunkError ()
+
+
+
+#-- _part_of_records ----------------------------------------------------------
+# Gathers the records returned by `_parse_pcb_element`, in file order
+
+def _part_of_records (records):
+   part = _PcbPart ()
+
+   for record in records:
+      if record is None:
+         continue
+      kind, value = record
+      if kind == _MODULE:
+         placement, drawings, holes = value
+         part.placements.append (placement)
+         part.drawings.extend (drawings)
+         part.holes.extend (holes)
+      elif kind == _EDGE:
+         part.edges_x.append (value.start.x)
+         part.edges_x.append (value.end.x)
+         part.edges_y.append (value.start.y)
+         part.edges_y.append (value.end.y)
+         part.drawings.append (value)
+      elif kind == _VIA:
+         part.vias.append (value)
+      elif kind == _NET:
+         number, name = value
+         part.net_names [number] = name
+      else:
+         part.via_drills.update (value)
+
+   return part
+
+
+
+#-- _common_prefix ------------------------------------------------------------
+# Returns the length of the common start of `a` and `b`, comparing whole
+# blocks first
+
+def _common_prefix (a, b):
+   size = min (len (a), len (b))
+   block = 1 << 16
+   low = 0
+   while low < size and a [low:low + block] == b [low:low + block]:
+      low += block
+   high = min (low + block, size)
+   if low >= size:
+      return size
+
+   # a [:low] == b [:low] and a [:high] != b [:high]
+   while high - low > 1:
+      middle = (low + high) // 2
+      if a [low:middle] == b [low:middle]:
+         low = middle
+      else:
+         high = middle
+   return low if a [low:low + 1] != b [low:low + 1] else high
+
+
+
+#-- _common_suffix ------------------------------------------------------------
+# Returns the length of the common end of `a` and `b`, at most `limit`
+
+def _common_suffix (a, b, limit):
+   size_a = len (a)
+   size_b = len (b)
+   block = 1 << 16
+   low = 0
+   while low < limit:
+      length = min (low + block, limit)
+      if a [size_a - length:size_a - low] != b [size_b - length:size_b - low]:
+         break
+      low = length
+   else:
+      return limit
+   high = min (low + block, limit)
+
+   # the last `low` items match, the last `high` don't
+   while high - low > 1:
+      middle = (low + high) // 2
+      if a [size_a - middle:size_a - low] == b [size_b - middle:size_b - low]:
+         low = middle
+      else:
+         high = middle
+   return low if a [size_a - high:size_a - low] != b [size_b - high:size_b - low] else high
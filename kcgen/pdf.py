@@ -0,0 +1,179 @@
+##############################################################################
+#
+#     pdf.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import zlib
+
+
+
+# Minimal vector PDF writer: pages of stroked lines, circles and text in
+# the standard Helvetica font. Page coordinates are in millimeters, with
+# the origin in the top left corner and Y going down, like KiCad.
+
+PT_PER_MM = 72.0 / 25.4
+
+# bezier control distance approximating a quarter circle
+
+_KAPPA = 0.5522847498
+
+
+
+class PdfPage (object):
+
+   def __init__ (self, width, height):
+      self.width = width
+      self.height = height
+      self._content = []
+
+
+   #-- set_stroke_color --------------------------------------------------------
+
+   def set_stroke_color (self, red, green, blue):
+      self._content.append ('%.3f %.3f %.3f RG\n' % (red, green, blue))
+
+
+   #-- set_fill_color ----------------------------------------------------------
+
+   def set_fill_color (self, red, green, blue):
+      self._content.append ('%.3f %.3f %.3f rg\n' % (red, green, blue))
+
+
+   #-- set_line_width ----------------------------------------------------------
+
+   def set_line_width (self, width):
+      self._content.append ('%.3f w\n' % (width * PT_PER_MM))
+
+
+   #-- lines -------------------------------------------------------------------
+   # Strokes the ((x1, y1), (x2, y2)) segments as one path
+
+   def lines (self, segments):
+      height = self.height
+      self._content.append (''.join ([
+         '%.3f %.3f m %.3f %.3f l\n' % (
+            x1 * PT_PER_MM, (height - y1) * PT_PER_MM,
+            x2 * PT_PER_MM, (height - y2) * PT_PER_MM
+         )
+         for (x1, y1), (x2, y2) in segments
+      ]))
+      self._content.append ('S\n')
+
+
+   #-- circle ------------------------------------------------------------------
+
+   def circle (self, x, y, radius):
+      x = x * PT_PER_MM
+      y = (self.height - y) * PT_PER_MM
+      r = radius * PT_PER_MM
+      k = r * _KAPPA
+      self._content.append (
+         '%.3f %.3f m\n' % (x + r, y) +
+         '%.3f %.3f %.3f %.3f %.3f %.3f c\n' % (x + r, y + k, x + k, y + r, x, y + r) +
+         '%.3f %.3f %.3f %.3f %.3f %.3f c\n' % (x - k, y + r, x - r, y + k, x - r, y) +
+         '%.3f %.3f %.3f %.3f %.3f %.3f c\n' % (x - r, y - k, x - k, y - r, x, y - r) +
+         '%.3f %.3f %.3f %.3f %.3f %.3f c\n' % (x + k, y - r, x + r, y - k, x + r, y) +
+         'S\n'
+      )
+
+
+   #-- text --------------------------------------------------------------------
+   # Writes `string` with its baseline centered on (x, y), `size` being the
+   # font size in millimeters
+
+   def text (self, x, y, size, string):
+      # Helvetica average glyph width is about half the font size
+      x = x - len (string) * size * 0.25
+      y = y + size * 0.35
+      self._content.append (
+         'BT /F1 %.3f Tf %.3f %.3f Td (%s) Tj ET\n' % (
+            size * PT_PER_MM, x * PT_PER_MM, (self.height - y) * PT_PER_MM, _escape (string)
+         )
+      )
+
+
+   #-- content -----------------------------------------------------------------
+
+   def content (self):
+      return ''.join (self._content).encode ('latin-1')
+
+
+
+class PdfDocument (object):
+
+   def __init__ (self):
+      self.pages = []
+
+
+   #-- add_page ----------------------------------------------------------------
+
+   def add_page (self, width, height):
+      page = PdfPage (width, height)
+      self.pages.append (page)
+      return page
+
+
+   #-- write -------------------------------------------------------------------
+   # Writes the document to `output`, a path or a file open for binary
+   # writing
+
+   def write (self, output):
+      # objects: 1 catalog, 2 pages, 3 font, then a page and its content
+      # stream for each page
+
+      objects = [
+         b'<< /Type /Catalog /Pages 2 0 R >>',
+         None,
+         b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+      ]
+
+      kids = []
+      for page in self.pages:
+         page_id = len (objects) + 1
+         kids.append ('%d 0 R' % page_id)
+         objects.append ((
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.3f %.3f] '
+            '/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (
+               page.width * PT_PER_MM, page.height * PT_PER_MM, page_id + 1
+            )
+         ).encode ('ascii'))
+         stream = zlib.compress (page.content ())
+         objects.append (
+            ('<< /Length %d /Filter /FlateDecode >>\nstream\n' % len (stream)).encode ('ascii') +
+            stream + b'\nendstream'
+         )
+
+      objects [1] = (
+         '<< /Type /Pages /Kids [%s] /Count %d >>' % (' '.join (kids), len (kids))
+      ).encode ('ascii')
+
+      data = [b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n']
+      offset = len (data [0])
+      offsets = []
+      for index, obj in enumerate (objects):
+         chunk = b'%d 0 obj\n' % (index + 1) + obj + b'\nendobj\n'
+         offsets.append (offset)
+         offset += len (chunk)
+         data.append (chunk)
+
+      data.append (b'xref\n0 %d\n0000000000 65535 f \n' % (len (objects) + 1))
+      data.extend ([b'%010d 00000 n \n' % offset_obj for offset_obj in offsets])
+      data.append (
+         b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len (objects) + 1, offset)
+      )
+
+      if hasattr (output, 'write'):
+         output.write (b''.join (data))
+      else:
+         with open (output, 'wb') as file:
+            file.write (b''.join (data))
+
+
+
+#-- _escape -------------------------------------------------------------------
+
+def _escape (string):
+   string = string.encode ('latin-1', 'replace').decode ('latin-1')
+   return string.replace ('\\', '\\\\').replace ('(', '\\(').replace (')', '\\)')
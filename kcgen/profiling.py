@@ -0,0 +1,273 @@
+##############################################################################
+#
+#     profiling.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+
+# Spans of work recorded while a profiler is set, with their wall time, CPU
+# time and peak memory, along with counters. Recording does nothing while no
+# profiler is set.
+
+_profiler = None
+
+# Python 2 has neither perf_counter nor a CPU clock per thread
+
+perf_counter = getattr (time, 'perf_counter', time.time)
+thread_time = (
+   getattr (time, 'thread_time', None) or getattr (time, 'process_time', None) or time.clock
+)
+
+
+
+#-- set_profiler --------------------------------------------------------------
+# Records spans and counters into `profiler`, None to stop recording
+
+def set_profiler (profiler):
+   global _profiler
+   _profiler = profiler
+
+
+
+#-- get_profiler --------------------------------------------------------------
+
+def get_profiler ():
+   return _profiler
+
+
+
+#-- span ----------------------------------------------------------------------
+# Records the work done in the `with` block as `name`, `args` being added to
+# the trace event
+
+def span (name, category = 'kcgen', **args):
+   if _profiler is None:
+      return _NULL_SPAN
+   return _profiler.span (name, category, **args)
+
+
+
+#-- count ---------------------------------------------------------------------
+
+def count (name, value = 1):
+   if _profiler is not None:
+      _profiler.count (name, value)
+
+
+
+#-- add_time ------------------------------------------------------------------
+# Adds `seconds` to the total time of `name`, for work spread in many small
+# pieces that would be too costly to record as spans
+
+def add_time (name, seconds):
+   if _profiler is not None:
+      _profiler.add_time (name, seconds)
+
+
+
+class Profiler (object):
+
+   # Peak memory is measured with tracemalloc when `trace_memory` is set,
+   # imported then only as python 2 doesn't have it. Allocations get several
+   # times slower while it runs, so the times of a memory profile are not
+   # representative.
+
+   def __init__ (self, trace_memory = False):
+      self.events = []
+      self.counters = {}
+      self.times = {}
+      self._lock = threading.Lock ()
+      self._active = []
+      self._origin = perf_counter ()
+      self._trace_memory = trace_memory
+      self._tracemalloc = None
+      if trace_memory:
+         try:
+            import tracemalloc
+         except ImportError:
+            logging.warning ('tracemalloc not found, peak memory is not recorded')
+            self._trace_memory = False
+         else:
+            self._tracemalloc = tracemalloc
+            if not tracemalloc.is_tracing ():
+               tracemalloc.start ()
+
+
+   #-- stop --------------------------------------------------------------------
+
+   def stop (self):
+      if self._trace_memory and self._tracemalloc.is_tracing ():
+         self._tracemalloc.stop ()
+
+
+   #-- span --------------------------------------------------------------------
+
+   @contextlib.contextmanager
+   def span (self, name, category = 'kcgen', **args):
+      record = _SpanRecord (name, category, args)
+
+      with self._lock:
+         record.memory = self._update_peaks ()
+         self._active.append (record)
+
+      record.wall = perf_counter ()
+      record.cpu = thread_time ()
+      try:
+         yield record
+      finally:
+         cpu = thread_time () - record.cpu
+         end = perf_counter ()
+
+         with self._lock:
+            self._update_peaks ()
+            self._active.remove (record)
+            self.events.append ({
+               'name': name,
+               'cat': category,
+               'ph': 'X',
+               'ts': (record.wall - self._origin) * 1e6,
+               'dur': (end - record.wall) * 1e6,
+               'pid': os.getpid (),
+               'tid': threading.current_thread ().ident,
+               'args': dict (
+                  args,
+                  cpu_ms = cpu * 1000,
+                  peak_memory = max (0, record.peak - record.memory)
+               ),
+            })
+
+
+   #-- count -------------------------------------------------------------------
+
+   def count (self, name, value = 1):
+      with self._lock:
+         self.counters [name] = self.counters.get (name, 0) + value
+
+
+   #-- add_time ----------------------------------------------------------------
+
+   def add_time (self, name, seconds):
+      with self._lock:
+         self.times [name] = self.times.get (name, 0.0) + seconds
+
+
+   #-- write_trace -------------------------------------------------------------
+   # Writes the spans and counters in the Chrome trace event format, to open
+   # in chrome://tracing or Perfetto
+
+   def write_trace (self, path):
+      with self._lock:
+         events = list (self.events)
+         end = (perf_counter () - self._origin) * 1e6
+         events.append ({
+            'name': 'counters', 'ph': 'C', 'ts': end, 'pid': os.getpid (),
+            'args': dict (self.counters),
+         })
+         for name, seconds in sorted (self.times.items ()):
+            events.append ({
+               'name': name, 'cat': 'aggregated', 'ph': 'i', 's': 'p', 'ts': end,
+               'pid': os.getpid (), 'tid': 0, 'args': {'total_ms': seconds * 1000},
+            })
+
+      with open (path, 'w') as file:
+         json.dump ({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+   #-- summary -----------------------------------------------------------------
+   # Returns a text table of the time and memory spent in each span name,
+   # in the order they first started
+
+   def summary (self):
+      with self._lock:
+         events = sorted (self.events, key = lambda event: event ['ts'])
+         counters = dict (self.counters)
+         times = dict (self.times)
+
+      totals = {}
+      names = []
+      for event in events:
+         name = event ['name']
+         if name not in totals:
+            names.append (name)
+            totals [name] = [0, 0.0, 0.0, 0]
+         total = totals [name]
+         total [0] += 1
+         total [1] += event ['dur'] / 1000
+         total [2] += event ['args']['cpu_ms']
+         total [3] = max (total [3], event ['args']['peak_memory'])
+
+      header = '%-32s %6s %12s %12s' % ('span', 'calls', 'wall ms', 'cpu ms')
+      if self._trace_memory:
+         header += ' %12s' % 'peak MB'
+      lines = [header]
+      for name in names:
+         calls, wall, cpu, peak = totals [name]
+         line = '%-32s %6d %12.1f %12.1f' % (name, calls, wall, cpu)
+         if self._trace_memory:
+            line += ' %12.1f' % (peak / 1e6)
+         lines.append (line)
+
+      if times:
+         lines.append ('')
+         for name in sorted (times):
+            lines.append ('%-32s %6s %12.1f' % (name, '', times [name] * 1000))
+
+      if counters:
+         lines.append ('')
+         for name in sorted (counters):
+            lines.append ('%-32s %d' % (name, counters [name]))
+
+      return '\n'.join (lines)
+
+
+   #-- _update_peaks -----------------------------------------------------------
+   # Folds the memory peak since the last update into the active spans and
+   # returns the currently allocated memory. Before python 3.9 the peak
+   # can't be reset, and the memory at span starts and ends stands in for it.
+
+   def _update_peaks (self):
+      tracemalloc = self._tracemalloc
+      if tracemalloc is None or not tracemalloc.is_tracing ():
+         return 0
+      current, peak = tracemalloc.get_traced_memory ()
+      if hasattr (tracemalloc, 'reset_peak'):
+         tracemalloc.reset_peak ()
+      else:
+         peak = current
+      for record in self._active:
+         record.peak = max (record.peak, peak)
+      return current
+
+
+
+class _SpanRecord (object):
+   __slots__ = ('name', 'category', 'args', 'wall', 'cpu', 'memory', 'peak')
+
+   def __init__ (self, name, category, args):
+      self.name = name
+      self.category = category
+      self.args = args
+      self.wall = 0.0
+      self.cpu = 0.0
+      self.memory = 0
+      self.peak = 0
+
+
+
+class _NullSpan (object):
+   def __enter__ (self):
+      return None
+
+   def __exit__ (self, *exc):
+      return False
+
+_NULL_SPAN = _NullSpan ()
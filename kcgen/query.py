@@ -0,0 +1,198 @@
+##############################################################################
+#
+#     query.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import re
+from .sexpr import Symbol, FlatNode, is_node
+
+
+
+# Path queries over S-expression trees, see `sexpr`:
+#
+#     select (tree, 'module/fp_text[reference]')
+#
+# returns the `fp_text` lists, whose item after the key is `reference`, of
+# the `module` lists of `tree`. A path is a list of steps separated by '/',
+# each selecting lists among the ones held by the lists selected by the
+# previous step, or by `tree` for the first step:
+# - `key` selects the lists keyed `key`, `*` any list,
+# - `[value]` keeps the lists whose item after the key is the atom or string
+#   `value`,
+# - `[name=value]` keeps the lists holding a `(name value)` list, for
+#   example `module/fp_line[layer=F.CrtYd]`.
+# A step can have several conditions, all of which must hold.
+
+_STEP_RE = re.compile (r'(\*|[^/\[\]=]+)((?:\[[^\[\]]*\])*)$')
+_CONDITION_RE = re.compile (r'\[([^\[\]=]*)(?:=([^\[\]]*))?\]')
+
+# compiled queries, by path
+
+_QUERIES = {}
+
+
+
+class Index (object):
+
+   # Children lists of lists by key, indexed the first time a list is
+   # looked into. Lists being tuples, which can't hold their own index, the
+   # index of each list is kept here by identity, along with the list so
+   # that its identity isn't reused while indexed.
+
+   def __init__ (self):
+      self._nodes = {}
+
+
+   #-- children ----------------------------------------------------------------
+   # Returns the lists held by `node` keyed `key`, in order
+
+   def children (self, node, key):
+      entry = self._nodes.get (id (node))
+      if entry is None:
+         entry = self._nodes [id (node)] = (node, _index_children (node))
+      return entry [1].get (key, ())
+
+
+   #-- child -------------------------------------------------------------------
+   # Returns the first list held by `node` keyed `key`, or None
+
+   def child (self, node, key):
+      entry = self._nodes.get (id (node))
+      if entry is None:
+         entry = self._nodes [id (node)] = (node, _index_children (node))
+      children = entry [1].get (key)
+      return children [0] if children else None
+
+
+   #-- clear -------------------------------------------------------------------
+
+   def clear (self):
+      self._nodes.clear ()
+
+
+
+#-- _index_children -----------------------------------------------------------
+
+def _index_children (node):
+   children = {}
+   for child in node:
+      if type (child) is not tuple and type (child) is not FlatNode:
+         continue
+      key = child [0]
+      if type (key) is Symbol:
+         key = key.name
+      siblings = children.get (key)
+      if siblings is None:
+         children [key] = [child]
+      else:
+         siblings.append (child)
+   return children
+
+
+
+#-- _name ---------------------------------------------------------------------
+# Returns the name of an atom, or the string itself
+
+def _name (item):
+   if type (item) is Symbol:
+      return item.name
+   return item
+
+
+
+class Query (object):
+
+   # A path compiled to its steps, each being (key, conditions), key being
+   # None for `*` and conditions (name, value), name being None for the
+   # item after the key
+
+   def __init__ (self, path):
+      self.path = path
+      self._steps = []
+
+      for step in path.split ('/'):
+         match = _STEP_RE.match (step)
+         if match is None:
+            raise ValueError ('Invalid query path `%s\'' % path)
+         key = match.group (1)
+         if key == '*':
+            key = None
+         conditions = []
+         for condition in _CONDITION_RE.finditer (match.group (2)):
+            name, value = condition.groups ()
+            if value is None:
+               conditions.append ((None, name))
+            else:
+               conditions.append ((name, value))
+         self._steps.append ((key, conditions))
+
+
+   #-- select ------------------------------------------------------------------
+   # Returns the lists of `tree` matching the path, in tree order. `index`
+   # keeps the children indexes across queries on the same tree.
+
+   def select (self, tree, index = None):
+      if index is None:
+         index = Index ()
+
+      nodes = [tree]
+      for key, conditions in self._steps:
+         selected = []
+         for node in nodes:
+            if key is None:
+               children = [child for child in node if is_node (child)]
+            else:
+               children = index.children (node, key)
+            for child in children:
+               if all (_holds (child, name, value, index) for name, value in conditions):
+                  selected.append (child)
+         nodes = selected
+
+      return nodes
+
+
+   #-- first -------------------------------------------------------------------
+   # Returns the first list of `tree` matching the path, or None
+
+   def first (self, tree, index = None):
+      nodes = self.select (tree, index)
+      return nodes [0] if nodes else None
+
+
+
+#-- _holds --------------------------------------------------------------------
+
+def _holds (node, name, value, index):
+   if name is None:
+      return len (node) > 1 and _name (node [1]) == value
+   return any (
+      len (child) > 1 and _name (child [1]) == value
+      for child in index.children (node, name)
+   )
+
+
+
+#-- compile_query -------------------------------------------------------------
+# Returns the Query of `path`, compiled once
+
+def compile_query (path):
+   query = _QUERIES.get (path)
+   if query is None:
+      query = _QUERIES [path] = Query (path)
+   return query
+
+
+
+#-- select --------------------------------------------------------------------
+
+def select (tree, path, index = None):
+   return compile_query (path).select (tree, index)
+
+
+
+#-- first ---------------------------------------------------------------------
+
+def first (tree, path, index = None):
+   return compile_query (path).first (tree, index)
@@ -0,0 +1,237 @@
+##############################################################################
+#
+#     sexpr.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+from array import array
+
+
+
+# S-expression trees, as built by the parser engines:
+# - lists are tuples, their first item being their key,
+# - atoms are `Symbol`s, taken from a `Symbols` table, the trees of a parser
+#   sharing one symbol per atom name however many times the atom appears,
+# - double quoted strings are `str`,
+# - lists whose key is one of FLAT_KEYS and which have at least
+#   FLAT_MIN_ITEMS items, such as the point lists of zone polygons, are
+#   `FlatNode`s.
+
+FLAT_KEYS = ('pts',)
+FLAT_MIN_ITEMS = 64
+
+
+
+class Symbol (object):
+
+   # An S-expression atom. Symbols are told apart from strings by their
+   # type, and compare by name.
+
+   __slots__ = ('name',)
+
+   def __init__ (self, name):
+      self.name = name
+
+   def __eq__ (self, other):
+      return type (other) is Symbol and other.name == self.name
+
+   def __ne__ (self, other):
+      return not self == other
+
+   def __hash__ (self):
+      return hash (self.name)
+
+   def __repr__ (self):
+      return self.name
+
+
+
+class Symbols (dict):
+
+   # Symbols of a tree, by name: `symbols [name]` returns the symbol of
+   # `name`, made on first use
+
+   __slots__ = ()
+
+   def __missing__ (self, name):
+      symbol = self [name] = Symbol (name)
+      return symbol
+
+
+
+#-- to_text -------------------------------------------------------------------
+# Returns the text of the utf-8 encoded `data`, as the string type the text
+# engines give for the file: a byte string on python 2, which reads files
+# to byte strings, unicode otherwise
+
+if str is bytes:
+   def to_text (data):
+      return str (data)
+else:
+   def to_text (data):
+      return data.decode ('utf-8')
+
+
+
+class BytesSymbols (dict):
+
+   # Same, by utf-8 encoded name, sharing the symbols of `symbols`
+
+   __slots__ = ('symbols',)
+
+   def __init__ (self, symbols):
+      self.symbols = symbols
+
+   def __missing__ (self, name):
+      symbol = self [name] = self.symbols [to_text (name)]
+      return symbol
+
+
+
+#-- is_node -------------------------------------------------------------------
+# Tells whether `item` of a tree is a list, rather than an atom or a string
+
+def is_node (item):
+   return type (item) is tuple or type (item) is FlatNode
+
+
+
+# Type tags of a flat node
+
+_OPEN, _CLOSE, _ITEM = 0, 1, 2
+
+
+
+class FlatNode (object):
+
+   # A list stored flat rather than as nested tuples, for large subtrees
+   # read seldom if at all. The subtree is a type tag per opening paren,
+   # closing paren, and atom or string, in order, atoms and strings being
+   # kept in `items`. The offsets of the items of the list, in the tags and
+   # in `items`, are only computed once the list is read, lists being
+   # rebuilt as tuples when accessed.
+
+   __slots__ = ('_tags', '_items', '_offsets')
+
+   def __init__ (self, node):
+      tags = bytearray ()
+      items = []
+
+      def add (node):
+         tags.append (_OPEN)
+         for item in node:
+            if type (item) is tuple:
+               add (item)
+            else:
+               tags.append (_ITEM)
+               items.append (item)
+         tags.append (_CLOSE)
+
+      add (node)
+
+      # a bytearray rather than bytes, whose items are strings on python 2
+      self._tags = bytearray (tags)
+      self._items = tuple (items)
+      self._offsets = None
+
+
+   #-- decode ------------------------------------------------------------------
+   # Returns the list as nested tuples
+
+   def decode (self):
+      return tuple (self)
+
+
+   def __len__ (self):
+      return len (self._get_offsets () [0])
+
+   def __getitem__ (self, index):
+      tag_offsets, item_offsets = self._get_offsets ()
+      if isinstance (index, slice):
+         return tuple (map (self._decode, tag_offsets [index], item_offsets [index]))
+      return self._decode (tag_offsets [index], item_offsets [index])
+
+   def __iter__ (self):
+      tag_offsets, item_offsets = self._get_offsets ()
+      for index in range (len (tag_offsets)):
+         yield self._decode (tag_offsets [index], item_offsets [index])
+
+   def __eq__ (self, other):
+      if not is_node (other):
+         return False
+      return len (self) == len (other) and all (a == b for a, b in zip (self, other))
+
+   def __ne__ (self, other):
+      return not self == other
+
+   __hash__ = None
+
+   def __repr__ (self):
+      return repr (self.decode ())
+
+
+   #-- _get_offsets ------------------------------------------------------------
+   # Returns the offsets of the items of the list in the tags and in `items`
+
+   def _get_offsets (self):
+      if self._offsets is None:
+         tag_offsets = array ('l')
+         item_offsets = array ('l')
+         depth = 0
+         item = 0
+         for offset, tag in enumerate (self._tags):
+            if depth == 1 and tag != _CLOSE:
+               tag_offsets.append (offset)
+               item_offsets.append (item)
+            if tag == _OPEN:
+               depth += 1
+            elif tag == _CLOSE:
+               depth -= 1
+            else:
+               item += 1
+         self._offsets = (tag_offsets, item_offsets)
+      return self._offsets
+
+
+   #-- _decode -----------------------------------------------------------------
+   # Returns the atom, string or list starting at `offset` in the tags, its
+   # first atom or string being items [item]
+
+   def _decode (self, offset, item):
+      tags = self._tags
+      items = self._items
+      if tags [offset] == _ITEM:
+         return items [item]
+
+      stack = []
+      node = []
+      offset += 1
+      while True:
+         tag = tags [offset]
+         if tag == _ITEM:
+            node.append (items [item])
+            item += 1
+         elif tag == _OPEN:
+            stack.append (node)
+            node = []
+         elif not stack:
+            return tuple (node)
+         else:
+            sub_node = tuple (node)
+            node = stack.pop ()
+            node.append (sub_node)
+         offset += 1
+
+
+
+#-- flatten -------------------------------------------------------------------
+# Returns `node`, or its flat version if it is a large enough list keyed by
+# one of FLAT_KEYS
+
+def flatten (node):
+   if len (node) >= FLAT_MIN_ITEMS:
+      key = node [0]
+      if type (key) is Symbol and key.name in FLAT_KEYS:
+         return FlatNode (node)
+   return node
@@ -0,0 +1,157 @@
+##############################################################################
+#
+#     stages.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import logging
+import threading
+from . import profiling
+
+
+
+class Stage (object):
+
+   # `needs` and `produces` name resources. A stage can run once every
+   # resource it needs is available, that is either provided upfront or
+   # produced by a stage that already ran.
+
+   def __init__ (self, name, function, needs = (), produces = ()):
+      self.name = name
+      self.function = function
+      self.needs = tuple (needs)
+      self.produces = tuple (produces)
+
+   def __str__ (self):
+      return '%s: needs %s, produces %s' % (self.name, self.needs, self.produces)
+
+
+
+#-- select_stages ------------------------------------------------------------
+
+# Returns `names` stages along with the stages producing what they need,
+# in `stages` order.
+
+def select_stages (stages, names, provided = ()):
+   by_name = dict ((stage.name, stage) for stage in stages)
+   producers = {}
+   for stage in stages:
+      for resource in stage.produces:
+         producers.setdefault (resource, stage)
+
+   selected = set ()
+   todo = list (names)
+
+   while todo:
+      name = todo.pop ()
+      if name in selected:
+         continue
+      if name not in by_name:
+         raise ValueError ('Unknown stage `%s\'' % name)
+      selected.add (name)
+      for resource in by_name [name].needs:
+         if resource in provided:
+            continue
+         if resource not in producers:
+            raise ValueError ('Nothing produces `%s\' needed by `%s\'' % (resource, name))
+         todo.append (producers [resource].name)
+
+   return [stage for stage in stages if stage.name in selected]
+
+
+
+#-- run_stages ---------------------------------------------------------------
+
+# Runs `stages` as soon as what they need is available, on up to `jobs`
+# threads. Stages needing a resource listed in `locks` hold its lock while
+# they run, so that for example stages using the same pcbnew board are
+# serialized. With a single job, stages simply run one after the other in
+# order.
+
+def run_stages (stages, jobs = 1, provided = (), locks = None):
+   if locks is None:
+      locks = {}
+
+   if jobs <= 1:
+      for stage in stages:
+         _run_stage (stage, locks)
+      return
+
+   scheduler = _Scheduler (stages, jobs, provided, locks)
+   scheduler.run ()
+
+
+
+def _run_stage (stage, locks):
+   held = [locks [resource] for resource in sorted (stage.needs) if resource in locks]
+   for lock in held:
+      lock.acquire ()
+   try:
+      logging.debug ('   Running stage %s', stage.name)
+      with profiling.span ('stage %s' % stage.name, 'stage'):
+         stage.function ()
+   finally:
+      for lock in reversed (held):
+         lock.release ()
+
+
+
+class _Scheduler (object):
+
+   def __init__ (self, stages, jobs, provided, locks):
+      self._remaining = list (stages)
+      self._jobs = jobs
+      self._available = set (provided)
+      self._locks = locks
+      self._running = 0
+      self._failure = None
+      self._condition = threading.Condition ()
+
+
+   def run (self):
+      with self._condition:
+         while self._remaining or self._running:
+            if self._failure is None:
+               self._start_ready ()
+               if self._running == 0 and self._remaining:
+                  raise ValueError (
+                     'Stages %s can never run' % ', '.join (stage.name for stage in self._remaining)
+                  )
+            elif self._running == 0:
+               break
+            self._condition.wait ()
+
+      if self._failure is not None:
+         raise self._failure
+
+
+   def _start_ready (self):
+      for stage in list (self._remaining):
+         if self._running >= self._jobs:
+            break
+         if not set (stage.needs) <= self._available:
+            continue
+         self._remaining.remove (stage)
+         self._running += 1
+         thread = threading.Thread (target = self._work, args = (stage,))
+         thread.daemon = True
+         thread.start ()
+
+
+   def _work (self, stage):
+      failure = None
+      try:
+         _run_stage (stage, self._locks)
+      except BaseException as e:
+         # includes SystemExit raised on fatal errors
+         failure = e
+
+      with self._condition:
+         self._running -= 1
+         if failure is not None:
+            if self._failure is None:
+               self._failure = failure
+         else:
+            self._available.update (stage.produces)
+         self._condition.notify ()
@@ -0,0 +1,11 @@
+##############################################################################
+#
+#     version.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+# Version of kcgen. The build manifest records it along what each output was
+# built from, so that outputs written by another version are built again.
+
+__version__ = '0.1.0'
@@ -0,0 +1,248 @@
+##############################################################################
+#
+#     watch.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import contextlib
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+
+try:
+   import queue
+   import socketserver
+except ImportError:
+   # python 2
+   import Queue as queue
+   import SocketServer as socketserver
+
+
+
+# Input files are polled every POLL_INTERVAL seconds. Editors often write a
+# file several times in a row, or replace it: a change is only acted upon
+# once the changed files have been left alone for DEBOUNCE seconds.
+
+POLL_INTERVAL = 0.25
+DEBOUNCE = 0.5
+
+# Requests accepted on the trigger port, one per line: 'build' regenerates
+# the outputs that are not up to date, 'force' regenerates all of them.
+
+TRIGGER_REQUESTS = ('build', 'force')
+
+
+
+class Watcher (object):
+
+   # Tells which of `paths` changed since the last poll, once they are
+   # done changing.
+
+   def __init__ (self, paths, debounce = DEBOUNCE):
+      self._stats = dict ((path, _stat (path)) for path in paths)
+      self._debounce = debounce
+      self._changed = {}
+
+
+   #-- poll --------------------------------------------------------------------
+   # Returns the paths that changed and have been left alone for the
+   # debounce time, or all the ones seen changing if `flush` is set
+
+   def poll (self, flush = False):
+      now = time.time ()
+      for path, stat in self._stats.items ():
+         current = _stat (path)
+         if current != stat:
+            self._stats [path] = current
+            self._changed [path] = now
+
+      if not self._changed:
+         return []
+
+      if not flush:
+         if now - max (self._changed.values ()) < self._debounce:
+            return []
+         # a file being replaced is missing for a while
+         if any (self._stats [path] is None for path in self._changed):
+            return []
+
+      changed = sorted (self._changed)
+      self._changed = {}
+      return changed
+
+
+
+class TriggerServer (object):
+
+   # Accepts build requests on a localhost TCP `port`, and queues them as
+   # TriggerRequest to `requests`. Each client gets the result of its
+   # build as a single line, 'ok' or 'failed: <reason>'.
+
+   def __init__ (self, port, requests):
+      self._server = _TriggerTCPServer (('127.0.0.1', port), _TriggerHandler)
+      self._server.requests = requests
+      self.port = self._server.server_address [1]
+      self._thread = threading.Thread (target = self._server.serve_forever)
+      self._thread.daemon = True
+      self._thread.start ()
+
+
+   #-- close -------------------------------------------------------------------
+
+   def close (self):
+      self._server.shutdown ()
+      self._server.server_close ()
+
+
+
+class TriggerRequest (object):
+   def __init__ (self, force):
+      self.force = force
+      self.result = None
+      self._done = threading.Event ()
+
+   def reply (self, result):
+      self.result = result
+      self._done.set ()
+
+   def wait (self):
+      self._done.wait ()
+      return self.result
+
+
+
+class _TriggerTCPServer (socketserver.ThreadingTCPServer):
+   allow_reuse_address = True
+   daemon_threads = True
+
+
+
+class _TriggerHandler (socketserver.StreamRequestHandler):
+   def handle (self):
+      line = self.rfile.readline ().decode ('utf-8', 'replace').strip () or 'build'
+      if line not in TRIGGER_REQUESTS:
+         result = 'failed: unknown request `%s\'' % line
+      else:
+         request = TriggerRequest (line == 'force')
+         self.server.requests.put (request)
+         result = request.wait ()
+      self.wfile.write (('%s\n' % result).encode ('utf-8'))
+
+
+
+#-- watch ---------------------------------------------------------------------
+
+# Builds the outputs of `args`, then builds them again each time the input
+# files change or a build is requested on `port`, until interrupted. The
+# parsed design and the board are kept from one build to the next, and
+# only dropped when the files they come from change, the design being
+# patched rather than parsed again when only the pcb file changed. Stages
+# whose inputs didn't change are skipped by the build manifest.
+
+def watch (args, port = None):
+   from . import run, Session
+
+   session = Session (args, incremental = True)
+   force = getattr (args, 'force', False)
+
+   _build (run, args, session, force)
+
+   watcher = Watcher ([args.input_net, args.input_pcb])
+   requests = queue.Queue ()
+   server = None
+   if port is not None:
+      server = TriggerServer (port, requests)
+      logging.info ('Listening for build requests on localhost:%d', server.port)
+
+   logging.info ('Watching %s and %s, press Ctrl-C to stop', args.input_net, args.input_pcb)
+
+   try:
+      while True:
+         try:
+            request = requests.get (timeout = POLL_INTERVAL)
+         except queue.Empty:
+            request = None
+
+         changed = watcher.poll (flush = request is not None)
+         for path in changed:
+            logging.info ('%s changed', path)
+         session.reload (changed)
+
+         if request is not None:
+            request.reply (_build (run, args, session, request.force))
+         elif changed:
+            _build (run, args, session, False)
+
+   except KeyboardInterrupt:
+      pass
+
+   finally:
+      if server is not None:
+         server.close ()
+
+
+
+#-- send_trigger --------------------------------------------------------------
+
+# Asks the watcher listening on `port` to build, returns True if the build
+# succeeded
+
+def send_trigger (port, force = False):
+   try:
+      connection = socket.create_connection (('127.0.0.1', port))
+   except (IOError, OSError) as e:
+      logging.error ("\033[91mfatal error:\033[0m No watcher on port %d: %s", port, e)
+      return False
+
+   with contextlib.closing (connection):
+      connection.sendall (b'force\n' if force else b'build\n')
+      result = connection.makefile ('rb').readline ().decode ('utf-8').strip ()
+
+   if result != 'ok':
+      logging.error ('Build %s', result or 'failed: no reply')
+      return False
+
+   logging.info ('Build ok')
+   return True
+
+
+
+#-- _build --------------------------------------------------------------------
+
+# Runs one build, and keeps watching whatever happens: an input file saved
+# half way fails to parse, and is parsed again once written. Returns the
+# result sent to trigger clients.
+
+def _build (run, args, session, force):
+   args.force = force
+   start = time.time ()
+
+   try:
+      run (args, session)
+
+   except SystemExit:
+      # fatal errors are logged where they are raised
+      return 'failed: fatal error'
+
+   except Exception as e:
+      logging.error ('%s: %s', type (e).__name__, e)
+      logging.debug (traceback.format_exc ())
+      return 'failed: %s: %s' % (type (e).__name__, e)
+
+   logging.info ('Build done in %.2fs', time.time () - start)
+   return 'ok'
+
+
+
+#-- _stat ---------------------------------------------------------------------
+
+def _stat (path):
+   try:
+      stat = os.stat (path)
+   except OSError:
+      return None
+   return (stat.st_mtime, stat.st_size)
@@ -0,0 +1,82 @@
+##############################################################################
+#
+#     __init__.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+# Tests, from the repository root:
+#
+#     python -m unittest discover tests
+#
+# The fixture board in data/board is a small KiCad 5.1 project: components
+# on both sides, fiducials, plated, oval and non plated holes, vias taking
+# the drill of their net class, a filled zone and multi-line strings. Its
+# drill file, board.drl, is written by hand in the format of the ones pcbnew
+# 5.1 writes, for the native drill writer to be checked against.
+
+import io
+import os
+
+
+
+PATH_DATA = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'data')
+
+BOARD_NET = os.path.join (PATH_DATA, 'board', 'board.net')
+BOARD_PCB = os.path.join (PATH_DATA, 'board', 'board.kicad_pcb')
+
+
+
+#-- read_text -----------------------------------------------------------------
+
+def read_text (path):
+   with io.open (path, 'r', encoding = 'utf-8', newline = '') as file:
+      return file.read ()
+
+
+
+#-- native --------------------------------------------------------------------
+# Returns `text` as the string type files are read to: a utf-8 byte string on
+# python 2, `text` itself otherwise
+
+def native (text):
+   return text.encode ('utf-8') if str is bytes else text
+
+
+
+#-- describe_design -----------------------------------------------------------
+# Returns what a design holds as plain values, to compare designs
+
+def describe_design (design):
+   return {
+      'name': design.name,
+      'date': design.date,
+      'outline': str (design.outline),
+      'components': sorted (str (component) for component in design.components.values ()),
+      'fiducials': [str (fiducial) for fiducial in design.fiducials],
+      'drawings': [str (drawing) for drawing in design.drawings],
+      'holes': [str (hole) for hole in design.holes],
+      'references': list (design.references),
+      'descriptions': sorted (design.descriptions),
+   }
+
+
+
+
+#-- make_args -----------------------------------------------------------------
+# Returns command line arguments building the fixture board to `output_dir`
+
+def make_args (output_dir, **options):
+   args = Args ()
+   args.input_net = BOARD_NET
+   args.input_pcb = BOARD_PCB
+   args.manufacturer = 'pcbpool'
+   args.output_dir = output_dir
+   for name, value in options.items ():
+      setattr (args, name, value)
+   return args
+
+
+
+class Args (object):
+   pass
@@ -0,0 +1,122 @@
+##############################################################################
+#
+#     test_archive.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+import kcgen
+from kcgen.archive import Archive, CHECKSUMS_NAME
+from . import make_args, native
+
+
+
+#-- read_archive --------------------------------------------------------------
+# Returns the entries of the zip archive at `path` by name, and the checksums
+# its SHA256SUMS entry lists by name
+
+def read_archive (path):
+   with zipfile.ZipFile (path) as archive:
+      entries = dict ((name, archive.read (name)) for name in archive.namelist ())
+   checksums = {}
+   for line in entries.pop (CHECKSUMS_NAME).decode ('ascii').splitlines ():
+      checksum, name = line.split ('  ', 1)
+      checksums [name] = checksum
+   return entries, checksums
+
+
+
+class TestArchive (unittest.TestCase):
+
+   def setUp (self):
+      self.output_dir = tempfile.mkdtemp ()
+      self.path = os.path.join (self.output_dir, 'board.zip')
+
+   def tearDown (self):
+      shutil.rmtree (self.output_dir)
+
+   def check_checksums (self, entries, checksums):
+      self.assertEqual (sorted (checksums), sorted (entries))
+      for name, data in entries.items ():
+         self.assertEqual (checksums [name], hashlib.sha256 (data).hexdigest (), name)
+
+   def test_entries (self):
+      plot_dir = os.path.join (self.output_dir, 'plot')
+      os.makedirs (plot_dir)
+      for filename in ('board-F_Cu.gbr', 'board-B_Cu.gbr'):
+         with open (os.path.join (plot_dir, filename), 'wb') as file:
+            file.write (b'G04 ' + filename.encode ('ascii') + b'*\r\nM02*\r\n')
+
+      archive = Archive (self.path)
+      with archive.open ('board.bom.csv') as file:
+         file.write (native (u'Value,Designator\r\nTMP102 (I\xb2C),U1\r\n'))
+      with archive.open ('board.assembly.pdf', binary = True) as file:
+         file.write (b'%PDF-1.4\n\xe2\xe3\xcf\xd3\n')
+      archive.add_files (plot_dir, 'gerber/')
+      archive.close ()
+
+      entries, checksums = read_archive (self.path)
+      self.assertEqual (sorted (entries), [
+         'board.assembly.pdf', 'board.bom.csv', 'gerber/board-B_Cu.gbr', 'gerber/board-F_Cu.gbr'
+      ])
+      # text is utf-8 encoded, and newlines kept as written
+      self.assertEqual (entries ['board.bom.csv'], u'Value,Designator\r\nTMP102 (I\xb2C),U1\r\n'.encode ('utf-8'))
+      self.assertEqual (entries ['board.assembly.pdf'], b'%PDF-1.4\n\xe2\xe3\xcf\xd3\n')
+      self.assertEqual (entries ['gerber/board-F_Cu.gbr'], b'G04 board-F_Cu.gbr*\r\nM02*\r\n')
+      self.check_checksums (entries, checksums)
+
+      # plotted files are moved, and nothing is left aside the archive
+      self.assertEqual (os.listdir (plot_dir), [])
+      self.assertEqual (sorted (os.listdir (self.output_dir)), ['board.zip', 'plot'])
+
+   def test_replace (self):
+      with open (self.path, 'wb') as file:
+         file.write (b'previous')
+
+      archive = Archive (self.path)
+      with archive.open ('a.txt') as file:
+         file.write ('a\n')
+      archive.close ()
+
+      entries, checksums = read_archive (self.path)
+      self.assertEqual (entries, {'a.txt': b'a\n'})
+      self.check_checksums (entries, checksums)
+
+   def test_abort (self):
+      with open (self.path, 'wb') as file:
+         file.write (b'previous')
+
+      archive = Archive (self.path)
+      with archive.open ('a.txt') as file:
+         file.write ('a\n')
+      archive.abort ()
+
+      with open (self.path, 'rb') as file:
+         self.assertEqual (file.read (), b'previous')
+      self.assertEqual (os.listdir (self.output_dir), ['board.zip'])
+
+   def test_run (self):
+      # stages writing their files without pcbnew, archived
+      args = make_args (
+         self.output_dir, stages = 'drill,bom,pickplace,assembly', archive = True,
+         drill_backend = 'native', assembly_backend = 'pdf'
+      )
+      kcgen.run (args)
+
+      entries, checksums = read_archive (self.path)
+      self.assertEqual (sorted (entries), [
+         'board.assembly.pdf', 'board.bom.csv', 'board.pickplace.txt', 'gerber/board.drl'
+      ])
+      self.check_checksums (entries, checksums)
+      self.assertEqual (os.listdir (self.output_dir), ['board.zip'])
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
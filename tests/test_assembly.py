@@ -0,0 +1,156 @@
+##############################################################################
+#
+#     test_assembly.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import io
+import logging
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+import kcgen
+from kcgen import read_design
+from kcgen.assembly import write_assembly_pdf, PAGE_MARGIN
+from kcgen.pdf import PdfDocument, PT_PER_MM
+from . import BOARD_NET, BOARD_PCB, make_args
+
+
+
+class TestPdf (unittest.TestCase):
+
+   #-- read_pdf ----------------------------------------------------------------
+   # Checks the structure of the PDF `data`: its header, that each entry of
+   # the cross-reference table points to its object, and the trailer. Returns
+   # the objects by number, and the decompressed content of each page.
+
+   def read_pdf (self, data):
+      self.assertTrue (data.startswith (b'%PDF-1.4\n'))
+      self.assertTrue (data.endswith (b'%%EOF\n'))
+
+      startxref = int (data [data.rindex (b'startxref'):].split () [1])
+      self.assertTrue (data [startxref:].startswith (b'xref\n'))
+      lines = data [startxref:].split (b'\n')
+      first, size = [int (field) for field in lines [1].split ()]
+      self.assertEqual (first, 0)
+      self.assertEqual (lines [2], b'0000000000 65535 f ')
+
+      objects = {}
+      for number in range (1, size):
+         entry = lines [2 + number]
+         self.assertTrue (re.match (b'^[0-9]{10} 00000 n $', entry), entry)
+         offset = int (entry [:10])
+         header = b'%d 0 obj\n' % number
+         self.assertEqual (data [offset:offset + len (header)], header, number)
+         objects [number] = data [offset + len (header):data.index (b'\nendobj\n', offset)]
+
+      trailer = b'\n'.join (lines [2 + size:])
+      self.assertTrue (trailer.startswith (b'trailer\n<< /Size %d /Root 1 0 R >>' % size))
+      self.assertEqual (objects [1], b'<< /Type /Catalog /Pages 2 0 R >>')
+
+      kids = re.match (br'<< /Type /Pages /Kids \[([0-9 R]*)\] /Count ([0-9]+) >>$', objects [2])
+      self.assertIsNotNone (kids)
+      page_numbers = [int (kid) for kid in re.findall (br'([0-9]+) 0 R', kids.group (1))]
+      self.assertEqual (len (page_numbers), int (kids.group (2)))
+
+      pages = []
+      for number in page_numbers:
+         page = re.search (br'/MediaBox \[0 0 ([0-9.]+) ([0-9.]+)\].* /Contents ([0-9]+) 0 R', objects [number])
+         self.assertTrue (objects [number].startswith (b'<< /Type /Page /Parent 2 0 R'))
+         stream = objects [int (page.group (3))]
+         length = int (re.match (br'<< /Length ([0-9]+) /Filter /FlateDecode >>\nstream\n', stream).group (1))
+         content = stream [stream.index (b'stream\n') + 7:]
+         self.assertEqual (content [length:], b'\nendstream')
+         pages.append ((
+            float (page.group (1)), float (page.group (2)),
+            zlib.decompress (content [:length]).decode ('latin-1')
+         ))
+
+      return objects, pages
+
+   def test_document (self):
+      document = PdfDocument ()
+      page = document.add_page (100.0, 50.0)
+      page.lines ([((0.0, 0.0), (25.4, 0.0))])
+      page.circle (10.0, 10.0, 1.0)
+      page.text (50.0, 25.0, 2.0, u'a (b) \\ \xb5\u03a9')
+      document.add_page (20.0, 10.0)
+
+      output = io.BytesIO ()
+      document.write (output)
+      objects, pages = self.read_pdf (output.getvalue ())
+
+      self.assertEqual (len (objects), 7)
+      self.assertEqual (len (pages), 2)
+      width, height, content = pages [0]
+      self.assertAlmostEqual (width, 100.0 * PT_PER_MM, 2)
+      self.assertAlmostEqual (height, 50.0 * PT_PER_MM, 2)
+      # Y goes up in PDF
+      self.assertIn (u'0.000 141.732 m 72.000 141.732 l\nS\n', content)
+      # parens and backslashes escaped, outside latin-1 replaced
+      self.assertIn (u'(a \\(b\\) \\\\ \xb5?) Tj', content)
+      self.assertEqual (pages [1][2], u'')
+
+   def test_board (self):
+      design = read_design (BOARD_NET, BOARD_PCB)
+      output = io.BytesIO ()
+      write_assembly_pdf (output, design)
+      objects, pages = self.read_pdf (output.getvalue ())
+
+      # the top side, and the bottom one, R3 and a fiducial being there
+      self.assertEqual (len (pages), 2)
+      for width, height, content in pages:
+         self.assertAlmostEqual (width, (50.0 + 2 * PAGE_MARGIN) * PT_PER_MM, 2)
+         self.assertAlmostEqual (height, (40.0 + 2 * PAGE_MARGIN) * PT_PER_MM, 2)
+      references = [re.findall (r'\((\w+)\) Tj', content) for width, height, content in pages]
+      self.assertEqual (sorted (references [0]), ['C1', 'C2', 'H1', 'H2', 'J1', 'J2', 'R1', 'R2', 'U1'])
+      self.assertEqual (references [1], ['R3'])
+
+   def test_board_top_only (self):
+      design = read_design (BOARD_NET, BOARD_PCB)
+      design.components ['R3'].side = 'top'
+      design.fiducials = [fiducial for fiducial in design.fiducials if fiducial.side == 'top']
+      design.drawings = [drawing for drawing in design.drawings if drawing.layer != 'B.Fab']
+
+      output = io.BytesIO ()
+      write_assembly_pdf (output, design)
+      objects, pages = self.read_pdf (output.getvalue ())
+      self.assertEqual (len (pages), 1)
+      self.assertIn (u'(R3) Tj', pages [0][2])
+
+
+
+class TestAssemblyBackend (unittest.TestCase):
+
+   def setUp (self):
+      self.output_dir = tempfile.mkdtemp ()
+
+   def tearDown (self):
+      shutil.rmtree (self.output_dir)
+
+   def test_default (self):
+      with mock.patch.object (kcgen, 'RSVG_CONVERT', __file__):
+         self.assertEqual (kcgen.get_assembly_backend (make_args (self.output_dir)), 'svg')
+
+   def test_pdf (self):
+      kcgen.generate_assembly_plan (make_args (self.output_dir, assembly_backend = 'pdf'))
+      with open (os.path.join (self.output_dir, 'board.assembly.pdf'), 'rb') as file:
+         self.assertTrue (file.read ().startswith (b'%PDF-1.4\n'))
+
+   def test_svg_fallback (self):
+      # without rsvg-convert, the pdf backend is used
+      args = make_args (self.output_dir)
+      with mock.patch.object (kcgen, 'RSVG_CONVERT', os.path.join (self.output_dir, 'none')):
+         with self.assertLogs (level = logging.WARNING):
+            kcgen.generate_assembly_plan (args)
+      self.assertTrue (os.path.exists (os.path.join (self.output_dir, 'board.assembly.pdf')))
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
@@ -0,0 +1,149 @@
+##############################################################################
+#
+#     test_backend.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import kcgen
+from kcgen.backend import set_backend, RecordingBackend
+from . import BOARD_PCB, make_args
+
+
+
+# pcbnew layers the gerber files are plotted from, in plotting order
+
+GERBER_PCBNEW_LAYERS = [
+   '<F_Cu>', '<B_Cu>', '<F_Paste>', '<B_Paste>', '<F_SilkS>', '<B_SilkS>',
+   '<F_Mask>', '<B_Mask>', '<Edge_Cuts>',
+]
+
+GERBER_FILE_NAMES = [
+   'F.Cu', 'B.Cu', 'F.Paste', 'B.Paste', 'F.SilkS', 'B.SilkS', 'F.Mask', 'B.Mask',
+   'Edge.Cuts',
+]
+
+
+
+class Module (object):
+
+   # pcbnew module, as far as assembly markers go
+
+   def __init__ (self, x, y):
+      self.position = mock.Mock (x = x, y = y)
+
+   def GetPosition (self):
+      return self.position
+
+
+
+class TestBackend (unittest.TestCase):
+
+   # the plotting calls made to pcbnew, recorded
+
+   def setUp (self):
+      self.output_dir = tempfile.mkdtemp ()
+      self.file_svg = os.path.join (self.output_dir, 'F_Fab.svg')
+      with open (self.file_svg, 'w') as file:
+         file.write ('<svg>\n</svg>\n')
+      self.backend = RecordingBackend ({
+         'GetPlotFileName': self.file_svg,
+         'GetModules': [Module (127000000, 254000000)],
+      })
+      set_backend (self.backend)
+
+   def tearDown (self):
+      set_backend (None)
+      shutil.rmtree (self.output_dir)
+
+   # Returns the arguments of the calls to `name`, pcbnew values as their name
+
+   def calls (self, name):
+      return [
+         tuple (arg if isinstance (arg, (bool, int, float, str)) else repr (arg) for arg in args)
+         for call_name, args in self.backend.calls if call_name == name
+      ]
+
+   def test_gerber (self):
+      args = make_args (self.output_dir)
+      kcgen.generate_pcb_gerber (args)
+
+      gerber_dir = os.path.join (self.output_dir, 'gerber')
+      self.assertEqual (self.calls ('LoadBoard'), [(BOARD_PCB,)])
+      self.assertEqual (self.calls ('SetOutputDirectory'), [(gerber_dir,)])
+      self.assertEqual (self.calls ('SetLayer'), [(layer,) for layer in GERBER_PCBNEW_LAYERS])
+      self.assertEqual (
+         [call [:2] for call in self.calls ('OpenPlotfile')],
+         [(name, '<PLOT_FORMAT_GERBER>') for name in GERBER_FILE_NAMES]
+      )
+      self.assertEqual (self.backend.count ('PlotLayer'), len (GERBER_FILE_NAMES))
+      self.assertEqual (self.backend.count ('ClosePlot'), 1)
+
+      self.assertEqual (self.calls ('SetUseGerberAttributes'), [(True,)])
+      self.assertEqual (self.calls ('SetUseGerberProtelExtensions'), [(True,)])
+      self.assertEqual (self.calls ('SetExcludeEdgeLayer'), [(True,)])
+      self.assertEqual (self.calls ('SetSubtractMaskFromSilk'), [(True,)])
+      self.assertEqual (self.calls ('SetPlotReference'), [(True,)])
+      self.assertEqual (self.calls ('SetPlotValue'), [(False,)])
+      self.assertEqual (self.calls ('SetMirror'), [(False,)])
+
+   def test_gerber_job (self):
+      # parallel plotting jobs find their layer by file name
+      kcgen._run_plot_job ((BOARD_PCB, self.output_dir, 'B.SilkS'))
+      self.assertEqual (self.calls ('SetLayer'), [('<B_SilkS>',)])
+      self.assertEqual (
+         [call [:2] for call in self.calls ('OpenPlotfile')],
+         [('B.SilkS', '<PLOT_FORMAT_GERBER>')]
+      )
+
+   def test_drill (self):
+      args = make_args (self.output_dir)
+      kcgen.generate_pcb_drill (args)
+
+      gerber_dir = os.path.join (self.output_dir, 'gerber')
+      self.assertEqual (self.calls ('EXCELLON_WRITER'), [('<LoadBoard>',)])
+      self.assertEqual (self.calls ('SetMapFileFormat'), [('<PLOT_FORMAT_GERBER>',)])
+      # not mirrored, full header, from the board origin, plated and non
+      # plated holes merged, metric
+      self.assertEqual (self.calls ('SetOptions'), [(False, False, '<wxPoint>', True)])
+      self.assertEqual (self.calls ('wxPoint'), [(0, 0)])
+      self.assertEqual (self.calls ('SetFormat'), [(True,)])
+      self.assertEqual (self.calls ('CreateDrillandMapFilesSet'), [(gerber_dir, True, False)])
+
+   def test_assembly_svg (self):
+      args = make_args (self.output_dir, assembly_backend = 'svg')
+      with mock.patch.object (kcgen, 'RSVG_CONVERT', __file__), \
+         mock.patch ('subprocess.check_call') as check_call:
+         kcgen.generate_assembly_plan (args)
+
+      self.assertEqual (self.calls ('SetOutputDirectory'), [(self.output_dir,)])
+      self.assertEqual (self.calls ('SetLayer'), [('<F_Fab>',)])
+      self.assertEqual (self.calls ('OpenPlotfile'), [('F_Fab', '<PLOT_FORMAT_SVG>', 'Fab top')])
+      self.assertEqual (self.calls ('SetExcludeEdgeLayer'), [(False,)])
+      self.assertEqual (self.calls ('SetSubtractMaskFromSilk'), [(False,)])
+      self.assertEqual (self.backend.count ('PlotLayer'), 1)
+
+      # converted to the assembly plan, named after the board
+      command = check_call.call_args [0][0]
+      self.assertEqual (command [:3], [__file__, self.file_svg, '--format=pdf'])
+      self.assertEqual (command [3:], ['--output', os.path.join (self.output_dir, 'board.assembly.pdf')])
+      self.assertFalse (os.path.exists (self.file_svg))
+
+   def test_assembly_markers (self):
+      kcgen.add_assembly_markers (self.file_svg, [Module (127000000, 254000000)])
+      with open (self.file_svg) as file:
+         data = file.read ()
+      # a cross at 50000, 100000 svg units, around the module position
+      self.assertIn ('<path d="M49900 100000 L50100 100000" />', data)
+      self.assertIn ('<path d="M50000 99900 L50000 100100" />', data)
+      self.assertTrue (data.endswith ('</g>\n</svg>\n'))
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
@@ -0,0 +1,120 @@
+##############################################################################
+#
+#     test_batch.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from kcgen.batch import read_projects, run_batch
+from . import BOARD_NET, BOARD_PCB
+
+
+
+class TestBatch (unittest.TestCase):
+
+   # projects of a manifest writing their BOM and pick & place files, some
+   # of which fail
+
+   def setUp (self):
+      self.work_dir = tempfile.mkdtemp ()
+      self.output_dir = os.path.join (self.work_dir, 'output')
+      for name in ('a', 'b', 'broken'):
+         os.makedirs (os.path.join (self.work_dir, name))
+         shutil.copy (BOARD_NET, os.path.join (self.work_dir, name, 'board.net'))
+         shutil.copy (BOARD_PCB, os.path.join (self.work_dir, name, 'board.kicad_pcb'))
+      with open (os.path.join (self.work_dir, 'broken', 'board.kicad_pcb'), 'w') as file:
+         file.write ('(kicad_pcb (module R (at a b)))')
+      self.args = argparse.Namespace (
+         manufacturer = 'pcbpool', stages = 'bom,pickplace', logging_level = logging.INFO
+      )
+
+   def tearDown (self):
+      shutil.rmtree (self.work_dir)
+
+   def write_manifest (self, manifest):
+      path = os.path.join (self.work_dir, 'manifest.json')
+      with open (path, 'w') as file:
+         json.dump (manifest, file)
+      return path
+
+   def project (self, directory, **entry):
+      entry.setdefault ('input_net', '%s/board.net' % directory)
+      entry.setdefault ('input_pcb', '%s/board.kicad_pcb' % directory)
+      return entry
+
+   def outputs (self, name):
+      path = os.path.join (self.output_dir, name)
+      return sorted (os.listdir (path)) if os.path.isdir (path) else []
+
+   def test_read_manifest (self):
+      path = self.write_manifest ({'projects': [
+         self.project ('a', quantity = 5, parser_engine = 'char', unknown = 1),
+         self.project ('b', name = 'second', output_dir = 'elsewhere'),
+      ]})
+      projects = read_projects (path, self.output_dir)
+
+      # named after their directory, paths relative to the manifest
+      self.assertEqual ([project.name for project in projects], ['a', 'second'])
+      self.assertEqual (projects [0].input_pcb, os.path.join (self.work_dir, 'a', 'board.kicad_pcb'))
+      self.assertEqual (projects [0].output_dir, os.path.join (self.output_dir, 'a'))
+      self.assertEqual (projects [1].output_dir, os.path.join (self.work_dir, 'elsewhere'))
+      self.assertEqual ([project.quantity for project in projects], [5, 1])
+      self.assertEqual (projects [0].options, {'parser_engine': 'char'})
+
+   def test_read_directory (self):
+      os.makedirs (os.path.join (self.work_dir, 'empty'))
+      projects = read_projects (self.work_dir, self.output_dir)
+      self.assertEqual ([project.name for project in projects], ['a', 'b', 'broken'])
+      self.assertEqual (projects [1].input_net, os.path.join (self.work_dir, 'b', 'board.net'))
+
+   def test_invalid_quantity (self):
+      path = self.write_manifest ([self.project ('a', quantity = -1)])
+      with self.assertLogs (level = logging.ERROR), self.assertRaises (SystemExit):
+         read_projects (path, self.output_dir)
+
+   def check_failures (self, jobs):
+      path = self.write_manifest ([
+         self.project ('b'),
+         self.project ('broken'),
+         self.project ('a'),
+         self.project ('a', name = 'unknown', manufacturer = 'unknown'),
+         self.project ('missing'),
+      ])
+      projects = read_projects (path, self.output_dir)
+      with self.assertLogs (level = logging.INFO) as logs:
+         results = run_batch (self.args, projects, jobs)
+
+      # in projects order, whatever the order they ran in
+      self.assertEqual (
+         [(result.name, result.ok) for result in results],
+         [('b', True), ('broken', False), ('a', True), ('unknown', False), ('missing', False)]
+      )
+      self.assertTrue (results [1].error.startswith ('ValueError: '))
+      self.assertEqual (results [3].error, 'fatal error')
+      self.assertNotEqual (results [4].error, '')
+
+      # the projects which failed didn't stop the others
+      for name in ('a', 'b'):
+         self.assertEqual (
+            self.outputs (name), ['.kcgen-manifest.json', '%s.bom.csv' % name, '%s.pickplace.txt' % name]
+         )
+      self.assertEqual (self.outputs ('unknown'), [])
+      self.assertIn ('INFO:root:5 projects, 2 succeeded, 3 failed', logs.output [-1])
+
+   def test_failures (self):
+      self.check_failures (1)
+
+   def test_failures_parallel (self):
+      self.check_failures (3)
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
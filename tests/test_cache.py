@@ -0,0 +1,122 @@
+##############################################################################
+#
+#     test_cache.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from kcgen import read_design
+from kcgen.cache import DesignCache, EXTENSION
+from . import BOARD_NET, BOARD_PCB, describe_design
+
+
+
+class TestCache (unittest.TestCase):
+
+   # designs read through a cache, from a copy of the fixture board
+
+   def setUp (self):
+      self.work_dir = tempfile.mkdtemp ()
+      self.cache_dir = os.path.join (self.work_dir, 'cache')
+      project_dir = os.path.join (self.work_dir, 'board')
+      os.makedirs (project_dir)
+      self.input_net = os.path.join (project_dir, 'board.net')
+      self.input_pcb = os.path.join (project_dir, 'board.kicad_pcb')
+      shutil.copy (BOARD_NET, self.input_net)
+      shutil.copy (BOARD_PCB, self.input_pcb)
+      self.cache = DesignCache (self.cache_dir)
+      self.expected = describe_design (read_design (BOARD_NET, BOARD_PCB))
+
+   def tearDown (self):
+      shutil.rmtree (self.work_dir)
+
+   def read (self, **options):
+      with self.assertLogs (level = logging.DEBUG) as logs:
+         design = read_design (self.input_net, self.input_pcb, cache = self.cache, **options)
+      return design, logs.output
+
+   def entries (self):
+      return sorted (os.listdir (self.cache_dir))
+
+   def test_hit (self):
+      design, logs = self.read ()
+      self.assertEqual ((self.cache.hits, self.cache.misses), (0, 1))
+      self.assertEqual (describe_design (design), self.expected)
+      self.assertEqual (len (self.entries ()), 1)
+      self.assertTrue (self.entries () [0].endswith (EXTENSION))
+
+      design, logs = self.read ()
+      self.assertEqual ((self.cache.hits, self.cache.misses), (1, 1))
+      self.assertIn ('INFO:root:   Using cached design for %s' % self.input_pcb, logs)
+      self.assertEqual (describe_design (design), self.expected)
+
+      # columnar designs are built from the same entry
+      design, logs = self.read (columnar = True)
+      self.assertEqual ((self.cache.hits, self.cache.misses), (2, 1))
+      self.assertEqual (
+         describe_design (design), describe_design (read_design (BOARD_NET, BOARD_PCB, columnar = True))
+      )
+
+   def test_input_changed (self):
+      for path in (self.input_pcb, self.input_net):
+         self.read ()
+         with open (path, 'a') as file:
+            file.write ('\n')
+         design, logs = self.read ()
+         self.assertNotIn ('INFO:root:   Using cached design for %s' % self.input_pcb, logs)
+         self.assertEqual (describe_design (design), self.expected)
+
+      # one entry per version of the inputs
+      self.assertEqual ((self.cache.hits, self.cache.misses), (1, 3))
+      self.assertEqual (len (self.entries ()), 3)
+
+   def test_corrupt (self):
+      self.read ()
+      path = os.path.join (self.cache_dir, self.entries () [0])
+      for data in (b'', b'KCGD', b'KCGD\x03\x00\x04\x00garbage'):
+         with open (path, 'wb') as file:
+            file.write (data)
+
+         # dropped, parsed again and stored anew
+         design, logs = self.read ()
+         self.assertIn ('DEBUG:root:   Dropping corrupted cache entry %s' % path, logs)
+         self.assertEqual (describe_design (design), self.expected)
+         self.assertTrue (os.path.exists (path))
+
+      self.assertEqual ((self.cache.hits, self.cache.misses), (0, 4))
+
+   def test_other_version (self):
+      # entries of another format version are misses, and replaced
+      self.read ()
+      path = os.path.join (self.cache_dir, self.entries () [0])
+      with open (path, 'rb') as file:
+         data = file.read ()
+      with open (path, 'wb') as file:
+         file.write (data [:4] + b'\x00\x00' + data [6:])
+
+      self.read ()
+      self.assertEqual ((self.cache.hits, self.cache.misses), (0, 2))
+      self.read ()
+      self.assertEqual ((self.cache.hits, self.cache.misses), (1, 2))
+
+   def test_evict (self):
+      # least recently used entries go first, the one just stored is kept
+      self.cache.max_size = 1
+      self.read ()
+      first = self.entries ()
+      with open (self.input_pcb, 'a') as file:
+         file.write ('\n')
+      self.read ()
+      self.assertEqual (len (self.entries ()), 1)
+      self.assertNotEqual (self.entries (), first)
+      self.assertEqual (self.cache.evictions, 1)
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
@@ -0,0 +1,132 @@
+##############################################################################
+#
+#     test_consolidated.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import argparse
+import csv
+import io
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from kcgen.batch import Project
+from kcgen.consolidated import ConsolidatedBom, consolidate_bom, CONSOLIDATED_BOM_FILENAME
+from . import BOARD_NET, BOARD_PCB, native
+
+
+
+#-- read_csv ------------------------------------------------------------------
+# Returns the rows of the CSV file at `path`
+
+def read_csv (path):
+   if str is bytes:
+      with open (path, 'rb') as file:
+         return list (csv.reader (file))
+   with io.open (path, 'r', encoding = 'utf-8', newline = '') as file:
+      return list (csv.reader (file))
+
+
+
+#-- line ----------------------------------------------------------------------
+# Returns a BOM line as `bom_lines` does
+
+def line (distributor, part_number, description, value, count):
+   return (distributor, part_number, description, value, 'device', 'package', 'link', count)
+
+
+
+class TestConsolidatedBom (unittest.TestCase):
+
+   def write (self, bom):
+      output = io.BytesIO () if str is bytes else io.StringIO ()
+      bom.write (output)
+      return list (csv.reader (output.getvalue ().splitlines ()))
+
+   def test_groups (self):
+      bom = ConsolidatedBom ()
+      bom.add ('a', 2, [
+         line ('LCSC', 'C2', 'CAP', '100n', 3),
+         line ('', '', 'Mounting hole', 'M3', 4),
+         line ('DigiKey', 'X1', 'RES', '1k', 1),
+      ])
+      bom.add ('b', 5, [
+         # same part number under another value, same description without a
+         # part number, and the same part number from another distributor
+         line ('LCSC', 'C2', 'CAP', '0.1u', 1),
+         line ('', '', 'Mounting hole', 'M2.5', 1),
+         line ('LCSC', 'X1', 'RES', '1k', 2),
+      ])
+      bom.add ('c', 1, [line ('LCSC', 'C1', 'CAP', '10u', 7)])
+
+      rows = self.write (bom)
+      self.assertEqual (rows [0][-4:], ['Quantity', 'a x2', 'b x5', 'c x1'])
+      # groups without a part number first, by description, then the others
+      # by distributor and part number, with the fields of the first project
+      # listing them, the quantity of each project being times its boards
+      self.assertEqual ([row [:4] + row [-4:] for row in rows [1:]], [
+         ['', '', 'Mounting hole', 'M3', '13', '8', '5', ''],
+         ['DigiKey', 'X1', 'RES', '1k', '2', '2', '', ''],
+         ['LCSC', 'C1', 'CAP', '10u', '7', '', '', '7'],
+         ['LCSC', 'C2', 'CAP', '100n', '11', '6', '5', ''],
+         ['LCSC', 'X1', 'RES', '1k', '10', '', '10', ''],
+      ])
+
+   def test_empty (self):
+      rows = self.write (ConsolidatedBom ())
+      self.assertEqual (len (rows), 1)
+      self.assertEqual (rows [0][-1], 'Quantity')
+
+
+
+class TestConsolidateBom (unittest.TestCase):
+
+   def setUp (self):
+      self.output_dir = tempfile.mkdtemp ()
+      self.path = os.path.join (self.output_dir, CONSOLIDATED_BOM_FILENAME)
+
+   def tearDown (self):
+      shutil.rmtree (self.output_dir)
+
+   def make_project (self, name, quantity, input_pcb = BOARD_PCB):
+      project = Project ()
+      project.name = name
+      project.input_net = BOARD_NET
+      project.input_pcb = input_pcb
+      project.output_dir = os.path.join (self.output_dir, name)
+      project.quantity = quantity
+      return project
+
+   def test_board (self):
+      projects = [self.make_project ('b', 2), self.make_project ('a', 3)]
+      with self.assertLogs (level = logging.INFO):
+         results = consolidate_bom (argparse.Namespace (), projects, self.output_dir)
+      self.assertEqual ([(result.name, result.ok) for result in results], [('b', True), ('a', True)])
+
+      rows = read_csv (self.path)
+      self.assertEqual (rows [0][-3:], ['Quantity', 'b x2', 'a x3'])
+      quantities = dict ((row [3], row [-3:]) for row in rows [1:])
+      self.assertEqual (quantities [native (u'TMP102 (I\xb2C)')], ['5', '2', '3'])
+      self.assertEqual (quantities ['100n'], ['10', '4', '6'])
+      self.assertEqual (quantities ['4k7'], ['10', '4', '6'])
+      self.assertEqual (
+         [row [1] for row in rows [1:]],
+         ['', '', '296-22873-1-ND', '311-100KHRCT-ND', '732-5317-ND', 'C14663', 'C158012', 'C23162']
+      )
+
+   def test_failure (self):
+      # the BOM is only written if every project could be read
+      missing = os.path.join (self.output_dir, 'missing.kicad_pcb')
+      projects = [self.make_project ('a', 1), self.make_project ('b', 1, missing)]
+      with self.assertLogs (level = logging.INFO):
+         results = consolidate_bom (argparse.Namespace (), projects, self.output_dir)
+      self.assertEqual ([(result.name, result.ok) for result in results], [('a', True), ('b', False)])
+      self.assertFalse (os.path.exists (self.path))
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
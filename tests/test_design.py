@@ -0,0 +1,134 @@
+##############################################################################
+#
+#     test_design.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import unittest
+from kcgen.ast import Design
+from kcgen.generator import bom_rows, Placements
+from kcgen.parser import Parser
+from . import BOARD_NET, BOARD_PCB, read_text
+
+
+
+#-- references ----------------------------------------------------------------
+
+def references (components):
+   return [component.reference for component in components]
+
+
+
+class TestIndexes (unittest.TestCase):
+
+   def setUp (self):
+      self.data_pcb = read_text (BOARD_PCB)
+      self.parser = Parser ('board', read_text (BOARD_NET), self.data_pcb, incremental = True)
+      self.design = self.parser.parse ()
+
+   def test_lookups (self):
+      design = self.design
+      self.assertEqual (design.find_component ('U1').value, u'TMP102 (I\xb2C)')
+      self.assertIsNone (design.find_component ('U2'))
+      self.assertEqual (
+         references (design.find_components_by_description ('RES 4.7K OHM 1% 1/10W 0603')),
+         ['R1', 'R2']
+      )
+      self.assertEqual (references (design.find_components_by_part_number ('C14663')), ['C1', 'C2'])
+      self.assertEqual (design.find_components_by_part_number ('none'), [])
+      self.assertEqual (references (design.find_components_by_side ('bottom')), ['R3'])
+      self.assertEqual (
+         references (design.find_components_by_side ('top')),
+         ['C1', 'C2', 'H1', 'H2', 'J1', 'J2', 'R1', 'R2', 'U1']
+      )
+      self.assertEqual (references (design.find_components_by_side ('')), ['TP1'])
+
+   def test_natural_order (self):
+      design = Design ()
+      for reference in ('R10', 'R2', 'R1'):
+         component = design.new_component ()
+         component.reference = reference
+         component.description = 'RES'
+         design.add_component (component)
+      self.assertEqual (references (design.find_components_by_description ('RES')), ['R1', 'R2', 'R10'])
+
+   def test_update (self):
+      # indexes built before the update follow it
+      self.assertEqual (references (self.design.find_components_by_side ('bottom')), ['R3'])
+
+      begin = self.data_pcb.index ('(fp_text reference R1 ')
+      data_pcb = (
+         self.data_pcb [:begin] +
+         self.data_pcb [begin:].replace ('(layer F.SilkS)', '(layer B.SilkS)', 1)
+      )
+      design = self.parser.update (data_pcb)
+      self.assertIs (design, self.design)
+      self.assertEqual (references (design.find_components_by_side ('bottom')), ['R1', 'R3'])
+
+   def test_columnar (self):
+      design = Parser ('board', read_text (BOARD_NET), self.data_pcb, columnar = True).parse ()
+      self.assertEqual (references (design.find_components_by_side ('bottom')), ['R3'])
+      self.assertEqual (references (design.find_components_by_side ('')), ['TP1'])
+
+
+
+class TestPlacements (unittest.TestCase):
+
+   # components are paired with their own position, whatever the order the
+   # components dict iterates in, which is not the insertion one on python 2
+
+   def placements (self, columnar, order):
+      design = Parser ('board', read_text (BOARD_NET), read_text (BOARD_PCB), columnar = columnar).parse ()
+      design.components = dict ((reference, design.components [reference]) for reference in order)
+      placements = Placements (design)
+      return sorted (zip (
+         placements.references, placements.xs, placements.ys, placements.rotations
+      ))
+
+   def test_columnar (self):
+      design = Parser ('board', read_text (BOARD_NET), read_text (BOARD_PCB)).parse ()
+      order = list (design.components)
+      expected = self.placements (False, order)
+      self.assertEqual (self.placements (True, order), expected)
+      self.assertEqual (self.placements (True, order [::-1]), expected)
+      self.assertEqual (self.placements (True, sorted (order)), expected)
+
+
+
+class TestBomRows (unittest.TestCase):
+
+   def test_board (self):
+      design = Parser ('board', read_text (BOARD_NET), read_text (BOARD_PCB)).parse ()
+      rows = [(component.reference, refs) for component, refs in bom_rows (design)]
+      # TP1 has no module and isn't listed
+      self.assertEqual (rows, [
+         ('C2', ['C1', 'C2']),
+         ('H1', ['H1']),
+         ('H2', ['H2']),
+         ('J1', ['J1']),
+         ('J2', ['J2']),
+         ('R2', ['R1', 'R2']),
+         ('R3', ['R3']),
+         ('U1', ['U1']),
+      ])
+
+   def test_groups (self):
+      design = Design ()
+      for reference, value in (('C10', '1u'), ('C2', '10u'), ('C1', '100n'), ('R1', '1k')):
+         component = design.new_component ()
+         component.reference = reference
+         component.value = value
+         component.description = reference [0]
+         design.add_component (component)
+      # the pcb file order, C1 having two modules
+      design.references = ['C10', 'C1', 'R1', 'C2', 'C1']
+
+      rows = [(component.value, refs) for component, refs in bom_rows (design)]
+      # fields come from the last module of the group in the pcb file
+      self.assertEqual (rows, [('100n', ['C1', 'C1', 'C2', 'C10']), ('1k', ['R1'])])
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
@@ -0,0 +1,111 @@
+##############################################################################
+#
+#     test_excellon.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import io
+import os
+import unittest
+from kcgen import read_design
+from kcgen.ast import Hole
+from kcgen.excellon import write_excellon
+from . import PATH_DATA, BOARD_NET, BOARD_PCB, read_text
+
+
+
+# The drill file of the fixture board, written by hand in the format pcbnew
+# 5.1 writes with the options kcgen gives EXCELLON_WRITER
+
+BOARD_DRL = os.path.join (PATH_DATA, 'board', 'board.drl')
+
+
+
+#-- read_drill ----------------------------------------------------------------
+# Returns the header commands, the tool table as a list of (tool, diameter)
+# and the lines following each tool selection of an Excellon drill file, in
+# file order and leaving out comments. The lines before the first tool are
+# under None.
+
+def read_drill (data):
+   lines = [line for line in data.splitlines () if line and not line.startswith (';')]
+   end = lines.index ('%')
+
+   header = [line for line in lines [:end] if not line.startswith ('T')]
+   tools = [tuple (line [1:].split ('C')) for line in lines [:end] if line.startswith ('T')]
+
+   holes = {None: []}
+   tool = None
+   for line in lines [end + 1:]:
+      if line.startswith ('T'):
+         tool = line [1:]
+         holes.setdefault (tool, [])
+      else:
+         holes [tool].append (line)
+
+   return header, tools, holes
+
+
+
+class TestExcellon (unittest.TestCase):
+
+   def write (self, holes):
+      output = io.StringIO ()
+      write_excellon (output, holes)
+      return output.getvalue ()
+
+   def test_board (self):
+      design = read_design (BOARD_NET, BOARD_PCB)
+      header, tools, holes = read_drill (self.write (design.holes))
+      expected_header, expected_tools, expected_holes = read_drill (read_text (BOARD_DRL))
+
+      self.assertEqual (header, ['M48', 'FMAT,2', 'METRIC'])
+      self.assertEqual (header, expected_header)
+      self.assertEqual (tools, expected_tools)
+      self.assertEqual (holes, expected_holes)
+      # absolute coordinates, drill mode, and the end of the program
+      self.assertEqual (holes [None], ['G90', 'G05'])
+      self.assertEqual (holes ['0'], ['M30'])
+
+   def test_board_holes (self):
+      design = read_design (BOARD_NET, BOARD_PCB)
+      _, tools, holes = read_drill (self.write (design.holes))
+      tools = dict ((diameter, tool) for tool, diameter in tools)
+
+      # round plated holes
+      self.assertEqual (holes [tools ['1.000']], [
+         'X105.5Y-90.19', 'X105.5Y-92.73', 'X105.5Y-95.27', 'X105.5Y-97.81'
+      ])
+      # oval holes on a rotated module, one pad having a shape offset, each
+      # slot followed by the command back to drill mode
+      self.assertEqual (holes [tools ['0.900']], [
+         'X141.1Y-92.5G85X141.4Y-92.5', 'G05', 'X141.1Y-95.0G85X141.4Y-95.0', 'G05'
+      ])
+      # non plated round and oval holes
+      self.assertEqual (holes [tools ['3.200']], ['X145.0Y-80.0'])
+      self.assertEqual (holes [tools ['1.200']], ['X103.55Y-109.221G85X104.45Y-110.779', 'G05'])
+      # vias, with their own drill or the one of their net class, the
+      # blind one being left out
+      self.assertEqual (holes [tools ['0.300']], ['X118.5Y-88.75'])
+      self.assertEqual (holes [tools ['0.400']], ['X109.0Y-89.75', 'X116.0Y-86.25', 'X131.25Y-95.0'])
+      self.assertEqual (holes [tools ['0.600']], ['X112.5Y-84.0', 'X118.0Y-98.0', 'X123.0Y-98.0'])
+
+   def test_plated_tools_first (self):
+      holes = []
+      for diameter, plated in ((1.0, False), (1.5, True), (1.0, True)):
+         hole = Hole ()
+         hole.diameter = diameter
+         hole.plated = plated
+         holes.append (hole)
+
+      _, tools, holes = read_drill (self.write (holes))
+      self.assertEqual (tools, [('1', '1.000'), ('2', '1.500'), ('3', '1.000')])
+      self.assertEqual (holes, {
+         None: ['G90', 'G05'], '1': ['X0.0Y0.0'], '2': ['X0.0Y0.0'], '3': ['X0.0Y0.0'], '0': ['M30']
+      })
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
@@ -0,0 +1,133 @@
+##############################################################################
+#
+#     test_manifest.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import kcgen
+from kcgen import manifest
+from kcgen.manifest import MANIFEST_NAME
+from kcgen.manufacturers import MANUFACTURERS, PcbPool, register_manufacturer
+from . import BOARD_NET, BOARD_PCB, make_args
+
+
+
+STAGES = ('drill', 'bom', 'pickplace', 'assembly')
+
+
+
+class TestManifest (unittest.TestCase):
+
+   # stages writing their files without pcbnew are run on a copy of the
+   # fixture board, which the tests change
+
+   def setUp (self):
+      self.work_dir = tempfile.mkdtemp ()
+      project_dir = os.path.join (self.work_dir, 'board')
+      os.makedirs (project_dir)
+      self.input_net = os.path.join (project_dir, 'board.net')
+      self.input_pcb = os.path.join (project_dir, 'board.kicad_pcb')
+      shutil.copy (BOARD_NET, self.input_net)
+      shutil.copy (BOARD_PCB, self.input_pcb)
+      self.output_dir = os.path.join (self.work_dir, 'output')
+
+   def tearDown (self):
+      shutil.rmtree (self.work_dir)
+
+   # Runs the stages, returns the ones which ran
+
+   def build (self, **options):
+      args = make_args (
+         self.output_dir, input_net = self.input_net, input_pcb = self.input_pcb,
+         stages = ','.join (STAGES), drill_backend = 'native', assembly_backend = 'pdf'
+      )
+      for name, value in options.items ():
+         setattr (args, name, value)
+
+      with self.assertLogs (level = logging.INFO) as logs:
+         kcgen.run (args)
+
+      skipped = set (
+         name for name in STAGES
+         if 'INFO:root:Skipping %s, up to date' % name in logs.output
+      )
+      return set (STAGES) - skipped
+
+   def output (self, filename):
+      return os.path.join (self.output_dir, filename)
+
+   def test_up_to_date (self):
+      self.assertEqual (self.build (), set (STAGES))
+      self.assertTrue (os.path.exists (os.path.join (self.output_dir, MANIFEST_NAME)))
+      self.assertEqual (self.build (), set ())
+      self.assertEqual (self.build (), set ())
+
+   def test_force (self):
+      self.build ()
+      self.assertEqual (self.build (force = True), set (STAGES))
+      self.assertEqual (self.build (), set ())
+
+   def test_input_changed (self):
+      self.build ()
+
+      with open (self.input_net, 'a') as file:
+         file.write ('\n')
+      self.assertEqual (self.build (), set (('bom', 'pickplace', 'assembly')))
+      self.assertEqual (self.build (), set ())
+
+      with open (self.input_pcb, 'r') as file:
+         data = file.read ()
+      with open (self.input_pcb, 'w') as file:
+         file.write (data.replace ('(at 112.5 86.25)', '(at 112.5 86.5)'))
+      self.assertEqual (self.build (), set (STAGES))
+      self.assertEqual (self.build (), set ())
+
+   def test_option_changed (self):
+      # the files of a second manufacturer are written too
+      register_manufacturer ('other', PcbPool ())
+      self.addCleanup (MANUFACTURERS.pop, 'other')
+
+      self.build ()
+      self.assertEqual (self.build (manufacturer = 'pcbpool,other'), set (('bom', 'pickplace')))
+      self.assertTrue (os.path.exists (self.output ('other/board.bom.csv')))
+      self.assertEqual (self.build (manufacturer = 'pcbpool,other'), set ())
+      self.assertEqual (self.build (), set (('bom', 'pickplace')))
+
+   def test_version_changed (self):
+      self.build ()
+      with mock.patch.object (manifest, '__version__', 'other'):
+         self.assertEqual (self.build (), set (STAGES))
+         self.assertEqual (self.build (), set ())
+      self.assertEqual (self.build (), set (STAGES))
+
+   def test_output_deleted (self):
+      self.build ()
+      os.remove (self.output ('gerber/board.drl'))
+      self.assertEqual (self.build (), set (('drill',)))
+      self.assertTrue (os.path.exists (self.output ('gerber/board.drl')))
+
+   def test_output_modified (self):
+      self.build ()
+
+      with open (self.output ('board.bom.csv'), 'a') as file:
+         file.write ('edited\n')
+      self.assertEqual (self.build (), set (('bom',)))
+
+      # same size, other modification time
+      stat = os.stat (self.output ('board.pickplace.txt'))
+      os.utime (self.output ('board.pickplace.txt'), (stat.st_atime, stat.st_mtime - 10))
+      self.assertEqual (self.build (), set (('pickplace',)))
+
+      self.assertEqual (self.build (), set ())
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
@@ -0,0 +1,148 @@
+##############################################################################
+#
+#     test_manufacturers.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from kcgen import read_design
+from kcgen.generator import Generator, get_manufacturer_names
+from kcgen.manufacturers import MANUFACTURERS, register_manufacturer
+from . import BOARD_NET, BOARD_PCB
+
+
+
+# Components not to place (J1, H1, H2) are listed, connectors without their
+# value, the components of a group joined, and positions are from the lower
+# left corner of the board outline.
+
+PCBPOOL_BOM_ROWS = [
+   u'C1, C2;100n;Capacitor;0603;CAP CER 100nF 50V X7R \xb110% 0603;;2;True;No;LCSC;C14663;https://lcsc.com/product-detail/C14663.html;;;;;;;',
+   u'J1;;Header;THT;Pin header 1x04 2.54mm;;1;False;No;DigiKey;732-5317-ND;https://www.digikey.com/products/en?keywords=732-5317-ND;hand soldered (THT);;;;;;',
+   u'R3;100k;Resistor;0603;RES 100K OHM 1% 1/10W 0603;;1;True;No;DigiKey;311-100KHRCT-ND;https://www.digikey.com/products/en?keywords=311-100KHRCT-ND;;;;;;;',
+]
+
+PCBPOOL_PICKPLACE = u'''\
+Filename:\tboard.pickplace.txt
+
+Position of PCB:
+left under edge: X=0 / Y=0
+
+
+name\tX-axis\tY-axis\tangle\tvalue\tpackage\tside
+
+REF1T\t3.00\t37.00\t0.00\t1mm\tCircle\ttop
+REF2T\t47.00\t3.00\t0.00\t1mm\tCircle\ttop
+REF1B\t47.00\t37.00\t0.00\t1mm\tCircle\tbottom
+
+C1\t21.00\t31.50\t0.00\t100n\t0603\ttop
+C2\t26.50\t19.00\t-90.00\t100n\t0603\ttop
+H1\t45.00\t35.00\t0.00\tMountingHole\t\ttop
+H2\t4.00\t5.00\t30.00\tSlot\t\ttop
+J1\t5.50\t24.81\t0.00\tConn_01x04\tTHT\ttop
+J2\t41.25\t20.00\t90.00\tConn_01x02\tJST-XH\ttop
+R1\t12.50\t28.75\t0.00\t4k7\t0603\ttop
+R2\t12.50\t25.25\t180.00\t4k7\t0603\ttop
+R3\t31.25\t13.50\t90.00\t100k\t0603\tbottom
+TP1\t-100.00\t115.00\t0.00\tTestPoint\t\t
+U1\t21.00\t23.00\t90.00\tTMP102 (I\xb2C)\tSOIC-8\ttop
+'''
+
+
+
+# A format registered from Python, as the README tells
+
+class ReferencesOnly (object):
+
+   bom_filename = '%s.references.txt'
+   pickplace_filename = '%s.xy.txt'
+
+   def write_bom (self, output, design, rows):
+      for component, references in rows:
+         output.write ('%s %s\n' % (' '.join (references), component.value))
+
+   def write_pickplace (self, output, design, placements):
+      for reference, x, y in zip (placements.references, placements.xs, placements.ys):
+         output.write ('%s %.2f %.2f\n' % (reference, x, y))
+
+
+
+class TestManufacturers (unittest.TestCase):
+
+   def setUp (self):
+      self.output_dir = tempfile.mkdtemp ()
+      self.design = read_design (BOARD_NET, BOARD_PCB)
+      register_manufacturer ('references', ReferencesOnly ())
+
+   def tearDown (self):
+      del MANUFACTURERS ['references']
+      shutil.rmtree (self.output_dir)
+
+   def read_output (self, *path):
+      with io.open (os.path.join (self.output_dir, *path), 'r', encoding = 'utf-8', newline = '') as file:
+         return file.read ()
+
+   def generate (self, manufacturers):
+      generator = Generator (manufacturers)
+      generator.process_bom (self.output_dir, self.design)
+      generator.process_pickplace (self.output_dir, self.design)
+
+   def test_pcbpool (self):
+      self.generate ('pcbpool')
+      self.assertEqual (sorted (os.listdir (self.output_dir)), ['board.bom.csv', 'board.pickplace.txt'])
+
+      bom = self.read_output ('board.bom.csv').split ('\n')
+      self.assertTrue (bom [0].startswith ('Part;Value;Device;Package;Description;'))
+      for row in PCBPOOL_BOM_ROWS:
+         self.assertIn (row, bom)
+      # the U1 remark holds a line break, written as is
+      self.assertEqual (
+         [row.split (';') [0] for row in bom [1:9]],
+         ['C1, C2', 'H1', 'H2', 'J1', 'J2', 'R1, R2', 'R3', 'U1']
+      )
+      self.assertEqual (bom [9:], ['before reflow;;;;;;', ''])
+      self.assertEqual (self.read_output ('board.pickplace.txt'), PCBPOOL_PICKPLACE)
+
+   def test_registered (self):
+      self.generate ('references')
+      self.assertEqual (self.read_output ('board.references.txt').split ('\n') [:2], ['C1 C2 100n', 'H1 MountingHole'])
+      self.assertEqual (self.read_output ('board.xy.txt').split ('\n') [0], 'C1 21.00 31.50')
+
+   def test_several_manufacturers (self):
+      # each manufacturer gets a sub-directory, which may already exist,
+      # holding the files it writes alone
+      self.generate ('references')
+      self.generate ('pcbpool')
+      single = dict (
+         (filename, self.read_output (filename)) for filename in os.listdir (self.output_dir)
+      )
+      os.makedirs (os.path.join (self.output_dir, 'pcbpool'))
+
+      self.generate (' pcbpool, references')
+      for name, filenames in (
+         ('pcbpool', ['board.bom.csv', 'board.pickplace.txt']),
+         ('references', ['board.references.txt', 'board.xy.txt']),
+      ):
+         self.assertEqual (sorted (os.listdir (os.path.join (self.output_dir, name))), filenames)
+         for filename in filenames:
+            self.assertEqual (self.read_output (name, filename), single [filename])
+
+   def test_unknown (self):
+      with self.assertLogs (level = logging.ERROR), self.assertRaises (SystemExit):
+         self.generate ('pcbpool,unknown')
+
+   def test_names (self):
+      self.assertEqual (get_manufacturer_names ('pcbpool'), ['pcbpool'])
+      self.assertEqual (get_manufacturer_names ('pcbpool, references'), ['pcbpool', 'references'])
+      self.assertEqual (get_manufacturer_names (('references',)), ['references'])
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
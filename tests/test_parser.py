@@ -0,0 +1,235 @@
+##############################################################################
+#
+#     test_parser.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import unittest
+import kcgen
+from kcgen import read_design, get_design_contents
+from kcgen.parser import Parser, parse_sexpression, get_pcb_sections
+from kcgen.sexpr import Symbol, FlatNode, FLAT_MIN_ITEMS
+from benchmarks.synthetic import make_design
+from . import BOARD_NET, BOARD_PCB, read_text, native, describe_design, make_args
+
+
+
+# S-expression engines, each returning the tree of a string
+
+def _parse_regex (data):
+   return Parser (None, None, None)._parse_sexpression_regex (data)
+
+def _encode (data):
+   return data if isinstance (data, bytes) else data.encode ('utf-8')
+
+ENGINES = (
+   ('char', lambda data: parse_sexpression (data, 'char')),
+   ('token', lambda data: parse_sexpression (data, 'token')),
+   ('regex', _parse_regex),
+   ('bytes', lambda data: parse_sexpression (_encode (data))),
+   ('bytearray', lambda data: parse_sexpression (bytearray (_encode (data)))),
+)
+
+def _xy (count):
+   return ' '.join ('(xy %d.5 -%d)' % (i, i) for i in range (count))
+
+# Inputs KiCad writes seldom if ever, but which all engines must read alike
+
+EDGE_CASES = (
+   # strings and escapes
+   u'(a "" "b c" "d\\"e" "f\\\\g" "\\n" "h\\\\" x)',
+   u'(s "(not a list)" "semi;colon" "it\'s" "\\(")',
+   u'(t "line one\nline two\n" "tab\there" x)',
+   u'(u "\\"" "\\\\\\"" "a\\b\\c")',
+   u'(a"b"c"d")',
+   # whitespace, the one of `string.whitespace` only
+   u'(w\ta\r\nb\x0bc\x0cd  \n )',
+   u'(u a\xa0b c\u2003d e\u3000f g\x1ch i\x85j k\u2028l)',
+   u'(u "\xa0" \xa0 "\u3000" \u3000)',
+   u'( lead trail )',
+   # quotes
+   u"(q 'a '(b c) '\"d\" x)",
+   u'(quote a b)',
+   u"('(quote x))",
+   # nesting and atoms
+   u'(a(b)(c(d))e)',
+   u'(n -1.5e3 +3V3 /SDA ${KISYS3DMOD}/R.wrl * ~ \\)',
+   u'(unicode \xb5 \u03a9 "\xb0C" \u03a9a)',
+   u'(e ())',
+   # flat lists, below, at and above the size at which they are flattened
+   u'(zone (pts %s))' % _xy (FLAT_MIN_ITEMS - 2),
+   u'(zone (pts %s))' % _xy (FLAT_MIN_ITEMS - 1),
+   u'(zone (pts %s) (pts %s))' % (_xy (200), _xy (3)),
+   u'(zone (pts %s (arc (xy 1 2) "s" (a (b))) c))' % _xy (100),
+   u'(pts %s)' % _xy (FLAT_MIN_ITEMS),
+   u'(other %s)' % _xy (100),
+)
+
+
+
+#-- describe_tree -------------------------------------------------------------
+# Returns `tree` with its atoms, strings and flat lists told apart by type
+
+def describe_tree (tree):
+   if type (tree) is Symbol:
+      return ('symbol', tree.name)
+   if type (tree) is FlatNode:
+      return ('flat',) + tuple (describe_tree (item) for item in tree)
+   if type (tree) is tuple:
+      return ('list',) + tuple (describe_tree (item) for item in tree)
+   return ('string', tree)
+
+
+
+class TestEngines (unittest.TestCase):
+
+   # inputs are given as the string type files are read to, which is what
+   # the engines see in use
+
+   def check_engines (self, data):
+      data = native (data)
+      char_tree = describe_tree (ENGINES [0][1] (data))
+      for name, parse in ENGINES [1:]:
+         self.assertEqual (describe_tree (parse (data)), char_tree, name)
+      return char_tree
+
+   def test_edge_cases (self):
+      for data in EDGE_CASES:
+         self.check_engines (data)
+
+   def test_board (self):
+      for path in (BOARD_NET, BOARD_PCB):
+         self.check_engines (read_text (path))
+
+   def test_synthetic (self):
+      net, pcb = make_design (components = 100, segments = 200, vias = 50, zone_points = 300)
+      self.check_engines (net)
+      self.check_engines (pcb)
+
+   def test_tree (self):
+      tree = self.check_engines (u'(a "b c" (d 1.5) \'e)')
+      self.assertEqual (tree, (
+         'list', ('symbol', 'a'), ('string', 'b c'),
+         ('list', ('symbol', 'd'), ('symbol', '1.5')),
+         ('list', ('symbol', 'quote'), ('symbol', 'e')),
+      ))
+
+   def test_flat (self):
+      tree = self.check_engines (u'(zone (pts %s) (pts %s))' % (_xy (200), _xy (3)))
+      self.assertEqual ([node [0] for node in tree [2:]], ['flat', 'list'])
+
+   def test_symbols_shared (self):
+      tree = parse_sexpression (u'(a (b a) "a")')
+      self.assertIs (tree [0], tree [1][1])
+      self.assertEqual (tree [0], Symbol ('a'))
+      self.assertNotEqual (tree [0], tree [2])
+
+
+
+class TestFlatNode (unittest.TestCase):
+
+   def test_items (self):
+      items = [(Symbol ('xy'), Symbol (str (i)), 'z') for i in range (100)]
+      flat = FlatNode (tuple ([Symbol ('pts')] + items))
+      tree = tuple ([Symbol ('pts')] + items)
+      self.assertEqual (len (flat), 101)
+      self.assertEqual (flat [0], Symbol ('pts'))
+      self.assertEqual (flat [1], items [0])
+      self.assertEqual (flat [-1], items [-1])
+      self.assertEqual (flat [10:12], tuple (items [9:11]))
+      self.assertEqual (list (flat), list (tree))
+      self.assertEqual (flat.decode (), tree)
+      self.assertEqual (flat, tree)
+
+
+
+class TestDesign (unittest.TestCase):
+
+   # designs read with every engine and input path are the same
+
+   def test_board (self):
+      expected = describe_design (read_design (BOARD_NET, BOARD_PCB, engine = 'char'))
+      for options in (
+         {},
+         {'stream': False},
+         {'use_mmap': True},
+         {'use_mmap': True, 'stream': False},
+         {'engine': 'char', 'stream': False},
+      ):
+         design = read_design (BOARD_NET, BOARD_PCB, **options)
+         self.assertEqual (describe_design (design), expected, options)
+
+   def test_board_mmap_strings (self):
+      # memory mapped files give the strings files read give, non ascii ones
+      # included, of the same type
+      design = read_design (BOARD_NET, BOARD_PCB)
+      value = design.components ['U1'].value
+      for options in ({'use_mmap': True}, {'use_mmap': True, 'stream': False}):
+         mapped = read_design (BOARD_NET, BOARD_PCB, **options)
+         mapped_value = mapped.components ['U1'].value
+         self.assertEqual (mapped_value, value, options)
+         self.assertIs (type (mapped_value), type (value), options)
+         self.assertEqual (
+            [str (component) for component in mapped.components.values ()],
+            [str (component) for component in design.components.values ()],
+            options
+         )
+
+   def test_board_content (self):
+      design = read_design (BOARD_NET, BOARD_PCB)
+      self.assertEqual (design.name, 'board')
+      self.assertEqual (design.references, ['R1', 'R2', 'R3', 'C1', 'C2', 'U1', 'J1', 'J2', 'H1', 'H2'])
+      self.assertEqual ([f.reference for f in design.fiducials], ['REF1T', 'REF2T', 'REF1B'])
+      self.assertEqual (design.components ['U1'].value, native (u'TMP102 (I\xb2C)'))
+      self.assertEqual (design.components ['U1'].remark, 'check pin 1\nbefore reflow')
+      self.assertEqual (design.components ['J2'].description, 'JST XH 2 pins "B2B-XH-A"')
+      self.assertEqual (design.components ['R3'].side, 'bottom')
+      self.assertEqual (design.components ['TP1'].side, '')
+      self.assertEqual (str (design.outline), 'left:100.0 top: 75.0 right: 150.0 bottom: 115.0')
+
+   def test_board_contents (self):
+      # the contents not read are left out, the board outline being always
+      # read, the rest is the same
+      expected = describe_design (read_design (BOARD_NET, BOARD_PCB))
+      left_out = {
+         'drawings': [drawing for drawing in expected ['drawings'] if 'Edge.Cuts' in drawing],
+         'holes': [],
+      }
+      for content in left_out:
+         self.assertNotEqual (expected [content], left_out [content])
+
+      for contents in ((), ('drawings',), ('holes',)):
+         for options in ({}, {'engine': 'char', 'stream': False}, {'use_mmap': True}):
+            design = read_design (BOARD_NET, BOARD_PCB, contents = contents, **options)
+            description = describe_design (design)
+            for content in left_out:
+               if content not in contents:
+                  self.assertEqual (description [content], left_out [content], (contents, options))
+                  description [content] = expected [content]
+            self.assertEqual (description, expected, (contents, options))
+
+   def test_pcb_sections (self):
+      self.assertEqual (get_pcb_sections (()), ('module', 'gr_line'))
+      self.assertEqual (get_pcb_sections (('drawings',)), ('module', 'gr_line'))
+      self.assertEqual (get_pcb_sections (('holes',)), ('module', 'gr_line', 'via', 'net', 'net_class'))
+
+   def test_design_contents (self):
+      # what the stages asked for read, rsvg-convert being there
+      rsvg_convert = kcgen.RSVG_CONVERT
+      kcgen.RSVG_CONVERT = __file__
+      self.addCleanup (setattr, kcgen, 'RSVG_CONVERT', rsvg_convert)
+      for options, contents in (
+         ({}, ()),
+         ({'stages': 'bom,pickplace', 'drill_backend': 'native', 'assembly_backend': 'pdf'}, ()),
+         ({'drill_backend': 'native'}, ('holes',)),
+         ({'stages': 'drill', 'drill_backend': 'native'}, ('holes',)),
+         ({'stages': 'assembly', 'assembly_backend': 'pdf'}, ('drawings',)),
+         ({'drill_backend': 'native', 'assembly_backend': 'pdf'}, ('holes', 'drawings')),
+      ):
+         self.assertEqual (get_design_contents (make_args (None, **options)), contents, options)
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
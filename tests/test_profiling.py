@@ -0,0 +1,161 @@
+##############################################################################
+#
+#     test_profiling.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import kcgen
+from kcgen import profiling
+from kcgen.profiling import Profiler, set_profiler, get_profiler
+from . import make_args
+
+
+
+class TestProfiling (unittest.TestCase):
+
+   def setUp (self):
+      self.work_dir = tempfile.mkdtemp ()
+      self.path = os.path.join (self.work_dir, 'trace.json')
+
+   def tearDown (self):
+      set_profiler (None)
+      shutil.rmtree (self.work_dir)
+
+   # Returns the events of the trace written by `profiler`, checking the
+   # fields of each according to its phase
+
+   def read_trace (self, profiler):
+      profiler.write_trace (self.path)
+      with open (self.path, 'r') as file:
+         trace = json.load (file)
+
+      self.assertEqual (sorted (trace), ['displayTimeUnit', 'traceEvents'])
+      self.assertEqual (trace ['displayTimeUnit'], 'ms')
+      events = trace ['traceEvents']
+      for event in events:
+         self.assertIn (event ['ph'], ('X', 'C', 'i'))
+         self.assertEqual (event ['pid'], os.getpid ())
+         self.assertGreaterEqual (event ['ts'], 0)
+         self.assertIsInstance (event ['args'], dict)
+         if event ['ph'] == 'X':
+            self.assertEqual (
+               sorted (event), ['args', 'cat', 'dur', 'name', 'ph', 'pid', 'tid', 'ts']
+            )
+            self.assertGreaterEqual (event ['dur'], 0)
+            self.assertGreaterEqual (event ['args']['cpu_ms'], 0)
+            self.assertGreaterEqual (event ['args']['peak_memory'], 0)
+         elif event ['ph'] == 'i':
+            self.assertEqual (event ['s'], 'p')
+            self.assertEqual (event ['cat'], 'aggregated')
+      return events
+
+   def spans (self, events):
+      return dict ((event ['name'], event) for event in events if event ['ph'] == 'X')
+
+   def test_trace (self):
+      profiler = Profiler ()
+      set_profiler (profiler)
+      with profiling.span ('outer', 'read', file = 'board'):
+         with profiling.span ('inner'):
+            profiling.count ('modules', 3)
+            profiling.count ('modules')
+         profiling.add_time ('pads', 0.25)
+         profiling.add_time ('pads', 0.5)
+      set_profiler (None)
+      # not recorded
+      with profiling.span ('after'):
+         pass
+
+      events = self.read_trace (profiler)
+      spans = self.spans (events)
+      self.assertEqual (sorted (spans), ['inner', 'outer'])
+
+      outer, inner = spans ['outer'], spans ['inner']
+      self.assertEqual ((outer ['cat'], inner ['cat']), ('read', 'kcgen'))
+      self.assertEqual (outer ['args']['file'], 'board')
+      # nested spans are within their parent
+      self.assertLessEqual (outer ['ts'], inner ['ts'])
+      self.assertLessEqual (inner ['ts'] + inner ['dur'], outer ['ts'] + outer ['dur'])
+      self.assertEqual (outer ['tid'], threading.current_thread ().ident)
+
+      counters = [event for event in events if event ['ph'] == 'C']
+      self.assertEqual (len (counters), 1)
+      self.assertEqual (counters [0]['args'], {'modules': 4})
+      times = [event for event in events if event ['ph'] == 'i']
+      self.assertEqual ([(event ['name'], event ['args']) for event in times], [('pads', {'total_ms': 750.0})])
+
+   def test_threads (self):
+      profiler = Profiler ()
+      set_profiler (profiler)
+      idents = []
+
+      def work ():
+         with profiling.span ('work'):
+            idents.append (threading.current_thread ().ident)
+
+      threads = [threading.Thread (target = work) for index in range (3)]
+      for thread in threads:
+         thread.start ()
+      for thread in threads:
+         thread.join ()
+      set_profiler (None)
+
+      events = self.read_trace (profiler)
+      self.assertEqual (sorted (event ['tid'] for event in events if event ['ph'] == 'X'), sorted (idents))
+
+   def test_not_recording (self):
+      self.assertIsNone (get_profiler ())
+      with profiling.span ('nothing') as record:
+         self.assertIsNone (record)
+      profiling.count ('nothing')
+      profiling.add_time ('nothing', 1.0)
+
+   def test_memory (self):
+      profiler = Profiler (trace_memory = True)
+      set_profiler (profiler)
+      try:
+         with profiling.span ('allocate'):
+            data = [object () for index in range (100000)]
+            del data
+      finally:
+         set_profiler (None)
+         profiler.stop ()
+
+      events = self.read_trace (profiler)
+      self.assertGreater (self.spans (events) ['allocate']['args']['peak_memory'], 1000000)
+      self.assertIn ('peak MB', profiler.summary ())
+
+   def test_run (self):
+      args = make_args (
+         os.path.join (self.work_dir, 'output'), stages = 'bom,pickplace', profile = self.path,
+         logging_level = logging.INFO, stream = io.StringIO ()
+      )
+      # main sets up logging, which is left as it was
+      handlers = list (logging.root.handlers)
+      try:
+         with self.assertLogs (level = logging.INFO) as logs:
+            kcgen.main (args)
+      finally:
+         logging.root.handlers = handlers
+      self.assertIsNone (get_profiler ())
+      self.assertTrue (any (line.startswith ('INFO:root:Profile written to') for line in logs.output))
+
+      with open (self.path, 'r') as file:
+         events = json.load (file) ['traceEvents']
+      names = set (event ['name'] for event in events if event ['ph'] == 'X')
+      for name in ('run', 'bom', 'pickplace', 'read board.net', 'read board.kicad_pcb'):
+         self.assertIn (name, names)
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
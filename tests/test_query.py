@@ -0,0 +1,109 @@
+##############################################################################
+#
+#     test_query.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import unittest
+from kcgen.parser import parse_sexpression
+from kcgen.query import Index, compile_query, select, first
+from kcgen.sexpr import Symbol, FLAT_MIN_ITEMS
+from . import BOARD_PCB, read_text
+
+
+
+TREE = u'''(pcb
+   (net 1 GND)
+   (module R1 (layer F.Cu) (at 1 2)
+      (fp_text reference R1 (layer F.SilkS))
+      (fp_text value 4k7 (layer F.Fab))
+      (fp_line (start 0 0) (end 1 0) (layer F.CrtYd))
+      (fp_line (start 0 0) (end 0 1) (layer F.SilkS))
+   )
+   (module C1 (layer B.Cu) (at 3 4)
+      (fp_text reference C1 (layer B.SilkS))
+      (fp_text user "keep clear" (layer B.Fab))
+   )
+   (zone (polygon (pts %s)))
+)''' % ' '.join ('(xy %d 0)' % i for i in range (FLAT_MIN_ITEMS))
+
+
+
+#-- texts ---------------------------------------------------------------------
+# Returns the item after the key of each list of `nodes`, as text
+
+def texts (nodes):
+   return [node [1].name if type (node [1]) is Symbol else node [1] for node in nodes]
+
+
+
+class TestQuery (unittest.TestCase):
+
+   def setUp (self):
+      self.tree = parse_sexpression (TREE)
+
+   def test_paths (self):
+      self.assertEqual (texts (select (self.tree, 'module')), ['R1', 'C1'])
+      self.assertEqual (texts (select (self.tree, 'module/fp_text')), ['reference', 'value', 'reference', 'user'])
+      self.assertEqual (len (select (self.tree, 'module/fp_line/layer')), 2)
+      # `*` selects any list, atoms and strings left out
+      self.assertEqual (len (select (self.tree, 'module/*')), 10)
+      self.assertEqual (texts (select (self.tree, '*/layer')), ['F.Cu', 'B.Cu'])
+      # down flat lists
+      self.assertEqual (len (select (self.tree, 'zone/polygon/pts/xy')), FLAT_MIN_ITEMS)
+      # keys are only looked for among the children of the previous step
+      self.assertEqual (select (self.tree, 'fp_text'), [])
+      self.assertEqual (select (self.tree, 'module/net'), [])
+
+   def test_conditions (self):
+      # the item after the key, atom or string
+      self.assertEqual (texts (select (self.tree, 'module[C1]/at')), ['3'])
+      self.assertEqual (texts (select (self.tree, 'net[1]')), ['1'])
+      self.assertEqual (len (select (self.tree, 'module/fp_text[keep clear]')), 0)
+      self.assertEqual (texts (select (self.tree, 'module/fp_text[user]')), ['user'])
+      # a (name value) child
+      self.assertEqual (texts (select (self.tree, 'module[layer=B.Cu]')), ['C1'])
+      self.assertEqual (
+         texts (select (self.tree, 'module/fp_line[layer=F.CrtYd]/end')), ['1']
+      )
+      # all of them
+      self.assertEqual (texts (select (self.tree, 'module/fp_text[reference][layer=F.SilkS]')), ['reference'])
+      self.assertEqual (select (self.tree, 'module[R1][layer=B.Cu]'), [])
+      self.assertEqual (texts (select (self.tree, 'module/*[layer=B.Fab]')), ['user'])
+
+   def test_first (self):
+      self.assertEqual (texts ([first (self.tree, 'module/fp_text[value]')]), ['value'])
+      self.assertIsNone (first (self.tree, 'module[U1]'))
+      self.assertIsNone (first (self.tree, 'module/fp_text[layer=F.Cu]'))
+      self.assertIsNone (first (self.tree, 'via'))
+
+   def test_invalid (self):
+      for path in ('', 'module/', '/module', 'module//at', 'module[R1', 'module]', 'a=b', 'module[a][b'):
+         with self.assertRaises (ValueError):
+            compile_query (path)
+
+   def test_compiled_once (self):
+      self.assertIs (compile_query ('module/at'), compile_query ('module/at'))
+
+   def test_index (self):
+      # an index shared across queries gives the same lists
+      index = Index ()
+      for path in ('module/fp_text', 'module[layer=F.Cu]/fp_line', 'module/fp_text[reference]'):
+         self.assertEqual (select (self.tree, path, index), select (self.tree, path))
+
+   def test_board (self):
+      tree = parse_sexpression (read_text (BOARD_PCB))
+      references = select (tree, 'module/fp_text[reference]')
+      # fiducials and the logo keep the reference of their footprint
+      self.assertEqual (
+         texts ([node [1:] for node in references]),
+         ['REF**', 'REF**', 'REF**', 'G***', 'R1', 'R2', 'R3', 'C1', 'C2', 'U1', 'J1', 'J2', 'H1', 'H2']
+      )
+      references = select (tree, 'module[layer=B.Cu]/fp_text[reference]')
+      self.assertEqual (texts ([node [1:] for node in references]), ['REF**', 'R3'])
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
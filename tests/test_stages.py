@@ -0,0 +1,94 @@
+##############################################################################
+#
+#     test_stages.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import kcgen
+from kcgen.backend import set_backend, RecordingBackend
+from . import make_args
+
+
+
+class BoardUseBackend (RecordingBackend):
+
+   # Recording backend whose calls take a while, counting the calls made
+   # while another one was running
+
+   def __init__ (self, results = None):
+      RecordingBackend.__init__ (self, results)
+      self.overlaps = []
+      self._running = []
+      self._use_lock = threading.Lock ()
+
+   def record (self, name, args):
+      with self._use_lock:
+         if self._running:
+            self.overlaps.append ((self._running [0], name))
+         self._running.append (name)
+      time.sleep (0.002)
+      with self._use_lock:
+         self._running.remove (name)
+      return RecordingBackend.record (self, name, args)
+
+
+
+class TestStages (unittest.TestCase):
+
+   def setUp (self):
+      self.output_dir = tempfile.mkdtemp ()
+      self.file_svg = os.path.join (self.output_dir, 'F_Fab.svg')
+      with open (self.file_svg, 'w') as file:
+         file.write ('<svg>\n</svg>\n')
+      self.backend = BoardUseBackend ({'GetPlotFileName': self.file_svg, 'GetModules': []})
+      set_backend (self.backend)
+
+   def tearDown (self):
+      set_backend (None)
+      shutil.rmtree (self.output_dir)
+
+   def get_needs (self, **options):
+      args = make_args (self.output_dir, **options)
+      stages = kcgen.make_stages (args, kcgen.Session (args))
+      return dict ((stage.name, stage.needs) for stage in stages)
+
+   def test_needs (self):
+      needs = self.get_needs ()
+      self.assertEqual (needs ['gerber'], ('board',))
+      self.assertEqual (needs ['drill'], ('board',))
+      self.assertEqual (needs ['bom'], ('design',))
+
+      # gerber layers are plotted by processes loading their own board
+      needs = self.get_needs (jobs = 3)
+      self.assertEqual (needs ['gerber'], ())
+      self.assertEqual (needs ['drill'], ('board',))
+
+      needs = self.get_needs (jobs = 3, drill_backend = 'native')
+      self.assertEqual (needs ['drill'], ('design',))
+
+   def test_board_used_by_one_stage_at_once (self):
+      args = make_args (
+         self.output_dir, jobs = 3, stages = 'drill,assembly', assembly_backend = 'svg',
+         force = True
+      )
+      with mock.patch.object (kcgen, 'RSVG_CONVERT', __file__), \
+         mock.patch.object (kcgen, 'convert_assembly_svg') as convert_assembly_svg:
+         kcgen.run (args)
+
+      self.assertEqual (self.backend.count ('CreateDrillandMapFilesSet'), 1)
+      self.assertEqual (self.backend.count ('PlotLayer'), 1)
+      self.assertEqual (convert_assembly_svg.call_count, 1)
+      self.assertEqual (self.backend.overlaps, [])
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
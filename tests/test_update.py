@@ -0,0 +1,178 @@
+##############################################################################
+#
+#     test_update.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import random
+import unittest
+from kcgen.parser import Parser
+from . import BOARD_NET, BOARD_PCB, read_text, describe_design
+
+
+
+#-- element_span --------------------------------------------------------------
+# Returns the begin and end of the list of `data` starting at `begin`
+
+def element_span (data, begin):
+   depth = 0
+   position = begin
+   while True:
+      char = data [position]
+      if char == '"':
+         position += 1
+         while data [position] != '"':
+            position += 2 if data [position] == '\\' else 1
+      elif char == '(':
+         depth += 1
+      elif char == ')':
+         depth -= 1
+         if depth == 0:
+            return begin, position + 1
+      position += 1
+
+
+
+#-- top_elements --------------------------------------------------------------
+# Returns the spans of the lists held by the root list of `data`
+
+def top_elements (data):
+   spans = []
+   position = data.index ('(', 1)
+   while True:
+      begin, end = element_span (data, position)
+      spans.append ((begin, end))
+      position = data.find ('(', end)
+      if position < 0 or data.rfind (')', end) < position:
+         return spans
+
+
+
+#-- Edits ---------------------------------------------------------------------
+
+# Each edit takes the pcb file data, and returns it edited
+
+def replace (old, new):
+   def edit (data):
+      assert old in data, old
+      return data.replace (old, new, 1)
+   return edit
+
+def remove_element (start):
+   def edit (data):
+      begin, end = element_span (data, data.index (start))
+      return data [:begin] + data [end:].lstrip (' ').lstrip ('\n')
+   return edit
+
+def move_element (start, before):
+   # moves the list starting with `start` before the one starting with
+   # `before`, or to the end of the file
+   def edit (data):
+      begin, end = element_span (data, data.index (start))
+      element = data [begin:end]
+      data = data [:begin] + data [end:]
+      position = data.index (before) if before else data.rindex (')')
+      return data [:position] + element + '\n  ' + data [position:]
+   return edit
+
+def copy_element (start, old, new):
+   # adds a copy of the list starting with `start`, with `old` replaced
+   def edit (data):
+      begin, end = element_span (data, data.index (start))
+      element = data [begin:end].replace (old, new, 1)
+      return data [:end] + '\n  ' + element + data [end:]
+   return edit
+
+EDITS = (
+   ('move module', replace ('(at 112.5 86.25)', '(at 113.75 86)')),
+   ('rotate module', replace ('(at 121 92 90)', '(at 121 92 180)')),
+   ('flip module', replace (
+      '(fp_text reference C1 (at 0 -1.43) (layer F.SilkS)',
+      '(fp_text reference C1 (at 0 -1.43) (layer B.SilkS)'
+   )),
+   ('remove module', remove_element ('(module Connector_PinHeader_2.54mm')),
+   ('add fiducial', copy_element ('(module Fiducial:Fiducial_1mm_Mask2mm', '(at 103 78)', '(at 103 112)')),
+   ('add module', copy_element ('(module MountingHole:', '(at 145 80)', '(at 105 80)')),
+   ('reorder modules', move_element ('(module Resistor_SMD:R_0603_1608Metric', '')),
+   ('string edit', replace ('keep clear (no parts)', 'keep clear (no parts')),
+   ('string newlines', replace (
+      'Top side\nkeep clear',
+      'Top side)\n  (module X (layer F.Cu)\n  (via (at 1 2) (size 1))\nkeep clear'
+   )),
+   ('escaped string edit', replace ('SENSOR \\"rev 1.2\\"', 'SENSOR \\"rev (1.3\\" \\\\')),
+   ('outline', replace ('(gr_line (start 150.0 75.0) (end 150.0 115.0)', '(gr_line (start 155.0 75.0) (end 155.0 115.0)')),
+   ('via net', replace ('(via (at 131.25 95) (size 0.8) (layers F.Cu B.Cu) (net 6)', '(via (at 131.25 95) (size 0.8) (layers F.Cu B.Cu) (net 1)')),
+   ('remove via', remove_element ('(via (at 118.5 88.75)')),
+   ('net class drill', replace ('(via_drill 0.6)', '(via_drill 0.7)')),
+   ('remove zone', remove_element ('(zone (net 1)')),
+   ('whitespace', replace ('\n\n  (segment', '\n  (segment')),
+   ('header', replace ('(thickness 1.6)', '(thickness 1.2)')),
+)
+
+
+
+class TestUpdate (unittest.TestCase):
+
+   # designs updated after edits are the same as the designs parsed from
+   # scratch
+
+   def setUp (self):
+      self.data_net = read_text (BOARD_NET)
+      self.data_pcb = read_text (BOARD_PCB)
+
+   def check_update (self, parser, data_pcb, message):
+      design = parser.update (data_pcb)
+      expected = Parser ('board', self.data_net, data_pcb).parse ()
+      self.assertEqual (describe_design (design), describe_design (expected), message)
+
+   def new_parser (self):
+      parser = Parser ('board', self.data_net, self.data_pcb, incremental = True)
+      parser.parse ()
+      return parser
+
+   def test_edits (self):
+      for name, edit in EDITS:
+         parser = self.new_parser ()
+         data_pcb = edit (self.data_pcb)
+         self.check_update (parser, data_pcb, name)
+         # and back
+         self.check_update (parser, self.data_pcb, name + ', undone')
+
+   def test_edits_in_sequence (self):
+      parser = self.new_parser ()
+      data_pcb = self.data_pcb
+      for name, edit in EDITS:
+         data_pcb = edit (data_pcb)
+         self.check_update (parser, data_pcb, name)
+
+   def test_random_edits (self):
+      # elements removed, copied and moved about, with numbers changed
+      generator = random.Random (5)
+      parser = self.new_parser ()
+      data_pcb = self.data_pcb
+
+      for step in range (60):
+         spans = top_elements (data_pcb)
+         begin, end = spans [generator.randrange (len (spans))]
+         element = data_pcb [begin:end]
+         action = generator.choice (('remove', 'copy', 'move', 'number'))
+         if action == 'remove' and len (spans) > 20:
+            data_pcb = data_pcb [:begin] + data_pcb [end:]
+         elif action == 'copy':
+            position = spans [generator.randrange (len (spans))][0]
+            data_pcb = data_pcb [:position] + element + '\n  ' + data_pcb [position:]
+         elif action == 'move':
+            data_pcb = data_pcb [:begin] + data_pcb [end:]
+            position = top_elements (data_pcb) [-1][1]
+            data_pcb = data_pcb [:position] + '\n  ' + element + data_pcb [position:]
+         else:
+            position = data_pcb.find (' 1', begin, end)
+            if position >= 0:
+               data_pcb = data_pcb [:position] + ' 2' + data_pcb [position + 2:]
+         self.check_update (parser, data_pcb, 'step %d, %s' % (step, action))
+
+
+
+if __name__ == '__main__':
+   unittest.main ()
@@ -0,0 +1,198 @@
+##############################################################################
+#
+#     test_watch.py
+#     Copyright (c) 2018 Raphael DINGE
+#
+#Tab=3########################################################################
+
+import importlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import kcgen
+from . import BOARD_NET, BOARD_PCB, make_args
+
+# the module, kcgen.watch being the function
+
+watch = importlib.import_module ('kcgen.watch')
+
+
+
+class TestWatcher (unittest.TestCase):
+
+   # time is set by the tests, files are told changed by their size
+
+   def setUp (self):
+      self.work_dir = tempfile.mkdtemp ()
+      self.path = os.path.join (self.work_dir, 'board.kicad_pcb')
+      self.write ('a')
+      self.now = 100.0
+      patcher = mock.patch.object (watch.time, 'time', lambda: self.now)
+      patcher.start ()
+      self.addCleanup (patcher.stop)
+      self.watcher = watch.Watcher ([self.path], debounce = 0.5)
+
+   def tearDown (self):
+      shutil.rmtree (self.work_dir)
+
+   def write (self, data):
+      with open (self.path, 'w') as file:
+         file.write (data)
+
+   def poll_at (self, now, flush = False):
+      self.now = now
+      return self.watcher.poll (flush)
+
+   def test_unchanged (self):
+      self.assertEqual (self.poll_at (101.0), [])
+
+   def test_debounce (self):
+      self.write ('ab')
+      self.assertEqual (self.poll_at (101.0), [])
+      self.assertEqual (self.poll_at (101.4), [])
+      # written again, the debounce time starts over
+      self.write ('abc')
+      self.assertEqual (self.poll_at (101.6), [])
+      self.assertEqual (self.poll_at (102.0), [])
+      self.assertEqual (self.poll_at (102.1), [self.path])
+      # and only told once
+      self.assertEqual (self.poll_at (103.0), [])
+
+   def test_replaced (self):
+      # missing while replaced, told once back
+      os.remove (self.path)
+      self.assertEqual (self.poll_at (101.0), [])
+      self.assertEqual (self.poll_at (102.0), [])
+      self.write ('new')
+      self.assertEqual (self.poll_at (102.1), [])
+      self.assertEqual (self.poll_at (102.6), [self.path])
+
+   def test_flush (self):
+      self.write ('ab')
+      self.assertEqual (self.poll_at (101.0, flush = True), [self.path])
+      self.assertEqual (self.poll_at (102.0), [])
+
+
+
+class TestWatch (unittest.TestCase):
+
+   # builds run by `watch`, each one being given to `on_build`, files being
+   # edited once the watcher started
+
+   def setUp (self):
+      self.work_dir = tempfile.mkdtemp ()
+      self.input_net = os.path.join (self.work_dir, 'board.net')
+      self.input_pcb = os.path.join (self.work_dir, 'board.kicad_pcb')
+      shutil.copy (BOARD_NET, self.input_net)
+      shutil.copy (BOARD_PCB, self.input_pcb)
+      self.args = make_args (
+         os.path.join (self.work_dir, 'output'), input_net = self.input_net, input_pcb = self.input_pcb
+      )
+      self.builds = []
+
+   def tearDown (self):
+      shutil.rmtree (self.work_dir)
+
+   def run_watch (self, on_build, edit, max_polls = 200):
+      def run (args, session):
+         self.builds.append (session.design)
+         on_build (len (self.builds))
+
+      # stops watching if no build comes
+      polls = []
+      poll = watch.Watcher.poll
+      def poll_at_most (watcher, flush = False):
+         polls.append (None)
+         if len (polls) == 1:
+            edit ()
+         if len (polls) > max_polls:
+            raise KeyboardInterrupt ()
+         return poll (watcher, flush)
+
+      with mock.patch.object (kcgen, 'run', run), \
+         mock.patch.object (watch, 'POLL_INTERVAL', 0.05), \
+         mock.patch.object (watch.Watcher, 'poll', poll_at_most):
+         with self.assertLogs (level = logging.INFO) as logs:
+            watch.watch (self.args)
+      return logs.output
+
+   def move_r1 (self):
+      with open (self.input_pcb, 'r') as file:
+         data = file.read ()
+      with open (self.input_pcb, 'w') as file:
+         file.write (data.replace ('(at 112.5 86.25)', '(at 113.75 86)', 1))
+
+   def test_rebuild (self):
+      def on_build (count):
+         if count > 1:
+            # stops watching
+            raise KeyboardInterrupt ()
+
+      logs = self.run_watch (on_build, self.move_r1)
+      self.assertEqual (len (self.builds), 2)
+      self.assertIn ('INFO:root:%s changed' % self.input_pcb, logs)
+      # the design is patched, not parsed again
+      self.assertIs (self.builds [1], self.builds [0])
+      position = self.builds [1].components ['R1'].position
+      self.assertEqual ((position.x, position.y), (113.75, 86.0))
+
+   def test_build_failure (self):
+      # a failed build keeps watching
+      def on_build (count):
+         if count == 1:
+            raise ValueError ('half written')
+         raise KeyboardInterrupt ()
+
+      logs = self.run_watch (on_build, self.move_r1)
+      self.assertEqual (len (self.builds), 2)
+      self.assertIn ('ERROR:root:ValueError: half written', logs)
+
+   def test_no_change (self):
+      # a second's worth of polls
+      self.run_watch (lambda count: None, lambda: None, 20)
+      self.assertEqual (len (self.builds), 1)
+
+
+
+class TestTrigger (unittest.TestCase):
+
+   def setUp (self):
+      self.requests = watch.queue.Queue ()
+      self.server = watch.TriggerServer (0, self.requests)
+
+   def tearDown (self):
+      self.server.close ()
+
+   # Sends a trigger, replies `result` to the request, returns the request
+   # and what send_trigger returned
+
+   def trigger (self, force, result):
+      sent = []
+      thread = threading.Thread (target = lambda: sent.append (watch.send_trigger (self.server.port, force)))
+      thread.start ()
+      request = self.requests.get (timeout = 5)
+      request.reply (result)
+      thread.join (5)
+      return request, sent [0]
+
+   def test_build (self):
+      with self.assertLogs (level = logging.INFO):
+         request, ok = self.trigger (False, 'ok')
+      self.assertFalse (request.force)
+      self.assertTrue (ok)
+
+   def test_force_failed (self):
+      with self.assertLogs (level = logging.INFO) as logs:
+         request, ok = self.trigger (True, 'failed: fatal error')
+      self.assertTrue (request.force)
+      self.assertFalse (ok)
+      self.assertEqual (logs.output, ['ERROR:root:Build failed: fatal error'])
+
+
+
+if __name__ == '__main__':
+   unittest.main ()